@@ -71,7 +71,8 @@ setup(
                     'openstack-client-plugin': ['teflo_openstack_client_plugin'],
                     'terraform-plugin': ['teflo-terraform-plugin'],
                     'webhook-notification-plugin': ['teflo-webhooks-notification-plugin'],
-                    'notify-service-plugin': ['teflo-notify-service-plugin']
+                    'notify-service-plugin': ['teflo-notify-service-plugin'],
+                    'ansible-runner': ['ansible-runner>=2.0']
 
                     },
     classifiers=[
@@ -25,11 +25,9 @@
     :license: GPLv3, see LICENSE for more details.
 """
 import sys
-import ansible
 
 _ver = sys.version_info
 
-ansible_ver = int(ansible.__version__.split('.')[:2][1])
 # Python 2.x?
 is_py2 = (_ver[0] == 2)
 
@@ -71,7 +69,16 @@ try:
 except Exception:
     from configparser import ConfigParser
 
-try:
-    from ansible.parsing.vault import VaultLib
-except ImportError:
-    from ansible.utils.vault import VaultLib
+
+def __getattr__(name):
+    # importing ansible pulls in most of its modules, so it is only done on first use
+    if name == 'ansible_ver':
+        import ansible
+        return int(ansible.__version__.split('.')[:2][1])
+    if name == 'VaultLib':
+        try:
+            from ansible.parsing.vault import VaultLib
+        except ImportError:
+            from ansible.utils.vault import VaultLib
+        return VaultLib
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
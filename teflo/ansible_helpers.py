@@ -26,9 +26,12 @@
 """
 
 import collections
+import hashlib
 import os
 import copy
 import json
+import shlex
+import tempfile
 from string import Template
 from logging import getLogger
 from ruamel.yaml import YAML
@@ -36,24 +39,237 @@ from collections import namedtuple
 from ansible.inventory.manager import InventoryManager
 from ansible.parsing.dataloader import DataLoader
 from ansible.vars.manager import VariableManager
-from shutil import copyfile
-from ansible.config.manager import ConfigManager
+from shutil import copyfile, rmtree
+from ansible.config.manager import ConfigManager, find_ini_config_file
+from ansible import constants as ans_constants
 from ._compat import string_types
 from .helpers import ssh_retry, exec_local_cmd_pipe, DataInjector, get_ans_verbosity, is_host_localhost, file_mgmt, \
     gen_random_str, check_for_var_file
 from .static.playbooks import GIT_CLONE_PLAYBOOK, SYNCHRONIZE_PLAYBOOK, \
-    ADHOC_SHELL_PLAYBOOK, ADHOC_SCRIPT_PLAYBOOK
+    ADHOC_SHELL_PLAYBOOK, ADHOC_SCRIPT_PLAYBOOK, ADHOC_BATCH_PLAYBOOK, ADHOC_BATCH_TASK
 from .exceptions import AnsibleServiceError
 from ansible.parsing.vault import VaultSecret
 from .exceptions import AnsibleVaultError
+from .utils.fork_safety import fork_safe_lock
 from ._compat import RawConfigParser, VaultLib, ansible_ver, is_py2
-from .constants import ANSIBLE_GALAXY_INSTALL_ATTEMPTS, ANSIBLE_GALAXY_INSTALL_DELAY
+from .constants import ANSIBLE_GALAXY_INSTALL_ATTEMPTS, ANSIBLE_GALAXY_INSTALL_DELAY, ANSIBLE_BACKENDS, \
+    DEFAULT_ANSIBLE
 import glob
 from retry import retry
 
 LOG = getLogger(__name__)
 
 
+def _is_unset(value):
+    return value is None or str(value).strip().lower() in ['', 'none', 'false']
+
+
+def ansible_run_env(config):
+    """Return the environment variables of the ansible settings teflo manages for the run.
+
+    The facts gathered by a playbook are cached in the data folder and are
+    not gathered again by the next playbooks of the run, the ssh connections
+    are kept open between the ansible calls and the modules are pipelined.
+    The settings are taken from the ansible section of teflo.cfg. A setting
+    set in the ansible.cfg used by ansible or in the environment is left as
+    it is.
+
+    :param config: teflo config
+    :type config: dict
+    :return: environment variables
+    :rtype: dict
+    """
+    settings = dict(DEFAULT_ANSIBLE)
+    settings.update(config.get('ANSIBLE') or {})
+
+    ans_config = RawConfigParser(allow_no_value=True)
+    ans_cfg_path = find_ini_config_file()
+    if ans_cfg_path:
+        try:
+            ans_config.read(ans_cfg_path)
+        except Exception as ex:
+            LOG.debug('Unable to read %s: %s' % (ans_cfg_path, ex))
+
+    def user_set(*options):
+        # the option is set as section.key in the ansible.cfg
+        for option in options:
+            section, key = option.split('.')
+            if ans_config.has_option(section, key):
+                return True
+        return False
+
+    env = dict()
+    if not _is_unset(settings.get('FACT_CACHING')) and not user_set('defaults.fact_caching'):
+        env['ANSIBLE_CACHE_PLUGIN'] = str(settings['FACT_CACHING'])
+        env['ANSIBLE_CACHE_PLUGIN_CONNECTION'] = os.path.join(os.path.abspath(config['DATA_FOLDER']),
+                                                              '.ansible_facts')
+        env['ANSIBLE_CACHE_PLUGIN_TIMEOUT'] = str(settings.get('FACT_CACHING_TIMEOUT', 86400))
+    if not _is_unset(settings.get('GATHERING')) and not user_set('defaults.gathering'):
+        env['ANSIBLE_GATHERING'] = str(settings['GATHERING'])
+    if not _is_unset(settings.get('CONTROL_PERSIST')):
+        if not user_set('ssh_connection.ssh_args'):
+            env['ANSIBLE_SSH_ARGS'] = '-C -o ControlMaster=auto -o ControlPersist=%s' % settings['CONTROL_PERSIST']
+        if not user_set('ssh_connection.control_path', 'ssh_connection.control_path_dir'):
+            # the sockets path must stay short, it is kept in the temp folder instead of the data folder
+            env['ANSIBLE_SSH_CONTROL_PATH_DIR'] = os.path.join(
+                tempfile.gettempdir(), 'teflo-cp-%s' % os.path.basename(os.path.abspath(config['DATA_FOLDER'])))
+    if str(settings.get('PIPELINING')).lower() == 'true' and \
+            not user_set('defaults.pipelining', 'connection.pipelining', 'ssh_connection.pipelining'):
+        env['ANSIBLE_PIPELINING'] = 'True'
+
+    # the environment overrides teflo's settings
+    return dict([(k, v) for k, v in env.items() if k not in os.environ])
+
+
+# the scoped inventories written by this process, see ~scoped_inventory
+_scoped_inventories_lock = fork_safe_lock()
+
+
+def _inventory_file_signature(path):
+    stat = os.stat(path)
+    return '%s %s %s' % (path, stat.st_mtime_ns, stat.st_size)
+
+
+def scoped_inventory(config, hosts):
+    """Return an inventory holding only the given hosts of the master inventory.
+
+    Ansible parses the inventory it is given for every call. Instead of the
+    whole inventory folder, the call gets the sections of the master inventory
+    for its hosts and for the groups they belong to. The scoped inventory is
+    named after the hash of the host names and kept until the master inventory
+    changes, so the calls against the same hosts share it.
+
+    Scoping is opt-in, set by ansible_scoped_inventory, since it breaks the
+    playbooks reading the hostvars or groups of other hosts. The whole
+    inventory folder is returned when it is not set, when the hosts are not all assets
+    in the master inventory, when the folder holds more inventories than the
+    master inventory (static or provisioner generated ones) or holds
+    group_vars/host_vars folders, which ansible looks up next to the inventory.
+
+    :param config: teflo config
+    :type config: dict
+    :param hosts: hosts of the ansible call
+    :type hosts: list
+    :return: path of the inventory
+    :rtype: str
+    """
+    inv_dir = os.path.abspath(config['INVENTORY_FOLDER'])
+    if str(config.get('ANSIBLE_SCOPED_INVENTORY', False)).lower() != 'true' or not hosts or \
+            [host for host in hosts if isinstance(host, string_types)]:
+        return inv_dir
+    try:
+        entries = os.listdir(inv_dir)
+    except OSError:
+        return inv_dir
+    if len(entries) != 1 or not entries[0].startswith('inventory-'):
+        return inv_dir
+
+    master_inv = os.path.join(inv_dir, entries[0])
+    names = sorted(set([host.name for host in hosts]))
+    scoped_dir = os.path.join(os.path.abspath(config['DATA_FOLDER']), '.scoped_inventory')
+    scoped_inv = os.path.join(scoped_dir, 'inventory-%s' % hashlib.sha256(
+        '\n'.join(names).encode('utf-8')).hexdigest()[:20])
+
+    with _scoped_inventories_lock:
+        signature = '# scoped inventory of %s\n' % _inventory_file_signature(master_inv)
+        try:
+            with open(scoped_inv) as f:
+                if f.readline() == signature:
+                    return scoped_inv
+        except (OSError, UnicodeDecodeError):
+            pass
+
+        master = RawConfigParser(allow_no_value=True)
+        master.optionxform = str
+        with open(master_inv) as f:
+            master.read_file(f)
+
+        scoped = RawConfigParser(allow_no_value=True)
+        scoped.optionxform = str
+        groups = list()
+        for section in master.sections():
+            if not section.endswith(':children'):
+                continue
+            children = [name for name in master.options(section) if name in names]
+            if children:
+                scoped.add_section(section)
+                [scoped.set(section, name) for name in children]
+                groups.append(section.split(':')[0])
+        for name in names + groups:
+            for section in [name, '%s:vars' % name]:
+                if master.has_section(section) and not scoped.has_section(section):
+                    scoped.add_section(section)
+                    [scoped.set(section, k, v) for k, v in master.items(section, raw=True)]
+
+        os.makedirs(scoped_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=scoped_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(signature)
+                scoped.write(f)
+            os.replace(tmp_path, scoped_inv)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+    return scoped_inv
+
+
+# the generated playbooks rendered by this process, see ~cached_playbook
+_cached_playbooks_lock = fork_safe_lock()
+
+
+def cached_playbook(config, kind, playbook_str):
+    """Return the path of a generated playbook rendered from the given string.
+
+    The generated playbooks only differ by the options and module arguments
+    of the action, the commands, scripts, gits and artifacts are passed as
+    extra vars. Each distinct playbook is rendered once into the data folder,
+    named after the hash of its content, and reused by the next calls of the
+    run instead of being written to and removed from the current directory
+    for every call. The group_vars and host_vars folders of the current
+    directory are linked next to the playbooks, ansible keeps loading them as
+    it did when the playbooks were written to the current directory.
+
+    :param config: teflo config
+    :type config: dict
+    :param kind: kind of the playbook (shell_, script_, ...)
+    :type kind: str
+    :param playbook_str: playbook content
+    :type playbook_str: str
+    :return: path of the playbook
+    :rtype: str
+    """
+    cache_dir = os.path.join(os.path.abspath(config['DATA_FOLDER']), '.playbooks')
+    digest = hashlib.sha256(playbook_str.encode('utf-8')).hexdigest()[:20]
+    playbook = os.path.join(cache_dir, AnsibleService.playbook_name.safe_substitute(type=kind, uid=digest))
+
+    with _cached_playbooks_lock:
+        os.makedirs(cache_dir, exist_ok=True)
+        for name in ['group_vars', 'host_vars']:
+            if os.path.isdir(name) and not os.path.lexists(os.path.join(cache_dir, name)):
+                try:
+                    os.symlink(os.path.abspath(name), os.path.join(cache_dir, name))
+                except FileExistsError:
+                    # linked by a concurrent worker process
+                    pass
+
+        if os.path.isfile(playbook):
+            # named after its content, it is the same playbook
+            return playbook
+
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+        os.close(fd)
+        try:
+            AnsibleService.create_playbook(tmp_path, playbook_str)
+            os.replace(tmp_path, playbook)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+    return playbook
+
+
 class AnsibleController(object):
     """Ansible controller.
 
@@ -61,16 +277,29 @@ class AnsibleController(object):
     or playbooks to configure/manage remote machines.
     """
 
-    def __init__(self, inventory):
+    # parsed inventories keyed by their source, see ~AnsibleController.set_inventory
+    _inventories = dict()
+    _inventories_lock = fork_safe_lock()
+
+    def __init__(self, inventory, backend='subprocess', timeout=0, env=None):
         """Constructor.
 
         Primarily used for initializing attributes used by module/playbook
         execution.
 
         :param inventory: inventory file
+        :param backend: how playbooks are run, subprocess or runner
+        :param timeout: seconds after which an ansible command is killed, 0 for no timeout
+        :param env: environment variables set for every ansible command, see ~ansible_run_env
         """
+        if backend not in ANSIBLE_BACKENDS:
+            raise AnsibleServiceError('Ansible backend %s is not supported, valid backends: %s'
+                                      % (backend, ', '.join(ANSIBLE_BACKENDS)))
         self.loader = DataLoader()
         self.ansible_inventory = inventory
+        self.backend = backend
+        self.timeout = timeout
+        self.env = env or {}
         self.inventory = None
         self.variable_manager = None
 
@@ -88,14 +317,46 @@ class AnsibleController(object):
                         'diff']
         )
 
+    @staticmethod
+    def inventory_signature(inventory):
+        """Return the signature of the inventory files, it changes whenever one of them is written.
+
+        :param inventory: inventory file or folder
+        :type inventory: str
+        :return: name, modification time and size of the inventory files
+        :rtype: tuple
+        """
+        paths = [inventory]
+        if os.path.isdir(inventory):
+            paths.extend(sorted(glob.glob(os.path.join(inventory, '*'))))
+        signature = list()
+        for path in paths:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            signature.append((path, stat.st_mtime_ns, stat.st_size))
+        return tuple(signature)
+
     def set_inventory(self):
-        """Create the ansible inventory object with the supplied inventory."""
-        self.variable_manager = VariableManager(loader=self.loader)
-        self.inventory = InventoryManager(
-            loader=self.loader,
-            sources=self.ansible_inventory
-        )
-        self.variable_manager.set_inventory(self.inventory)
+        """Create the ansible inventory object with the supplied inventory.
+
+        The parsed inventory is shared by the controllers using the same
+        inventory and is only parsed again when its files change.
+        """
+        signature = self.inventory_signature(self.ansible_inventory)
+        with self._inventories_lock:
+            cached = self._inventories.get(self.ansible_inventory)
+            if cached is None or cached[0] != signature:
+                variable_manager = VariableManager(loader=self.loader)
+                inventory = InventoryManager(
+                    loader=self.loader,
+                    sources=self.ansible_inventory
+                )
+                variable_manager.set_inventory(inventory)
+                cached = (signature, inventory, variable_manager)
+                self._inventories[self.ansible_inventory] = cached
+        _, self.inventory, self.variable_manager = cached
 
     @ssh_retry
     def run_module(self, module, logger, script=None, run_options={},
@@ -155,12 +416,12 @@ class AnsibleController(object):
             module_call += " -c local"
 
         logger.debug(module_call)
-        output = exec_local_cmd_pipe(module_call, logger)
+        output = exec_local_cmd_pipe(module_call, logger, env_var=dict(self.env) or None, timeout=self.timeout)
         return output
 
     @ssh_retry
     def run_playbook(self, playbook, logger, extra_vars=None, run_options=None,
-                     ans_verbosity=None, env_var=None):
+                     ans_verbosity=None, env_var=None, event_handler=None):
         """Run an Ansible playbook.
 
         :param playbook: Playbook to call
@@ -173,8 +434,13 @@ class AnsibleController(object):
         :param env_var: dict of env variables to be passed
         :type: env_var: dict
         :type ans_verbosity: str
+        :param event_handler: function called with the task result events, runner backend only
+        :type event_handler: function
         :return: A tuple (rc, sterr)
         """
+        if self.backend == 'runner':
+            return self.run_playbook_with_runner(playbook, logger, extra_vars, run_options, ans_verbosity,
+                                                 event_handler=event_handler)
 
         playbook_call = "ansible-playbook -i %s %s" % \
                         (self.ansible_inventory, playbook)
@@ -194,31 +460,121 @@ class AnsibleController(object):
                 else:
                     playbook_call += " -e %s=\"'%s'\"" % (key, extra_vars[key])
 
+        playbook_call += self.build_playbook_options(run_options)
+
+        if ans_verbosity:
+            playbook_call += " -%s" % ans_verbosity
+
+        logger.debug(playbook_call)
+        if self.env:
+            env_var = dict(self.env, **(env_var or {}))
+        output = exec_local_cmd_pipe(playbook_call, logger, env_var=env_var, timeout=self.timeout)
+        return output
+
+    @staticmethod
+    def build_playbook_options(run_options):
+        """Build the ansible-playbook command line options.
+
+        :param run_options: playbook run options
+        :type run_options: dict
+        :return: command line options
+        :rtype: str
+        """
+        options = ''
         if run_options:
             for key in run_options:
                 if key == "remote_user":
-                    playbook_call += " --user %s" % run_options[key]
+                    options += " --user %s" % run_options[key]
                 elif key == "become":
                     if run_options[key]:
-                        playbook_call += " --%s" % key
+                        options += " --%s" % key
                 elif key == "tags":
                     taglist = ','.join(run_options[key])
-                    playbook_call += " --tags %s" % taglist
+                    options += " --tags %s" % taglist
                 elif key == "skip_tags":
                     taglist = ','.join(run_options[key])
-                    playbook_call += " --skip-tags %s" % taglist
+                    options += " --skip-tags %s" % taglist
                 elif key == "vault-password-file":
                     taglist = ','.join(run_options[key])
-                    playbook_call += " --vault-password-file %s" % taglist
+                    options += " --vault-password-file %s" % taglist
                 else:
-                    playbook_call += " --%s %s" % (key.replace('_', '-'), run_options[key])
+                    options += " --%s %s" % (key.replace('_', '-'), run_options[key])
+        return options
 
-        if ans_verbosity:
-            playbook_call += " -%s" % ans_verbosity
+    def run_playbook_with_runner(self, playbook, logger, extra_vars=None, run_options=None, ans_verbosity=None,
+                                 event_handler=None):
+        """Run an Ansible playbook with ansible-runner.
 
-        logger.debug(playbook_call)
-        output = exec_local_cmd_pipe(playbook_call, logger, env_var=env_var)
-        return output
+        The playbook output is streamed to the logger from the runner events
+        and the output of the failed or unreachable tasks is returned as the
+        error. The task result events are also handed to the given event
+        handler, so the results of the tasks are read without the playbook
+        writing them to disk.
+
+        :param playbook: Playbook to call
+        :type playbook: str
+        :param logger: Logger object.
+        :type logger: logger object
+        :param extra_vars: Additional variables for playbook
+        :type extra_vars: dict
+        :param run_options: playbook run options
+        :type run_options: dict
+        :param ans_verbosity: ansible verbosity settings
+        :type ans_verbosity: str
+        :param event_handler: function called with the task result events
+        :type event_handler: function
+        :return: A tuple (rc, sterr)
+        """
+        try:
+            import ansible_runner
+        except ImportError:
+            raise AnsibleServiceError('The ansible runner backend requires ansible-runner to be installed, '
+                                      'install it with: pip install teflo[ansible-runner]')
+
+        # variable files are passed on the command line, other variables keep their type
+        extravars = dict()
+        cmdline = ''
+        for key, value in (extra_vars or {}).items():
+            if key == 'file':
+                for item in value if isinstance(value, list) else [value]:
+                    cmdline += ' -e @%s' % item
+            else:
+                extravars[key] = value
+        cmdline += self.build_playbook_options(run_options)
+
+        errors = list()
+
+        def runner_event_handler(event):
+            if event.get('stdout'):
+                stdout = event['stdout'].replace('\r', '')
+                logger.info(stdout)
+                if event.get('event') in ['runner_on_failed', 'runner_on_unreachable']:
+                    errors.append(stdout)
+            if event_handler and event.get('event') in ['runner_on_ok', 'runner_on_failed']:
+                event_handler(event)
+            # events are logged as they come, no need to keep them on disk
+            return False
+
+        logger.debug('ansible-runner playbook: %s, options: %s' % (playbook, cmdline))
+        private_data_dir = tempfile.mkdtemp(prefix='teflo_runner_')
+        try:
+            runner = ansible_runner.run(
+                private_data_dir=private_data_dir,
+                project_dir=os.getcwd(),
+                playbook=os.path.abspath(playbook) if os.path.exists(playbook) else playbook,
+                inventory=self.ansible_inventory,
+                extravars=extravars,
+                cmdline=cmdline.strip() or None,
+                verbosity=len(ans_verbosity) if ans_verbosity else None,
+                envvars=dict(self.env, ANSIBLE_NOCOLOR='true'),
+                timeout=self.timeout or None,
+                event_handler=runner_event_handler,
+                quiet=True
+            )
+        finally:
+            rmtree(private_data_dir, ignore_errors=True)
+        # failures of tasks ignoring errors are not errors of the playbook
+        return runner.rc, '\n'.join(errors) if runner.rc != 0 else ''
 
 
 class AnsibleService(object):
@@ -253,8 +609,11 @@ class AnsibleService(object):
             self.ans_log_path = os.path.join(self.config['WORKSPACE'], ans_log)
             self.env_var.update({'ANSIBLE_LOG_PATH': self.ans_log_path})
 
-        # passing the teflo's inventory directory to the Ansible Controller
-        self.ans_controller = AnsibleController(os.path.abspath(self.config['INVENTORY_FOLDER']))
+        # passing the inventory of the hosts to the Ansible Controller
+        self.ans_controller = AnsibleController(scoped_inventory(self.config, self.hosts),
+                                                backend=self.config.get('ANSIBLE_BACKEND', 'subprocess').lower(),
+                                                timeout=self.config.get('TIMEOUT', {}).get('COMMAND', 0),
+                                                env=ansible_run_env(self.config))
 
         # pass the uid as an extra variable to the playbooks so they can save
         # output uniquely to disk in case of concurrent execution
@@ -454,6 +813,37 @@ class AnsibleService(object):
         with open(playbook, 'w') as f:
             yaml.dump(yaml.load(playbook_str), f)
 
+    @staticmethod
+    def resolve_script(script):
+        """Make the path of a script relative to the current directory absolute.
+
+        Ansible looks up the scripts relative to the playbook folder, which is
+        the data folder for the generated playbooks, see ~cached_playbook.
+
+        The script path is split from its arguments the way the ansible script
+        module does, the arguments are kept as they are so the remote shell
+        still expands them.
+
+        :param script: script path followed by its arguments
+        :type script: str
+        :return: script with its absolute path
+        :rtype: str
+        """
+        lexer = shlex.shlex(script.strip(), posix=True)
+        lexer.whitespace_split = True
+        try:
+            script_path = lexer.get_token()
+            args = lexer.instream.read().strip()
+        except ValueError:
+            # unbalanced quotes, ansible reports it
+            return script
+        if not script_path or os.path.isabs(script_path):
+            return script
+        for path in [script_path, os.path.join('files', script_path)]:
+            if os.path.isfile(path):
+                return ' '.join([shlex.quote(os.path.abspath(path))] + ([args] if args else []))
+        return script
+
     @retry(AnsibleServiceError, tries=ANSIBLE_GALAXY_INSTALL_ATTEMPTS, delay=ANSIBLE_GALAXY_INSTALL_DELAY)
     def download_roles(self, u_path=None):
         """Download ansible dependencies (roles or collections).
@@ -489,10 +879,10 @@ class AnsibleService(object):
 
                 if key == 'collection' and u_path:
                     # check if user select different path to install collection.
-                    results = exec_local_cmd_pipe(f"ansible-galaxy {key} install -r {requirements_file} -p {u_path}",
-                                                  self.logger)
+                    cmd = f"ansible-galaxy {key} install -r {requirements_file} -p {u_path}"
                 else:
-                    results = exec_local_cmd_pipe(f"ansible-galaxy {key} install -r {requirements_file}", self.logger)
+                    cmd = f"ansible-galaxy {key} install -r {requirements_file}"
+                results = self._galaxy_install(key, json.dumps(requirements_file_content, sort_keys=True), cmd, u_path)
 
                 if results[0] != 0:
                     message = f"Failed to install {key}s from requirements file {requirements_file}. " \
@@ -515,13 +905,40 @@ class AnsibleService(object):
                                     f"file. Potential problems may occur.")
 
             for item in value:
-                results = exec_local_cmd_pipe(f"ansible-galaxy {key} install {item}", self.logger)
+                results = self._galaxy_install(key, str(item), f"ansible-galaxy {key} install {item}")
                 if results[0] != 0:
                     message = f"Failed to install {key}. Error: {results[1]}"
                     self.logger.error(message)
                     raise AnsibleServiceError(message)
                 self.logger.info(f"{key.title()} '{item}' installed!")
 
+    def _galaxy_install(self, kind, content, cmd, u_path=None):
+        """Run the ansible-galaxy install command unless the same content is already installed.
+
+        :param kind: role or collection
+        :type kind: str
+        :param content: requirements file content or role/collection name
+        :type content: str or bytes
+        :param cmd: ansible-galaxy install command
+        :type cmd: str
+        :param u_path: folder the collections are installed into
+        :type u_path: str
+        :return: the results of the command
+        :rtype: tuple
+        """
+        from .utils.galaxy_cache import GalaxyInstallCache
+
+        if u_path and kind == 'collection':
+            install_paths = [u_path]
+        elif kind == 'collection':
+            install_paths = list(ans_constants.COLLECTIONS_PATHS)
+        else:
+            install_paths = list(ans_constants.DEFAULT_ROLES_PATH)
+
+        cache = GalaxyInstallCache(self.config.get('ANSIBLE_GALAXY_CACHE_DIR', '~/.cache/teflo/galaxy'))
+        return cache.install(kind, content, install_paths,
+                             lambda: exec_local_cmd_pipe(cmd, self.logger, timeout=self.ans_controller.timeout))
+
     def get_user_ansiblg_config(self, key=None):
         """getting the user configuration defined by ansible.cfg
 
@@ -627,7 +1044,7 @@ class AnsibleService(object):
                 os.remove(ans_logfile)
             self.logger.debug("ansible logging moved to: %s" % dest)
 
-    def run_playbook(self, playbook, extra_vars=None, run_options=None):
+    def run_playbook(self, playbook, extra_vars=None, run_options=None, event_handler=None):
         """Execute the playbook supplied."""
 
         if isinstance(playbook, dict):
@@ -645,6 +1062,9 @@ class AnsibleService(object):
 
         self.logger.info('Executing playbook : %s' % playbook_name)
 
+        # the task result events are only available with the runner backend
+        kwargs = dict(event_handler=event_handler) if event_handler else dict()
+
         # Calling ansible controller run playbook method
         results = self.ans_controller.run_playbook(
             playbook=playbook_name,
@@ -652,21 +1072,83 @@ class AnsibleService(object):
             extra_vars=extra_vars,
             run_options=run_options,
             ans_verbosity=self.ans_verbosity,
-            env_var=self.env_var
+            env_var=self.env_var,
+            **kwargs
         )
         return results
 
+    def run_results_playbook(self, playbook, extra_vars, kind, tasks):
+        """Run a generated playbook and return the results recorded by its tasks.
+
+        With the runner backend the results are taken from the task result
+        events of the given tasks. Otherwise the playbook copies them to a
+        results json file in the current directory which is read and removed.
+        Both backends name the hosts of the results after their gathered
+        hostname fact.
+
+        :param playbook: generated playbook
+        :type playbook: str
+        :param extra_vars: playbook variables
+        :type extra_vars: dict
+        :param kind: kind of the results (shell, script, batch)
+        :type kind: str
+        :param tasks: names of the tasks running the entries, mapped to the index of the entry
+        :type tasks: dict
+        :return: per host, the list of results of the entries it ran
+        :rtype: list
+        """
+        if self.ans_controller.backend == 'runner':
+            host_results = collections.OrderedDict()
+            host_names = dict()
+
+            def event_handler(event):
+                data = event.get('event_data', {})
+                res = data.get('res', {})
+                facts = res.get('ansible_facts', None) or {}
+                if 'ansible_hostname' in facts:
+                    # the playbook records the hostname fact, not the inventory name
+                    host_names[data.get('host')] = facts['ansible_hostname']
+                if data.get('task') not in tasks:
+                    return
+                # same precedence as the results recorded by the playbook
+                err = res['stderr'] if 'stderr' in res else res.get(
+                    'stdout', res.get('msg', 'stderr,stdout.msg NOT present in the output'))
+                host_results.setdefault(data.get('host'), list()).append(dict(
+                    index=tasks[data['task']], host_name=host_names.get(data.get('host'), data.get('host')),
+                    rc=int(res.get('rc', 1)), err=err))
+
+            self.run_playbook(playbook, extra_vars, event_handler=event_handler)
+            return list(host_results.values())
+
+        results_file = '%s-results-%s.json' % (kind, self.uid)
+        extra_vars['xresults_dir'] = os.getcwd()
+        self.run_playbook(playbook, extra_vars)
+        try:
+            with open(results_file) as f:
+                host_results = json.load(f)
+        except (IOError, OSError) as ex:
+            self.logger.error(ex)
+            raise AnsibleServiceError('Failed to find the %s-results.json file '
+                                      'which means there was an uncaught failure running '
+                                      'the dynamic playbook. Please enable verbose Ansible '
+                                      'logging in the teflo.cfg file and try again.' % kind)
+
+        # remove Results file
+        os.remove(results_file)
+
+        # the shell and script playbooks record a single result per host
+        return [results if isinstance(results, list) else [dict(results, index=0)] for results in host_results]
+
     def run_artifact_playbook(self, destination, artifacts):
         """Create playbook string for collecting artifacts"""
 
         # update and set extra vars
         self.ans_extra_vars.update(self.build_extra_vars())
         extra_vars = copy.deepcopy(self.ans_extra_vars)
-        extra_vars['dest'] = destination
+        # the local paths are resolved against the playbook folder, which is not the current directory
+        extra_vars['dest'] = os.path.abspath(destination)
         extra_vars['artifacts'] = artifacts
-
-        # dynamic playbook
-        playbook = self.playbook_name.safe_substitute(type='synchronize_', uid=self.uid)
+        extra_vars['xresults_dir'] = os.getcwd()
 
         # build run options
         run_options = self.build_run_options()
@@ -679,23 +1161,12 @@ class AnsibleService(object):
         # update dynamic playbook synchronize task with options in the block
         playbook_str = self.update_playbook_str(playbook_str, "{{ block_options }}", run_block_options_str)
 
-        # create dynamic playbook
-        self.create_playbook(playbook, playbook_str)
-
-        # run playbook
-        results = self.run_playbook(playbook, extra_vars)
-
-        # remove dynamic playbook
-        os.remove(playbook)
-
-        return results
+        # run dynamic playbook
+        return self.run_playbook(cached_playbook(self.config, 'synchronize_', playbook_str), extra_vars)
 
     def run_shell_playbook(self, shell):
         """Execute the shell command supplied."""
 
-        # dynamic playbook
-        playbook = self.playbook_name.safe_substitute(type='shell_', uid=self.uid)
-
         shell['command'] = self.evaluate_string(shell['command'])
 
         self.logger.info('Executing shell command %s' % (shell['command']))
@@ -719,33 +1190,17 @@ class AnsibleService(object):
         # update dynamic playbook shell task with options
         playbook_str = self.update_playbook_str(playbook_str, "{{ options }}", run_options_str)
 
-        # create dynamic playbook
-        self.create_playbook(playbook, playbook_str)
-
-        results = self.run_playbook(playbook, extra_vars)
+        # run dynamic playbook
+        host_results = self.run_results_playbook(cached_playbook(self.config, 'shell_', playbook_str), extra_vars,
+                                                 'shell', {'shell command': 0})
 
-        # remove dynamic playbook
-        os.remove(playbook)
-
-        # Get results from the json file and build results in sh_results
-        try:
-            sh_results = dict()
-            with open('shell-results-' + self.uid + '.json') as f:
-
-                my_json = json.load(f)
-                for item in my_json:
-                    sh_results['host'] = item['host_name']
-                    sh_results['rc'] = int(item['rc'])
-                    sh_results['err'] = item['err']
-        except (IOError, OSError) as ex:
-            self.logger.error(ex)
-            raise AnsibleServiceError('Failed to find the shell-results.json file '
-                                      'which means there was an uncaught failure running '
-                                      'the dynamic playbook. Please enable verbose Ansible '
-                                      'logging in the teflo.cfg file and try again.')
-
-        # remove Shell Results file
-        os.remove('shell-results-' + self.uid + '.json')
+        # build results in sh_results
+        sh_results = dict()
+        for results in host_results:
+            for item in results:
+                sh_results['host'] = item['host_name']
+                sh_results['rc'] = int(item['rc'])
+                sh_results['err'] = item['err']
 
         return sh_results
 
@@ -758,9 +1213,6 @@ class AnsibleService(object):
         test execution.
         """
 
-        # dynamic playbook
-        playbook = self.playbook_name.safe_substitute(type='clone_', uid=self.uid)
-
         self.logger.info('Cloning git repositories.')
 
         # set playbook variables
@@ -774,23 +1226,14 @@ class AnsibleService(object):
         # update dynamic playbook git task with options
         playbook_str = self.update_playbook_str(GIT_CLONE_PLAYBOOK, "{{ options }}", run_options_str)
 
-        # create dynamic playbook
-        self.create_playbook(playbook, playbook_str)
-
-        # run playbook
-        results = self.run_playbook(playbook, extra_vars)
-
-        # remove dynamic playbook
-        os.remove(playbook)
+        # run dynamic playbook
+        results = self.run_playbook(cached_playbook(self.config, 'clone_', playbook_str), extra_vars)
 
         return results[0]
 
     def run_script_playbook(self, script):
         """Execute the script supplied."""
 
-        # dynamic playbook
-        playbook = self.playbook_name.safe_substitute(type='script_', uid=self.uid)
-
         self.logger.info('Executing script %s:' % script['name'])
 
         extra_args = self.build_ans_extra_args(script)
@@ -804,7 +1247,7 @@ class AnsibleService(object):
 
         # set playbook variables
         extra_vars = copy.deepcopy(self.ans_extra_vars)
-        extra_vars['xscript'] = script['name']
+        extra_vars['xscript'] = self.resolve_script(script['name'])
 
         # update dynamic playbook shell task with args
         playbook_str = self.update_playbook_str(ADHOC_SCRIPT_PLAYBOOK, "{{ args }}", extra_args)
@@ -812,35 +1255,120 @@ class AnsibleService(object):
         # update dynamic playbook shell task with options
         playbook_str = self.update_playbook_str(playbook_str, "{{ options }}", run_options_str)
 
-        # create dynamic playbook
-        self.create_playbook(playbook, playbook_str)
+        # run dynamic playbook
+        host_results = self.run_results_playbook(cached_playbook(self.config, 'script_', playbook_str), extra_vars,
+                                                 'script', {'script command': 0})
 
-        # run playbook
-        results = self.run_playbook(playbook, extra_vars)
+        # build results in script_results
+        script_results = dict()
+        for results in host_results:
+            for item in results:
+                script_results['host'] = item['host_name']
+                script_results['rc'] = int(item['rc'])
+                script_results['err'] = item['err']
+        return script_results
 
-        # remove dynamic playbook
-        os.remove(playbook)
+    def run_batch_playbook(self, module, entries, valid_rcs):
+        """Execute several shell commands or scripts with a single playbook.
 
-        # Get results from the json file and build results in script_results
-        script_results = dict()
-        try:
-            with open('script-results-' + self.uid + '.json') as f:
-                my_json = json.load(f)
+        Every entry is rendered as its own task registering its own result,
+        so facts are gathered and ansible-playbook is started only once. Once
+        an entry fails on any host the remaining entries are skipped, the same
+        way the per entry playbooks stop at the first failure.
 
-                for item in my_json:
-                    script_results['host'] = item['host_name']
-                    script_results['rc'] = int(item['rc'])
-                    script_results['err'] = item['err']
-        except (IOError, OSError) as ex:
-            self.logger.error(ex)
-            raise AnsibleServiceError('Failed to find the script-results.json file '
-                                      'which means there was an uncaught failure running '
-                                      'the dynamic playbook. Please enable verbose Ansible '
-                                      'logging in the teflo.cfg file and try again.')
+        :param module: ansible module to run the entries with (shell/script)
+        :type module: str
+        :param entries: shell or script dictionaries of an execute
+        :type entries: list
+        :param valid_rcs: valid return codes per entry, None when ignored
+        :type valid_rcs: list
+        :return: results per entry, empty for entries which did not run
+        :rtype: list
+        """
+        # build run options
+        run_options = self.build_run_options()
+        run_options_str = self.convert_run_options(run_options)
 
-        # remove Script Results file
-        os.remove('script-results-' + self.uid + '.json')
-        return script_results
+        # update extra vars
+        self.ans_extra_vars.update(self.build_extra_vars())
+
+        # set playbook variables
+        extra_vars = copy.deepcopy(self.ans_extra_vars)
+        extra_vars['xbatch'] = list()
+        extra_vars['xbatch_rcs'] = [[] if rcs is None else list(rcs) for rcs in valid_rcs]
+
+        tasks_str = ''
+        for index, entry in enumerate(entries):
+            if module == 'shell':
+                entry['command'] = self.evaluate_string(entry['command'])
+                self.logger.info('Executing shell command %s' % entry['command'])
+            else:
+                self.logger.info('Executing script %s:' % entry['name'])
+
+            extra_args = self.build_ans_extra_args(entry)
+            extra_vars['xbatch'].append(entry['command'] if module == 'shell' else self.resolve_script(entry['name']))
+
+            # the valid return codes are extra vars, no valid return codes when the rc is ignored
+            failed_when = 'xbatch_rcs[%s] | length > 0 and batch_%s.rc | default(1) | int not in xbatch_rcs[%s]' \
+                % (index, index, index)
+
+            # update dynamic task with module, args, options and failure condition
+            task_str = self.update_playbook_str(ADHOC_BATCH_TASK, "{{ args }}", extra_args)
+            task_str = self.update_playbook_str(task_str, "{{ options }}", run_options_str)
+            task_str = self.update_playbook_str(task_str, "{{ failed_when }}", failed_when)
+            task_str = self.update_playbook_str(task_str, "{{ module }}", module)
+            tasks_str += self.update_playbook_str(task_str, "{{ index }}", str(index))
+
+        # run dynamic playbook
+        playbook_str = self.update_playbook_str(ADHOC_BATCH_PLAYBOOK, "{{ tasks }}", tasks_str)
+        host_results = self.run_results_playbook(
+            cached_playbook(self.config, 'batch_', playbook_str), extra_vars, 'batch',
+            dict([('batched %s %s' % (module, index), index) for index in range(len(entries))]))
+
+        return self.aggregate_batch_results(len(entries), valid_rcs, host_results)
+
+    @staticmethod
+    def aggregate_batch_results(count, valid_rcs, host_results):
+        """Build the result of every batched entry out of the results of every host.
+
+        An entry fails with the result of the first host it failed on. A host
+        which ran earlier entries but not this one stopped before it, the entry
+        then fails for that host as not run. Entries no host ran are left empty.
+
+        :param count: number of entries
+        :type count: int
+        :param valid_rcs: valid return codes per entry, None when ignored
+        :type valid_rcs: list
+        :param host_results: per host, the list of results of the entries it ran
+        :type host_results: list
+        :return: results per entry, empty for entries which did not run
+        :rtype: list
+        """
+        # results per entry keyed by the position of the host in the play
+        entry_results = [collections.OrderedDict() for _ in range(count)]
+        for position, results in enumerate(host_results):
+            for item in results:
+                entry_results[int(item['index'])][position] = dict(
+                    host=item['host_name'], rc=int(item['rc']), err=item['err'])
+
+        batch_results = list()
+        started = collections.OrderedDict()
+        for index, results in enumerate(entry_results):
+            if not results:
+                batch_results.append(dict())
+                continue
+            for position, result in results.items():
+                started.setdefault(position, result['host'])
+            failed = [result for result in results.values()
+                      if valid_rcs[index] is not None and result['rc'] not in valid_rcs[index]]
+            stopped = [host for position, host in started.items() if position not in results]
+            if failed:
+                batch_results.append(failed[0])
+            elif stopped:
+                batch_results.append(dict(host=stopped[0], rc=-1, err='Not run, the host stopped before this entry'))
+            else:
+                batch_results.append(list(results.values())[0])
+        return batch_results
 
 
 class AnsibleCredentialManager(object):
@@ -58,9 +58,32 @@ TASK_LOGLEVEL_CHOICES = [
 
 ITERATE_METHOD_CHOICES = [
     "by_level",
-    "by_depth"
+    "by_depth",
+    "parallel"
 ]
 
+# tasks run together as a single stream by the streaming pipeline mode
+STREAMED_TASKLIST = [
+    "provision",
+    "orchestrate",
+    "execute"
+]
+
+# inventory group holding every host of the master inventory, the ansible.cfg defaults are set on it
+INVENTORY_HOSTS_GROUP = 'teflo_hosts'
+
+# cap on the tasks a streamed pipeline runs at the same time
+STREAMED_TASKS_MAX_WORKERS = 10
+
+# executors able to run the tasks of a pipeline, set per task in task_concurrency
+PIPELINE_EXECUTORS = [
+    "blaster",
+    "thread"
+]
+
+# cap on the tasks the thread pipeline executor runs at the same time
+PIPELINE_THREAD_MAX_WORKERS = 10
+
 PROVISIONERS = {
     "beaker": ["beaker-client", "linchpin-wrapper"],
     "openstack": ["openstack-libcloud", "linchpin-wrapper"],
@@ -73,6 +96,9 @@ HOST_UPDATE_FIELDS = ["app_name", "routes", "ip_address", "hostname"]
 
 RESULTS_FILE = "results.yml"
 
+# Per user directory keeping the parsed variable files
+PARSED_FILES_CACHE_DIR = os.path.join("~", ".cache", "teflo", "parsed")
+
 # Rule for Teflo hosts naming convention
 RULE_HOST_NAMING = re.compile('[\\W]+')
 
@@ -100,12 +126,30 @@ DEFAULT_TIMEOUT = {
     "REPORT": 0,
     "EXECUTE": 0,
     "VALIDATE": 0,
-    "NOTIFICATION": 0
+    "NOTIFICATION": 0,
+    "COMMAND": 0
+}
+
+# ansible settings teflo manages for every ansible call of a run, see the ansible
+# section of teflo.cfg, a setting set to none is left to ansible
+DEFAULT_ANSIBLE = {
+    'FACT_CACHING': 'jsonfile',
+    'FACT_CACHING_TIMEOUT': '86400',
+    'GATHERING': 'smart',
+    'CONTROL_PERSIST': '30m',
+    'PIPELINING': 'True'
 }
 
+# Bytes read from the pipes of a local command at once, and the stderr tail
+# kept for the error of a failed command
+EXEC_PIPE_READ_SIZE = 65536
+EXEC_STDERR_MAX_SIZE = 1024 * 1024
+
 # Default config
 DEFAULT_CONFIG = {
     'ANSIBLE_LOG_REMOVE': True,
+    'ANSIBLE_BACKEND': 'subprocess',
+    'ANSIBLE_SCOPED_INVENTORY': False,
     'DATA_FOLDER': DATA_FOLDER,
     'LOG_LEVEL': 'info',
     'RESOURCE_CHECK_ENDPOINT': '',
@@ -119,16 +163,22 @@ DEFAULT_CONFIG = {
     'NOTIFICATIONS': [],
     'ALIAS': [],
     "TIMEOUT": DEFAULT_TIMEOUT,
+    "ANSIBLE": DEFAULT_ANSIBLE,
     "PROVISIONER_OPTIONS": [],
     "INCLUDED_SDF_ITERATE_METHOD": "by_level",
+    "INCLUDED_SDF_MAX_WORKERS": 4,
+    "PIPELINE_MODE": "by_task",
     "REMOTE_WORKSPACE_DOWNLOAD_LOCATION": ".teflo_remote_workspace_cache/",
+    "REMOTE_WORKSPACE_CACHE_DIR": os.path.join("~", ".cache", "teflo", "remote_workspaces"),
+    "REMOTE_WORKSPACE_CACHE_MAX_SIZE": 2048,
+    "ANSIBLE_GALAXY_CACHE_DIR": os.path.join("~", ".cache", "teflo", "galaxy"),
     "CLEAN_CACHED_WORKSPACE_AFTER_EACH_RUN": "True",
     "EXTRA_VARS_FILES": EXTRA_VARS_FILES,
 }
 
 # Default config sections
 DEFAULT_CONFIG_SECTIONS = ['defaults', 'credentials', 'orchestrator', 'feature_toggles', 'importer',
-                           'task_concurrency', 'setup_logger', 'executor', 'timeout', 'provisioner']
+                           'task_concurrency', 'setup_logger', 'executor', 'timeout', 'provisioner', 'ansible']
 
 # options on how credentials can be set
 SET_CREDENTIALS_OPTIONS = ['config', 'scenario']
@@ -185,3 +235,9 @@ LOGGING_CONFIG = {
 # Default retries for installing ansible dependencies
 ANSIBLE_GALAXY_INSTALL_DELAY = 30
 ANSIBLE_GALAXY_INSTALL_ATTEMPTS = 2
+
+# Backends used to run ansible playbooks, set by backend in the [orchestrator:ansible] section
+ANSIBLE_BACKENDS = ['subprocess', 'runner']
+
+# Seconds a host found reachable over ssh is not checked again
+SSH_READINESS_TTL = 120
@@ -26,8 +26,8 @@
 """
 import errno
 import os
-import yaml
 import inspect
+import tempfile
 from glob import glob
 from logging import CRITICAL, DEBUG, ERROR, INFO, WARNING
 from logging import getLogger, Filter
@@ -38,9 +38,9 @@ from .exceptions import TefloError, TefloResourceError, LoggerMixinError, TefloI
 from .helpers import get_core_tasks_classes, file_mgmt
 from traceback import format_exc
 from ._compat import RawConfigParser, string_types
-from .constants import LOGGING_CONFIG
-import threading
+from .constants import LOGGING_CONFIG, INVENTORY_HOSTS_GROUP
 from .helpers import gen_random_str
+from .utils.fork_safety import fork_safe_lock
 
 
 class LoggerMixin(object):
@@ -501,7 +501,7 @@ class TefloResource(LoggerMixin, TimeMixin):
         """
         Add a task to the list of tasks for the resource
         """
-        if t['task'] not in set(get_core_tasks_classes()):
+        if t['task'] not in get_core_tasks_classes():
             raise TefloResourceError(
                 'The task class "%s" used is not valid.' % t['task']
             )
@@ -1133,10 +1133,9 @@ class TefloPlugin(LoggerMixin, TimeMixin):
 
     @classmethod
     def get_schema_keys(cls):
-
-        with open(cls.__schema_file_path__) as f:
-            schema_data = f.read()
-        return yaml.safe_load(schema_data).get('mapping').keys()
+        # the schema file is loaded once per process, see ~teflo.utils.schema_cache.load_schema
+        from .utils.schema_cache import load_schema
+        return load_schema(cls.__schema_file_path__).get('mapping').keys()
 
     @classmethod
     def build_profile(cls, resource):
@@ -1439,7 +1438,7 @@ class SingletonMixin(object):
     """ This class helps in creating a singleton object for a class,
     so that object is created only once"""
 
-    __singleton_lock = threading.Lock()
+    __singleton_lock = fork_safe_lock()
     __singleton_instance = None
 
     @classmethod
@@ -1477,6 +1476,11 @@ class Inventory(LoggerMixin, FileLockMixin, SingletonMixin):
         self.inv_dump = inv_dump
         self._create_inv_dir()
 
+        # the master inventory as last written and the shared files it is built from
+        self._inv_parser = None
+        self._inv_stat = None
+        self._shared_files = dict()
+
     def _create_inv_dir(self):
         # set & create the inventory directory if not already present
         if 'inventory' in (os.path.basename(self.static_inv_dir),
@@ -1495,10 +1499,57 @@ class Inventory(LoggerMixin, FileLockMixin, SingletonMixin):
         # set the master inventory
         self.master_inv = os.path.join(self.inv_dir, 'inventory-%s' % self.uid)
 
+    def _load_shared_file(self, path, loader):
+        """Return the data of a file shared by all the hosts, loaded once.
+
+        The file is loaded again only when it changed on disk.
+        """
+        stat = os.stat(path)
+        key = (stat.st_mtime_ns, stat.st_size)
+        cached = self._shared_files.get(path)
+        if not cached or cached[0] != key:
+            cached = (key, loader(path))
+            self._shared_files[path] = cached
+        return cached[1]
+
+    @staticmethod
+    def _read_ansible_cfg_defaults(path):
+        ans_config = RawConfigParser(allow_no_value=True)
+        with open(path) as conf:
+            ans_config.read_file(conf)
+        return dict(ans_config['defaults'].items()) if ans_config.has_section('defaults') else dict()
+
+    def _load_master_inventory(self):
+        """Return the parser holding the master inventory.
+
+        The inventory built by the previous call is reused as long as the file
+        it was written to is unchanged, else the file is read again.
+        """
+        if not os.path.exists(self.master_inv):
+            self._inv_parser, self._inv_stat = None, None
+        else:
+            stat = os.stat(self.master_inv)
+            if self._inv_parser is None or self._inv_stat != (stat.st_mtime_ns, stat.st_size, stat.st_ino):
+                self._inv_parser = RawConfigParser(allow_no_value=True)
+                self._inv_parser.optionxform = str
+                with open(self.master_inv) as f:
+                    self._inv_parser.read_file(f)
+
+        if self._inv_parser is None:
+            # create parser object, raw config parser allows keys with no values
+            self._inv_parser = RawConfigParser(allow_no_value=True)
+            # disable default behavior to set values to lower case
+            self._inv_parser.optionxform = str
+        return self._inv_parser
+
     def create_inventory(self, all_hosts):
         """Create the master ansible inventory.
         This method will create a master inventory which contains all the
         hosts in the given scenario. Each host will have a group/group:vars.
+
+        The given hosts are added to the hosts already in the inventory. The
+        ansible.cfg defaults are shared by all the hosts, they are set once on
+        the INVENTORY_HOSTS_GROUP group which every host is a child of.
         """
         try:
 
@@ -1519,16 +1570,15 @@ class Inventory(LoggerMixin, FileLockMixin, SingletonMixin):
                 self.write_inventory()
                 return
 
-            # create parser object, raw config parser allows keys with no values
-            config = RawConfigParser(allow_no_value=True)
-            # disable default behavior to set values to lower case
-            config.optionxform = str
-
             # do not create master inventory if already exists
-            # load it and keep building upon it
-            if os.path.exists(self.master_inv):
-                with open(self.master_inv) as f:
-                    config.read_file(f)
+            # keep building upon it
+            config = self._load_master_inventory()
+
+            # get pkey var form ansible.cfg, the same for every host
+            ans_defaults = dict()
+            ans_path = self.config['WORKSPACE'] + '/ansible.cfg'
+            if os.path.exists(ans_path):
+                ans_defaults = self._load_shared_file(ans_path, self._read_ansible_cfg_defaults)
 
             # Sort the list of hosts so that if N number of hosts are getting
             # added to same host group the order is predictable.
@@ -1538,14 +1588,14 @@ class Inventory(LoggerMixin, FileLockMixin, SingletonMixin):
                 # just adding the assets who have valid ip address to the inventory. This will avoid empty  entries of
                 # assets with no ip_address
                 if hasattr(host, 'ip_address') and getattr(host, 'ip_address', None):
-                    if hasattr(host, 'groups'):
-                        for sect in getattr(host, 'groups', []):
-                            host_section = sect + ":children"
-                            if host_section in config.sections():
-                                config.set(host_section, host.name)
-                            else:
-                                config.add_section(host_section)
-                                config.set(host_section, host.name)
+                    groups = list(getattr(host, 'groups', None) or []) if hasattr(host, 'groups') else []
+                    if ans_defaults:
+                        groups.append(INVENTORY_HOSTS_GROUP)
+                    for sect in groups:
+                        host_section = sect + ":children"
+                        if not config.has_section(host_section):
+                            config.add_section(host_section)
+                        config.set(host_section, host.name)
 
                     # create section(s)
                     for item in [section, section_vars]:
@@ -1565,35 +1615,36 @@ class Inventory(LoggerMixin, FileLockMixin, SingletonMixin):
                             v = os.path.join(getattr(host, 'workspace'), v)
                         if k == 'ansible_port':
                             v = str(v)
-                        config.set(section_vars, k, v)
-
-                    # get pkey var form ansible.cfg
-                    ans_path = self.config['WORKSPACE'] + '/ansible.cfg'
-                    if os.path.exists(ans_path):
-                        ans_config = RawConfigParser(allow_no_value=True)
-                        with open(ans_path) as conf:
-                            ans_config.read_file(conf)
-
-                        for k, v in ans_config['defaults'].items():
-                            config.set(section_vars, k, v)
+                        # the ansible.cfg defaults override the host vars of the same name
+                        config.set(section_vars, k, ans_defaults.get(k, v))
 
                     # get ansible group_vars file
                     group_vars_path = self.config['WORKSPACE'] + '/ansible/group_vars/%s.yml' % section
                     if os.path.exists(group_vars_path):
-                        group_vars = file_mgmt('r', group_vars_path)
+                        group_vars = self._load_shared_file(group_vars_path, lambda path: file_mgmt('r', path))
                         for k, v in group_vars.items():
                             config.set(section_vars, k, v)
 
+            if ans_defaults:
+                hosts_vars = INVENTORY_HOSTS_GROUP + ':vars'
+                if not config.has_section(hosts_vars):
+                    config.add_section(hosts_vars)
+                for k, v in ans_defaults.items():
+                    config.set(hosts_vars, k, v)
+
             # write the inventory
             self.write_inventory(config)
 
-        except Exception as ex:
-            raise ex
+        except Exception:
+            # the inventory on disk is the one to build upon next time
+            self._inv_parser, self._inv_stat = None, None
+            raise
         finally:
             self.release()
 
-        self.logger.debug("Master inventory content")
-        self.log_inventory_content(config)
+        if self.logger.isEnabledFor(DEBUG):
+            self.logger.debug("Master inventory content")
+            self.log_inventory_content(config)
 
     def log_inventory_content(self, parser):
         # log the inventory file content
@@ -1615,9 +1666,21 @@ class Inventory(LoggerMixin, FileLockMixin, SingletonMixin):
 
     def write_inventory(self, config=None):
         # generic method to write out the inventory file
+        # the inventory is written next to the master inventory then moved over it,
+        # ansible never reads a partially written inventory
+        fd, tmp_path = tempfile.mkstemp(dir=self.inv_dir, prefix='.inventory-', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                if config:
+                    config.write(f)
+                else:
+                    f.write(self.inv_dump)
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, self.master_inv)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
         if config:
-            with open(self.master_inv, 'w') as f:
-                config.write(f)
-        else:
-            with open(self.master_inv, 'w+') as inv_file:
-                inv_file.write(self.inv_dump)
+            stat = os.stat(self.master_inv)
+            self._inv_stat = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
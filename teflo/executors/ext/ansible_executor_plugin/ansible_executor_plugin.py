@@ -89,6 +89,47 @@ class AnsibleExecutorPlugin(ExecutorPlugin):
         schema_validator(schema_data=self.build_profile(self.execute), schema_files=[self.__schema_file_path__],
                          schema_ext_files=[self.__schema_ext_path__])
 
+    def _run_batch(self, module, entries):
+        """Run all the shell commands or scripts of the execute with a single playbook.
+
+        Batching is enabled by setting **batch_commands** to true for the
+        runner executor in the teflo.cfg. Each entry keeps its own
+        ignore_rc/valid_rc, the remaining entries are not run once one fails.
+
+        :param module: shell or script
+        :type module: str
+        :param entries: shell or script entries of the execute
+        :type entries: list
+        :return: results per entry or None when the entries are not batched
+        :rtype: list
+        """
+        if self.config.get('RUNNER_BATCH_COMMANDS', 'False').lower() != 'true' or len(entries) < 2:
+            return None
+
+        valid_rcs = list()
+        for entry in entries:
+            ignorerc = self.ignorerc
+            validrc = self.validrc
+
+            if "ignore_rc" in entry and entry['ignore_rc']:
+                ignorerc = entry['ignore_rc']
+            elif "valid_rc" in entry and entry['valid_rc']:
+                validrc = entry['valid_rc']
+
+            if ignorerc:
+                valid_rcs.append(None)
+            elif validrc:
+                valid_rcs.append(validrc if isinstance(validrc, list) else [validrc])
+            else:
+                valid_rcs.append([0])
+
+        results = self.ans_service.run_batch_playbook(module, entries, valid_rcs)
+        for index, result in enumerate(results):
+            # entries after a failed one are skipped by the playbook on every host
+            if not result:
+                results[index] = dict(host=None, rc=-1, err='Not run, a previous entry of the batch failed')
+        return results
+
     def __git__(self):
 
         self.status = self.ans_service.run_git_playbook(self.git)
@@ -97,9 +138,10 @@ class AnsibleExecutorPlugin(ExecutorPlugin):
 
     def __shell__(self):
         self.logger.info('Executing shell commands:')
+        results = self._run_batch('shell', self.shell)
         for index, shell in enumerate(self.shell):
 
-            result = self.ans_service.run_shell_playbook(shell)
+            result = results[index] if results else self.ans_service.run_shell_playbook(shell)
 
             ignorerc = self.ignorerc
             validrc = self.validrc
@@ -137,9 +179,10 @@ class AnsibleExecutorPlugin(ExecutorPlugin):
 
     def __script__(self):
         self.logger.info('Executing scripts:')
+        results = self._run_batch('script', self.script)
         for index, script in enumerate(self.script):
 
-            result = self.ans_service.run_script_playbook(script)
+            result = results[index] if results else self.ans_service.run_script_playbook(script)
 
             ignorerc = self.ignorerc
             validrc = self.validrc
@@ -25,6 +25,7 @@
     :license: GPLv3, see LICENSE for more details.
 """
 from copy import deepcopy
+import importlib.metadata
 import inspect
 import json
 import os
@@ -35,33 +36,28 @@ import socket
 import string
 import subprocess
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 import time
 import click
 from logging import getLogger
 import fnmatch
+import functools
 import stat
-import jinja2
-import requests
 import ipaddress
-from paramiko import RSAKey
 from ruamel.yaml.comments import CommentedMap as OrderedDict
 from collections import OrderedDict
+from types import MappingProxyType
 from ruamel.yaml import YAML
 import yaml
-from paramiko.ssh_exception import SSHException
 from ._compat import string_types
-from .constants import PROVISIONERS, RULE_HOST_NAMING, TASKLIST, NOTIFYSTATES
+from .constants import PROVISIONERS, RULE_HOST_NAMING, TASKLIST, NOTIFYSTATES, SSH_READINESS_TTL, \
+    EXEC_PIPE_READ_SIZE, EXEC_STDERR_MAX_SIZE, PARSED_FILES_CACHE_DIR
 from .exceptions import TefloError, HelpersError
-from pykwalify.core import Core
-from pykwalify.errors import CoreError, SchemaError
+from .utils.fork_safety import fork_safe_lock
 from xml.etree import cElementTree as ET
 import socket
-from ssh.session import Session
-from ssh.key import import_privkey_file
-from ssh import options
-from ssh.exceptions import SSHError, HostKeyNotVerifiable, AuthenticationError, ConnectFailed, ConnectionLost
-import pkg_resources
 from ruamel.yaml import comments
 LOG = getLogger(__name__)
 
@@ -69,12 +65,112 @@ LOG = getLogger(__name__)
 _missing = object()
 
 
+class PluginRegistry(object):
+    """Process wide registry of the plugins teflo discovers through entry points.
+
+    The entry points of a group are discovered once and each plugin is only
+    loaded the first time a lookup needs it. Call ~PluginRegistry.refresh when
+    plugins are installed or removed within the same process.
+    """
+
+    def __init__(self):
+        self._lock = fork_safe_lock()
+        self._entry_points = dict()
+        self._plugins = dict()
+
+    def refresh(self, group=None):
+        """Forget the discovered entry points and loaded plugins.
+
+        :param group: entry point group to refresh, all groups when not set
+        :type group: str
+        """
+        with self._lock:
+            if group is None:
+                self._entry_points.clear()
+                self._plugins.clear()
+            else:
+                self._entry_points.pop(group, None)
+                self._plugins.pop(group, None)
+
+    def entry_points(self, group):
+        """Return the entry points of the group keyed by their name.
+
+        :param group: entry point group
+        :type group: str
+        :return: entry points
+        :rtype: dict
+        """
+        with self._lock:
+            if group not in self._entry_points:
+                entry_points = importlib.metadata.entry_points()
+                if hasattr(entry_points, 'select'):
+                    entry_points = entry_points.select(group=group)
+                else:
+                    # python 3.9 returns a dict keyed by the group
+                    entry_points = entry_points.get(group, [])
+                self._entry_points[group] = {entry_point.name: entry_point for entry_point in entry_points}
+            return self._entry_points[group]
+
+    def load(self, group, name):
+        """Return the plugin registered under the entry point name, loading it if needed.
+
+        :param group: entry point group
+        :type group: str
+        :param name: entry point name
+        :type name: str
+        :return: plugin class
+        """
+        with self._lock:
+            plugins = self._plugins.setdefault(group, dict())
+            if name not in plugins:
+                plugins[name] = self.entry_points(group)[name].load()
+            return plugins[name]
+
+    def get_plugins(self, group):
+        """Return all the plugins of the group keyed by their entry point name.
+
+        :param group: entry point group
+        :type group: str
+        :return: plugin classes
+        :rtype: dict
+        """
+        return {name: self.load(group, name) for name in self.entry_points(group)}
+
+    def find_plugin(self, group, match, name=None):
+        """Return the first plugin of the group the match function is true for.
+
+        Entry points named after the given plugin name are tried first, so
+        usually only the plugin being looked up gets loaded.
+
+        :param group: entry point group
+        :type group: str
+        :param match: function taking a plugin class and telling if it is the one
+        :type match: function
+        :param name: name of the plugin looked up
+        :type name: str
+        :return: plugin class or None
+        """
+        names = list(self.entry_points(group))
+        if name:
+            prefix = name.replace('-', '_')
+            names.sort(key=lambda item: not item.replace('-', '_').startswith(prefix))
+        for item in names:
+            plugin = self.load(group, item)
+            if match(plugin):
+                return plugin
+
+
+plugin_registry = PluginRegistry()
+
+
+@functools.lru_cache(maxsize=None)
 def get_core_tasks_classes():
     """
     Go through all modules within teflo.tasks package and return
-    the list of all tasks classes within it. All tasks within the teflo.tasks
+    the set of all tasks classes within it. All tasks within the teflo.tasks
     module are considered valid task class to be added into the pipeline.
-    :return: List of all valid tasks classes
+    The modules are only scanned once per process.
+    :return: frozenset of all valid tasks classes
     """
     from .core import TefloTask
     from . import tasks
@@ -96,7 +192,16 @@ def get_core_tasks_classes():
             if (clsmember is not TefloTask) and issubclass(clsmember, TefloTask):
                 tasks_list.append(clsmember)
 
-    return tasks_list
+    return frozenset(tasks_list)
+
+
+@functools.lru_cache(maxsize=None)
+def get_core_tasks_registry():
+    """
+    Return the core tasks classes keyed by their __task_name__.
+    :return: read only mapping of task name to task class
+    """
+    return MappingProxyType({cls.__task_name__: cls for cls in get_core_tasks_classes()})
 
 
 # Using entry point to get the provisioners defined in teflo's setup.py file
@@ -104,10 +209,7 @@ def get_provisioners_plugin_classes():
     """Return all provisioner plugin classes discovered by teflo
     :return: The list of provisioner plugin classes
     """
-    provisioner_plugin_dict = {}
-    for entry_point in pkg_resources.iter_entry_points('provisioner_plugins'):
-        provisioner_plugin_dict[entry_point.name] = entry_point.load()
-    return provisioner_plugin_dict
+    return plugin_registry.get_plugins('provisioner_plugins')
 
 
 def get_default_provisioner_plugin(provider=None):
@@ -151,9 +253,8 @@ def get_provisioner_plugin_class(name):
     :param name: The name of the provisioner
     :return: The provisioner gateway class
     """
-    for provisioner in get_provisioners_plugin_classes().values():
-        if provisioner.__plugin_name__.startswith(name):
-            return provisioner
+    return plugin_registry.find_plugin('provisioner_plugins',
+                                       lambda provisioner: provisioner.__plugin_name__.startswith(name), name)
 
 
 # Using entry point to get the providers from within teflo as well as the ones coming from the external plugins
@@ -161,10 +262,7 @@ def get_provider_plugin_classes():
     """Return all provider plugin classes discovered by teflo
     :return: The list of provider plugin classes
     """
-    provider_plugin_dict = {}
-    for entry_point in pkg_resources.iter_entry_points('provider_plugins'):
-        provider_plugin_dict[entry_point.name] = entry_point.load()
-    return provider_plugin_dict
+    return plugin_registry.get_plugins('provider_plugins')
 
 
 def get_provider_plugin_class(name):
@@ -174,9 +272,7 @@ def get_provider_plugin_class(name):
     :param name: the name of the provider
     :return: the provider class
     """
-    for provider in get_provider_plugin_classes().values():
-        if provider.__provider_name__ == name:
-            return provider
+    return plugin_registry.find_plugin('provider_plugins', lambda provider: provider.__provider_name__ == name, name)
 
 
 def get_provider_plugin_list():
@@ -193,10 +289,7 @@ def get_orchestrators_plugin_classes():
     """Return all orchestrator plugin classes discovered by teflo
     :return: The list of orchestrator plugin classes
     """
-    orchestrator_plugin_dict = {}
-    for entry_point in pkg_resources.iter_entry_points('orchestrator_plugins'):
-        orchestrator_plugin_dict[entry_point.name] = entry_point.load()
-    return orchestrator_plugin_dict.values()
+    return plugin_registry.get_plugins('orchestrator_plugins').values()
 
 
 def get_orchestrator_plugin_class(name):
@@ -206,9 +299,8 @@ def get_orchestrator_plugin_class(name):
     :param name: the name of the orchestrator
     :return: the orchestrator class
     """
-    for orchestrator in get_orchestrators_plugin_classes():
-        if orchestrator.__plugin_name__ == name:
-            return orchestrator
+    return plugin_registry.find_plugin('orchestrator_plugins',
+                                       lambda orchestrator: orchestrator.__plugin_name__ == name, name)
 
 
 def get_orchestrators_plugin_list():
@@ -225,10 +317,7 @@ def get_executors_plugin_classes():
     """Return all executor plugin classes discovered by teflo
     :return: The list of executor plugin classes
     """
-    executor_plugin_dict = {}
-    for entry_point in pkg_resources.iter_entry_points('executor_plugins'):
-        executor_plugin_dict[entry_point.name] = entry_point.load()
-    return executor_plugin_dict.values()
+    return plugin_registry.get_plugins('executor_plugins').values()
 
 
 def get_executor_plugin_class(name):
@@ -238,9 +327,7 @@ def get_executor_plugin_class(name):
     :param name: the name of the executor
     :return: the executor class
     """
-    for executor in get_executors_plugin_classes():
-        if executor.__executor_name__ == name:
-            return executor
+    return plugin_registry.find_plugin('executor_plugins', lambda executor: executor.__executor_name__ == name, name)
 
 
 def get_executors_plugin_list():
@@ -257,10 +344,7 @@ def get_importers_plugin_classes():
     """Return all importer plugin classes discovered by teflo
     :return: The list of importer plugin classes
     """
-    ext_plugin_dict = {}
-    for entry_point in pkg_resources.iter_entry_points('importer_plugins'):
-        ext_plugin_dict[entry_point.name] = entry_point.load()
-    return ext_plugin_dict.values()
+    return plugin_registry.get_plugins('importer_plugins').values()
 
 
 def get_default_importer_plugin_class(provider):
@@ -268,9 +352,9 @@ def get_default_importer_plugin_class(provider):
     :param provider: The provider class
     :return: The importer plugin class
     """
-    for plugin_class in get_importers_plugin_classes():
-        if plugin_class.__plugin_name__.startswith(provider.__provider_name__):
-            return plugin_class
+    return plugin_registry.find_plugin(
+        'importer_plugins', lambda plugin_class: plugin_class.__plugin_name__.startswith(provider.__provider_name__),
+        provider.__provider_name__)
 
 
 def get_importers_plugin_list():
@@ -290,9 +374,8 @@ def get_importer_plugin_class(name):
     :param name: The name of the importer
     :return: The importer plugin class
     """
-    for reporter in get_importers_plugin_classes():
-        if reporter.__plugin_name__.startswith(name):
-            return reporter
+    return plugin_registry.find_plugin('importer_plugins', lambda reporter: reporter.__plugin_name__.startswith(name),
+                                       name)
 
 
 def is_provider_mapped_to_provisioner(provider, provisioner):
@@ -331,10 +414,7 @@ def get_notifiers_plugin_classes():
     """Return all notification plugin classes discovered by teflo
     :return: The list of notification plugin classes
     """
-    notifier_plugin_dict = {}
-    for entry_point in pkg_resources.iter_entry_points('notification_plugins'):
-        notifier_plugin_dict[entry_point.name] = entry_point.load()
-    return notifier_plugin_dict.values()
+    return plugin_registry.get_plugins('notification_plugins').values()
 
 
 def get_notifier_plugin_class(name):
@@ -344,26 +424,20 @@ def get_notifier_plugin_class(name):
     :param name: the name of the notification
     :return: the notification class
     """
-    for notification in get_notifiers_plugin_classes():
-        if notification.__plugin_name__ == name or \
-                notification.__plugin_name__.startswith(name):
-            return notification
+    return plugin_registry.find_plugin('notification_plugins',
+                                       lambda notification: notification.__plugin_name__.startswith(name), name)
 
 
-def schema_validator(schema_data, schema_files, schema_creds=None, schema_ext_files=None):
-    """
+def _schema_source(schema_data, schema_creds=None):
+    """Build the data validated against the schema from the resource profile.
 
     :param schema_data: the schema dictionary data
     :type dict
-    :param schema_files: the yaml schema file for the plugins
-    :type list of file paths
     :param schema_creds: optional dictionary creds
     :type dict
-    :param schema_ext_files: optional list of extension file paths
-    :type: list of file paths
-    :return:
+    :return: the data to validate
+    :rtype: dict
     """
-
     schema = {}
 
     if schema_creds:
@@ -375,10 +449,34 @@ def schema_validator(schema_data, schema_files, schema_creds=None, schema_ext_fi
         if creds:
             creds = dict(credential={x: y for k, v in creds.items() for x, y in v.items() if x != 'name'})
             schema.update(creds)
+    return schema
 
-    c = Core(source_data=schema,
-             schema_files=schema_files,
-             extensions=schema_ext_files)
+
+def schema_validator(schema_data, schema_files, schema_creds=None, schema_ext_files=None):
+    """
+    The schema and extension files are loaded and compiled once per process,
+    see ~teflo.utils.schema_cache.CompiledSchema
+
+    :param schema_data: the schema dictionary data
+    :type dict
+    :param schema_files: the yaml schema file for the plugins
+    :type list of file paths
+    :param schema_creds: optional dictionary creds
+    :type dict
+    :param schema_ext_files: optional list of extension file paths
+    :type: list of file paths
+    :return:
+    """
+    from pykwalify.errors import CoreError, SchemaError
+    from .utils.schema_cache import CompiledSchema, CompiledSchemaCore
+
+    compiled_schema = CompiledSchema.get(schema_files, schema_ext_files)
+    source_data = _schema_source(schema_data, schema_creds)
+    if compiled_schema.is_validated(source_data):
+        # already validated by ~schema_validator_batch
+        return
+
+    c = CompiledSchemaCore(source_data, compiled_schema)
 
     try:
         c.validate(raise_exception=True)
@@ -387,6 +485,111 @@ def schema_validator(schema_data, schema_files, schema_creds=None, schema_ext_fi
         raise
 
 
+def schema_validator_batch(schema_data_list, schema_files, schema_creds=None, schema_ext_files=None):
+    """
+    Validate many resources of the same plugin type against the schema in one pass,
+    the schema is compiled once for all of them. All the resources are validated,
+    a single error listing the failures of every invalid resource is raised. The
+    data found valid is not validated again by ~schema_validator in this process
+    or the processes forked from it.
+
+    :param schema_data_list: the schema dictionary data of each resource
+    :type list of dict
+    :param schema_files: the yaml schema file for the plugins
+    :type list of file paths
+    :param schema_creds: optional dictionary creds
+    :type dict
+    :param schema_ext_files: optional list of extension file paths
+    :type: list of file paths
+    :return:
+    """
+    from pykwalify.errors import SchemaError
+    from .utils.schema_cache import CompiledSchema, CompiledSchemaCore
+
+    compiled_schema = CompiledSchema.get(schema_files, schema_ext_files)
+    failures = []
+    for idx, schema_data in enumerate(schema_data_list):
+        source_data = _schema_source(schema_data, schema_creds)
+        c = CompiledSchemaCore(source_data, compiled_schema)
+        c.validate(raise_exception=False)
+        if c.validation_errors:
+            name = schema_data.get('name', idx) if isinstance(schema_data, dict) else idx
+            failures.append(u"%s:\n - %s." % (name, u'.\n - '.join(c.validation_errors)))
+        else:
+            compiled_schema.set_validated(source_data)
+
+    if failures:
+        ex = SchemaError(u"Schema validation failed for %s of %s resources:\n%s"
+                         % (len(failures), len(schema_data_list), u'\n'.join(failures)))
+        LOG.error(ex.msg)
+        raise ex
+
+
+def compile_resource_schemas(resources):
+    """
+    Compile the schemas the resources are validated against, once per plugin type.
+    The validate tasks running concurrently are forked from this process, compiling
+    the schemas beforehand lets all of them reuse the compiled schemas.
+
+    :param resources: the resources to be validated
+    :type resources: list
+    """
+    from .constants import SCENARIO_SCHEMA, SCHEMA_EXT
+    from .resources import Scenario
+    from .utils.schema_cache import CompiledSchema
+
+    schemas = set()
+    for resource in resources:
+        if isinstance(resource, Scenario):
+            schemas.add(((SCENARIO_SCHEMA,), (SCHEMA_EXT,)))
+            continue
+        for attr in ['provisioner', 'orchestrator', 'executor', 'notifier']:
+            plugin = getattr(resource, attr, None)
+            if not inspect.isclass(plugin) or not getattr(plugin, '__schema_file_path__', None):
+                continue
+            schema_ext_file = getattr(plugin, '__schema_ext_path__', None) or \
+                getattr(plugin, '__schema_exts_path__', None)
+            schemas.add(((plugin.__schema_file_path__,), (schema_ext_file,) if schema_ext_file else ()))
+
+    for schema_files, schema_ext_files in schemas:
+        try:
+            CompiledSchema.get(list(schema_files), list(schema_ext_files))
+        except Exception as ex:
+            # the error is reported by the validate task of the resource
+            LOG.debug('Unable to compile the schema %s: %s' % (schema_files, ex))
+
+
+def validate_resource_schemas(resources):
+    """
+    Validate the resources against the schema of their plugin, with one call to
+    ~schema_validator_batch per plugin type. The validate tasks, forked afterwards,
+    do not validate the resources found valid against the schema again. The
+    resources found invalid are reported by their validate task.
+
+    :param resources: the resources to be validated
+    :type resources: list
+    """
+    plugins = OrderedDict()
+    for resource in resources:
+        if getattr(resource, 'is_static', False):
+            continue
+        for attr in ['provisioner', 'orchestrator', 'executor']:
+            plugin = getattr(resource, attr, None)
+            if inspect.isclass(plugin) and getattr(plugin, '__schema_file_path__', None):
+                plugins.setdefault(plugin, []).append(resource)
+
+    for plugin, plugin_resources in plugins.items():
+        schema_ext_file = getattr(plugin, '__schema_ext_path__', None) or \
+            getattr(plugin, '__schema_exts_path__', None)
+        try:
+            schema_validator_batch([plugin.build_profile(resource) for resource in plugin_resources],
+                                   schema_files=[plugin.__schema_file_path__],
+                                   schema_ext_files=[schema_ext_file] if schema_ext_file else None)
+        except Exception as ex:
+            # the error is reported by the validate task of the resource
+            LOG.debug('Unable to validate the %s resources in a batch: %s' % (plugin.__name__, ex))
+
+
 def gen_random_str(char_num=8):
     """
     Generate a string with a specific number of characters, defined
@@ -488,6 +691,7 @@ def is_url_valid(url):
     :return: True if url exists or false if url does not exist.
     :rtype: bool
     """
+    import requests
     try:
         response = requests.get(url)
         response.raise_for_status()
@@ -497,6 +701,27 @@ def is_url_valid(url):
     return True
 
 
+@functools.lru_cache(maxsize=None)
+def _template_environment(path):
+    """Return the jinja environment loading the templates of a directory, it is created
+    once per directory. The environment keeps the compiled templates in memory and
+    compiles a template again only when its file modification time changed, the compiled
+    code is also cached on disk so the next runs do not compile unchanged templates again.
+
+    :param path: directory of the templates
+    :type path: str
+    :return: jinja environment
+    """
+    import jinja2
+    try:
+        bytecode_cache = jinja2.FileSystemBytecodeCache()
+    except RuntimeError:
+        # no safe temporary directory to keep the cache in
+        bytecode_cache = None
+    return jinja2.Environment(loader=jinja2.FileSystemLoader(path), lstrip_blocks=True, trim_blocks=False,
+                              auto_reload=True, bytecode_cache=bytecode_cache)
+
+
 def template_render(filepath, env_dict):
     """
     A function to do jinja templating given a file and a dictionary of key/vars
@@ -506,10 +731,10 @@ def template_render(filepath, env_dict):
     :return: stream of data with the templating complete
     :rtype: data stream
     """
-    path, filename = os.path.split(filepath)
+    # the environments are kept per absolute directory, a relative path depends on the current directory
+    path, filename = os.path.split(os.path.abspath(filepath))
 
-    return jinja2.Environment(loader=jinja2.FileSystemLoader(
-            path), lstrip_blocks=True, trim_blocks=False).get_template(filename).render(env_dict)
+    return _template_environment(path).get_template(filename).render(env_dict)
 
 
 def exec_local_cmd(cmd, env_var=None):
@@ -533,17 +758,27 @@ def exec_local_cmd(cmd, env_var=None):
     return proc.returncode, output[0].decode('utf-8'), output[1].decode('utf-8')
 
 
-def exec_local_cmd_pipe(cmd, logger, env_var=None):
+def exec_local_cmd_pipe(cmd, logger, env_var=None, timeout=None):
     """Execute command locally, and pipe output in real time.
 
+    The stdout and stderr of the command are read together as they become
+    available, so a command writing a lot to stderr cannot block on a full
+    pipe. Complete stdout lines are forwarded to the logger after each read
+    and only the tail of stderr is kept.
+
     :param cmd: command to run
     :type cmd: str
     :param env_var: a dictionary of environmental variables to pass to the subprocess
     :type env_var: dictionary
     :param logger: logger object
     :type logger: object
+    :param timeout: seconds after which the command is killed, 0 or None for no timeout
+    :type timeout: int
     :return: tuple of rc and error (if there was an error)
     """
+    import selectors
+    import signal
+
     # updating passed env variables with os env variables
     if env_var:
         env_var.update(os.environ)
@@ -552,23 +787,48 @@ def exec_local_cmd_pipe(cmd, logger, env_var=None):
         shell=True,
         stdout=subprocess.PIPE,
         stderr=subprocess.PIPE,
-        bufsize=2,
         close_fds=True,
-        env=env_var
+        env=env_var,
+        # own process group, so the whole command can be killed on timeout
+        start_new_session=bool(timeout)
     )
-    while True:
-        output, error = ("", "")
-        if proc.poll is not None:
-            output = proc.stdout.readline().decode('utf-8')
-        if output == "" and error == "" and proc.poll() is not None:
-            break
-        if output:
-            logger.info(output.rstrip())
-    rc = proc.poll()
+    deadline = time.monotonic() + timeout if timeout else None
+    timed_out = False
+    output, error = (b"", b"")
+
+    with selectors.DefaultSelector() as selector:
+        selector.register(proc.stdout, selectors.EVENT_READ, 'stdout')
+        selector.register(proc.stderr, selectors.EVENT_READ, 'stderr')
+        while selector.get_map():
+            wait = None
+            if deadline is not None:
+                wait = deadline - time.monotonic()
+                if wait <= 0:
+                    timed_out = True
+                    os.killpg(proc.pid, signal.SIGKILL)
+                    break
+            for key, _ in selector.select(wait):
+                data = os.read(key.fileobj.fileno(), EXEC_PIPE_READ_SIZE)
+                if not data:
+                    selector.unregister(key.fileobj)
+                elif key.data == 'stdout':
+                    *lines, output = (output + data).split(b'\n')
+                    for line in lines:
+                        logger.info(line.decode('utf-8', 'replace').rstrip())
+                else:
+                    error = (error + data)[-EXEC_STDERR_MAX_SIZE:]
+    if output:
+        logger.info(output.decode('utf-8', 'replace').rstrip())
+    proc.stdout.close()
+    proc.stderr.close()
+
+    rc = proc.wait()
+    if timed_out:
+        logger.error('Command timed out after %s seconds: %s' % (timeout, cmd))
+        error += b'\nCommand timed out after %d seconds' % timeout
     if rc != 0:
-        for line in proc.stderr:
-            error = error + line.decode('utf-8')
-    return rc, error
+        return rc, error.decode('utf-8', 'replace')
+    return rc, ""
 
 
 class CustomDict(dict):
@@ -827,14 +1087,96 @@ def is_ipv4(address):
     return isinstance(ip, ipaddress.IPv4Address)
 
 
+class SshReadinessCache(object):
+    """Hosts found reachable over ssh during the run.
+
+    Entries are keyed by (address, port, user, key file). They expire after
+    the ttl and are dropped as soon as connecting to the host fails.
+    """
+
+    def __init__(self, ttl):
+        """Constructor.
+
+        :param ttl: seconds a reachable host is not checked again
+        :type ttl: int
+        """
+        self.ttl = ttl
+        self._lock = fork_safe_lock()
+        self._ready = dict()
+
+    def is_ready(self, key):
+        """Tell if the host was found reachable within the ttl.
+
+        :param key: (address, port, user, key file)
+        :type key: tuple
+        :rtype: bool
+        """
+        with self._lock:
+            ready_at = self._ready.get(key)
+            if ready_at is not None and time.monotonic() - ready_at > self.ttl:
+                del self._ready[key]
+                ready_at = None
+            return ready_at is not None
+
+    def mark_ready(self, key):
+        """Record the host as reachable.
+
+        :param key: (address, port, user, key file)
+        :type key: tuple
+        """
+        with self._lock:
+            self._ready[key] = time.monotonic()
+
+    def invalidate(self, key=None):
+        """Forget a host, or all of them when no key is given.
+
+        :param key: (address, port, user, key file)
+        :type key: tuple
+        """
+        with self._lock:
+            if key is None:
+                self._ready.clear()
+            else:
+                self._ready.pop(key, None)
+
+
+ssh_readiness_cache = SshReadinessCache(SSH_READINESS_TTL)
+
+
+@functools.lru_cache(maxsize=None)
+def _import_ssh_private_key(key_file, mtime):
+    """Parse a ssh private key file once, the modification time is part of the cache key
+    so a rewritten key file is parsed again.
+
+    :param key_file: path of the private key file
+    :type key_file: str
+    :param mtime: modification time of the key file
+    :type mtime: int
+    :return: private key
+    """
+    from ssh.key import import_privkey_file
+    return import_privkey_file(key_file)
+
+
 def ssh_retry(obj):
     """
     Decorator to check SSH Connection before method execution.
-    Will perform 30 retries with sleep of 10 seconds
-    between attempts
+    The host groups are checked concurrently, each one is tried up to 30 times
+    with a capped exponential backoff (1 up to 15 seconds, with jitter)
+    between attempts. Once a host group is unreachable the others stop retrying.
+    Hosts found reachable are not checked again for a while, see ~SshReadinessCache.
     """
+    # ansible-playbook/ansible return code when hosts are unreachable
+    UNREACHABLE_RC = 4
     MAX_ATTEMPTS = 30
-    MAX_WAIT_TIME = 10
+    MIN_WAIT_TIME = 1
+    MAX_WAIT_TIME = 15
+    MAX_WORKERS = 10
+
+    def backoff(attempt):
+        """Return the time to wait before the given attempt"""
+        wait_time = min(MAX_WAIT_TIME, MIN_WAIT_TIME * 2 ** (attempt - 2))
+        return random.uniform(wait_time / 2.0, wait_time)
 
     def check_access(*args, **kwargs):
         """
@@ -860,11 +1202,14 @@ def ssh_retry(obj):
                     'ERROR: Unexpected error - Group %s not found in inventory file!' % kwargs['extra_vars']['hosts']
                 )
 
-        def can_connect(group):
+        def can_connect(group, stop):
+            from ssh import options
+            from ssh.exceptions import SSHError, HostKeyNotVerifiable, AuthenticationError, ConnectFailed, \
+                ConnectionLost
+            from ssh.session import Session
 
             sys_vars = group.vars
             server_ip = group.hosts[0].address
-            server_ip_address = socket.getaddrinfo(server_ip, None)[0][-1][0]
             LOG.info(server_ip)
 
             # skip ssh connectivity check if server is localhost
@@ -875,12 +1220,21 @@ def ssh_retry(obj):
             server_key_file = sys_vars['ansible_ssh_private_key_file']
             server_ssh_port = 22 if 'ansible_port' not in sys_vars else sys_vars.get('ansible_port')
 
+            # skip ssh connectivity check if server was recently reachable
+            key = (server_ip, server_ssh_port, server_user, server_key_file)
+            probed.append(key)
+            if ssh_readiness_cache.is_ready(key):
+                LOG.debug("Server %s - IP: %s was recently reachable." % (group, server_ip))
+                return False
+            server_ip_address = socket.getaddrinfo(server_ip, None)[0][-1][0]
+
             # Perform SSH checks
             attempt = 1
             while attempt <= MAX_ATTEMPTS:
+                sock = None
                 try:
                     # Test ssh connection
-                    pkey = import_privkey_file(server_key_file)
+                    pkey = _import_ssh_private_key(server_key_file, os.stat(server_key_file).st_mtime_ns)
 
                     if is_ipv4(server_ip_address):
                         sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
@@ -898,23 +1252,33 @@ def ssh_retry(obj):
                     # Test ssh connection
                     session.connect()
                     rc = session.userauth_publickey(pkey)
+                    session.disconnect()
                     LOG.debug("Server %s - IP: %s is reachable." %
                               (group, server_ip))
+                    ssh_readiness_cache.mark_ready(key)
                     break
 
                 except (SSHError, HostKeyNotVerifiable, AuthenticationError, socket.error, ConnectFailed,
                         ConnectionLost) as ex:
+                    ssh_readiness_cache.invalidate(key)
                     attempt = attempt + 1
                     LOG.error(ex)
                     LOG.error("Server %s - IP: %s is unreachable." % (group,
                                                                       server_ip))
                     if attempt <= MAX_ATTEMPTS:
-                        LOG.info('Attempt %s of %s: retrying in %s seconds' %
-                                 (attempt, MAX_ATTEMPTS, MAX_WAIT_TIME))
-                        time.sleep(MAX_WAIT_TIME)
+                        wait_time = backoff(attempt)
+                        LOG.info('Attempt %s of %s: retrying in %.1f seconds' %
+                                 (attempt, MAX_ATTEMPTS, wait_time))
+                        # stop waiting as soon as another host group is found unreachable
+                        if stop.wait(wait_time):
+                            return True
                 except Exception:
                     LOG.error("Error occured while attempting to ssh to the host. Please verify ssh keys")
+                    stop.set()
                     return True
+                finally:
+                    if sock is not None:
+                        sock.close()
 
             # Check Max SSH Retries performed
             if attempt > MAX_ATTEMPTS:
@@ -922,22 +1286,29 @@ def ssh_retry(obj):
                     'Max Retries exceeded. SSH ERROR - Resource unreachable - Server %s - IP: %s!' %
                     (group, server_ip)
                 )
+                stop.set()
                 return True
             return False
 
+        groups = list()
         for host_group in host_groups:
             inv_group = inv_groups[host_group]
             # This is just here for backwards compat. In case I've missed any
             # corner case
             if hasattr(inv_group, 'child_groups') and inv_group.child_groups:
                 LOG.debug('In the child group block')
-                for group in inv_group.child_groups:
-                    ssh_errs = can_connect(group)
+                groups.extend(inv_group.child_groups)
             else:
                 # Most cases should be falling into this block,
                 # based on teflo returning the actual host asset name once its
                 # done with its fetch_assets logic
-                ssh_errs = can_connect(inv_group)
+                groups.append(inv_group)
+
+        # check all the host groups at the same time, returning once every one of them answered
+        probed = list()
+        stop = threading.Event()
+        with ThreadPoolExecutor(max_workers=max(1, min(len(groups), MAX_WORKERS))) as executor:
+            ssh_errs = True in list(executor.map(lambda group: can_connect(group, stop), groups))
 
         # Check for SSH Errors
         if ssh_errs:
@@ -947,6 +1318,10 @@ def ssh_retry(obj):
 
         # Run Playbook/Module
         result = obj(*args, **kwargs)
+        if isinstance(result, tuple) and result and result[0] == UNREACHABLE_RC:
+            # ansible could not reach some of the hosts, check them again next time
+            for key in probed:
+                ssh_readiness_cache.invalidate(key)
         return result
 
     return check_access
@@ -1518,24 +1893,103 @@ def preprocyaml(input, temp_data):
 
 def preprocyaml_jinja(temp_data: dict, file_path: str = None) -> dict:
     """
-    This function recursively render the temp_data(var_data), with itself until
-    the rendered result doesn't change any more.
+    This function renders the temp_data(var_data) with itself.
+    The variables referenced by each variable are parsed once to build a dependency
+    graph, each variable is then rendered, until the rendered result doesn't change
+    any more, with the already rendered values of the variables it depends on.
+    Variables referencing each other are rendered together, a TefloError is raised
+    when their rendered results keep changing.
     It returns a dict version of the temp_data
     """
-    prev_res = ""
-    res_dict = temp_data
-    result = yaml.dump(res_dict, sort_keys=False)
+    import jinja2
+    from jinja2 import meta
 
     class NullUndefined(jinja2.Undefined):
         def __getattr__(self, key):
             return ''
 
-    while result != prev_res:
-        prev_res = result
-        t = jinja2.Template(result, undefined=NullUndefined)
-        result = t.render(yaml.safe_load(result))
-
-    return yaml.safe_load(result)
+    env = jinja2.Environment(undefined=NullUndefined)
+
+    # each variable is rendered the same way it is written in the yaml dump of the var data
+    texts = {key: yaml.dump({key: value}, sort_keys=False) for key, value in temp_data.items()}
+    templates = {}
+    ast = {}
+    for key, text in texts.items():
+        if '{' in text:
+            ast[key] = env.parse(text)
+            templates[key] = env.from_string(ast[key])
+    dependencies = {key: [dep for dep in meta.find_undeclared_variables(ast[key]) if dep in templates]
+                    for key in templates}
+
+    # group the variables referencing each other (kosaraju), in dependency order.
+    # Both walks are iterative so a long chain of variables can't overflow the stack
+    finished = []
+    seen = set()
+    for root in dependencies:
+        if root in seen:
+            continue
+        seen.add(root)
+        stack = [(root, iter(dependencies[root]))]
+        while stack:
+            key, deps = stack[-1]
+            for dep in deps:
+                if dep not in seen:
+                    seen.add(dep)
+                    stack.append((dep, iter(dependencies[dep])))
+                    break
+            else:
+                stack.pop()
+                finished.append(key)
+
+    dependents = {key: [] for key in dependencies}
+    for key, deps in dependencies.items():
+        for dep in deps:
+            dependents[dep].append(key)
+    components = []
+    assigned = set()
+    for root in reversed(finished):
+        if root in assigned:
+            continue
+        assigned.add(root)
+        component, stack = [], [root]
+        while stack:
+            key = stack.pop()
+            component.append(key)
+            for dependent in dependents[key]:
+                if dependent not in assigned:
+                    assigned.add(dependent)
+                    stack.append(dependent)
+        components.append(component)
+
+    values = yaml.safe_load(yaml.dump(temp_data, sort_keys=False)) or {}
+    context = dict(values)
+    rendered = {}
+    for component in reversed(components):
+        cyclic = len(component) > 1 or component[0] in dependencies[component[0]]
+        results = {key: texts[key] for key in component}
+        current = {key: templates[key] for key in component}
+        passes = 0
+        while current:
+            passes += 1
+            if cyclic and passes > len(component) + 2:
+                raise TefloError('The variables have a circular reference: %s' % ', '.join(map(str, component)))
+            changed = {}
+            for key, template in current.items():
+                result = template.render(context)
+                if result != results[key]:
+                    changed[key] = result
+            for key, result in changed.items():
+                results[key] = result
+                rendered[key] = yaml.safe_load(result) or {}
+                context.update(rendered[key])
+            # a rendered result without any jinja left in it can not change any more
+            current = {key: env.from_string(results[key]) for key in (component if cyclic and changed else changed)
+                       if '{' in results[key]}
+
+    res_dict = {}
+    for key in texts:
+        res_dict.update(rendered[key] if key in rendered else {key: values.get(key)})
+    return res_dict
 
 
 def preproc_path(data_folder: str) -> str:
@@ -1573,12 +2027,17 @@ def validate_render_scenario(scenario_path, config, temp_data_raw=()):
     :return scenario_graph
     :rtype: ScenarioGraph
     """
+    import jinja2
+
+    from .utils.parse_cache import ParseCache
 
     # Click gives us a tuple, by default
     var_file_list = check_for_var_file(config, temp_data_raw)
-    # Convert each item to an object, then reduce them all back to one
-    temp_data_objs = [file_mgmt("r", t) if os.path.isfile(t)
-                                  else json.loads(t) for t in var_file_list]
+    # Convert each item to an object, then reduce them all back to one,
+    # the var files which did not change since the last run are not parsed again
+    parse_cache = ParseCache(PARSED_FILES_CACHE_DIR)
+    temp_data_objs = [parse_cache.load(t) if os.path.isfile(t)
+                      else json.loads(t) for t in var_file_list]
 
     # Reduce it down to a single object we can work with
     temp_data = {}
@@ -1589,10 +2048,8 @@ def validate_render_scenario(scenario_path, config, temp_data_raw=()):
         # if the processed value is not parsable by jinja2 engine,
         # we should make it to "" then
         if isinstance(item[1], str):
-            temp_dict = {}
-            temp_dict[item[0]] = item[1]
             try:
-                preprocyaml_jinja(temp_dict)
+                jinja2.Environment().parse(yaml.dump({item[0]: item[1]}, sort_keys=False))
             except jinja2.exceptions.TemplateSyntaxError:
                 temp_data[item[0]] = ""
     temp_data = preprocyaml_jinja(temp_data)
@@ -1615,37 +2072,84 @@ def build_scenario_graph(root_scenario_path: str, config, root_scenario_temp_dat
     We utilized the iterative way to implement this, so it will not cause stackoverflow even
     with over 1000 linked included sdfs
 
+    Each sdf is rendered and parsed once, the included sdfs of a scenario are loaded
+    concurrently (up to included_sdf_max_workers) and the teflo.cfg files are read once,
+    the config of every child scenario is an overlay of its parent config on that base config
+
     :param root_scenario_path: the root sdf path
     :type root_scenario_path: str
     :param root_scenario_temp_data: the temp data that all sdf need to render with
     :type root_scenario_temp_data: dict
     '''
-    # Must import these two libs here to avoid circular import for Python intepreter
+    # Must import these libs here to avoid circular import for Python intepreter
     from .resources import Scenario
+    from .utils.config import Config
     from .utils.scenario_graph import ScenarioGraph
-    yaml.safe_load(template_render(root_scenario_path, root_scenario_temp_data))
-    root_scenario_yaml_data = template_render(root_scenario_path, root_scenario_temp_data)
+    from .utils.workspace_cache import RemoteWorkspaceCache
+
+    def render_and_parse(path: str):
+        """
+        This method renders the sdf with the temp data and parses the rendered sdf
+
+        :param path: the sdf path
+        :type path: str
+        :return: the rendered sdf and its parsed data
+        :rtype: tuple
+        """
+        yaml_data = template_render(path, root_scenario_temp_data)
+        return yaml_data, yaml.safe_load(yaml_data)
+
+    root_scenario_yaml_data, root_scenario_data = render_and_parse(root_scenario_path)
     root_scenario = Scenario(config=config, path=os.path.basename(root_scenario_path))
     root_scenario.fullpath = root_scenario_path
     root_scenario.yaml_data = root_scenario_yaml_data
-    # deepcopy will work only under pythonversion > 3.9
-    # leave this line here for future improvement
-    # root_config = deepcopy(config)
 
-    def addAllIncludes(parent_scenario: Scenario, checked_list: dict):
+    base_config = None
+
+    # the remote workspaces are cloned once into a cache kept across the runs
+    git_env_var = {}
+    if os.environ.get('GIT_SSH_COMMAND') is not None:
+        git_env_var['GIT_SSH_COMMAND'] = 'ssh -o IdentitiesOnly=yes -i ' + os.environ.get('GIT_SSH_COMMAND')
+    elif 'GIT_SSH_COMMAND' in config:
+        git_env_var['GIT_SSH_COMMAND'] = 'ssh -o IdentitiesOnly=yes -i ' + config['GIT_SSH_COMMAND']
+    workspace_cache = RemoteWorkspaceCache(config.get("REMOTE_WORKSPACE_CACHE_DIR"),
+                                           max_size=config.get("REMOTE_WORKSPACE_CACHE_MAX_SIZE", 0),
+                                           env_var=git_env_var)
+
+    def child_config(parent_config):
+        """
+        This method returns the config of a child scenario, the base config
+        is loaded on first use and is never changed afterwards
+
+        :param parent_config: the config of the parent scenario
+        :type parent_config: Config
+        :return: the child scenario config
+        :rtype: Config
+        """
+        nonlocal base_config
+        if base_config is None:
+            base_config = Config()
+            base_config.load()
+        return base_config.overlay(parent_config)
+
+    def addAllIncludes(parent_scenario: Scenario, data: dict, checked_list: dict, executor: ThreadPoolExecutor):
         """
         This method add all included child sdfs to the parent_scenario
         as its child_scenarios
 
         :param parent_scenario: the parent scenario object
         :type root_scenario_path: Scenario
+        :param data: the parsed data of the parent scenario
+        :type data: dict
         :param checked_list: the checked list for all visited Scenarios
         :type checked_list: dict
+        :param executor: the executor checking out the remote workspaces and loading the included sdfs
+        :type executor: ThreadPoolExecutor
+        :return: the child scenarios with their parsed data
+        :rtype: list
         """
         if parent_scenario is None:
-            return
-
-        data = yaml.safe_load(parent_scenario.yaml_data)
+            return []
 
         # process the parent sc here, (process its remote_workspace section,include section)
 
@@ -1654,31 +2158,26 @@ def build_scenario_graph(root_scenario_path: str, config, root_scenario_temp_dat
             if config["REMOTE_WORKSPACE_DOWNLOAD_LOCATION"][-1] != "/":
                 config["REMOTE_WORKSPACE_DOWNLOAD_LOCATION"] = config["REMOTE_WORKSPACE_DOWNLOAD_LOCATION"] + "/"
             ret = {}
+            checkouts = []
             for workspace in remote_workspaces:
                 url = workspace.get("workspace_url", None)
                 short_name_of_workspace = workspace.get("alias_name", None)
                 if url is None:
                     raise TefloError(
                             "Your format of the imported remote_workspace is incorrect ")
-                cmd = 'git clone ' + url + ' ' + config["REMOTE_WORKSPACE_DOWNLOAD_LOCATION"] + short_name_of_workspace
-                env_var = {}
-                if not os.path.isdir(config["REMOTE_WORKSPACE_DOWNLOAD_LOCATION"] + short_name_of_workspace):
-                    get_env = os.environ.get('GIT_SSH_COMMAND')
-
-                    if get_env is not None:
-                        env_var['GIT_SSH_COMMAND'] = 'ssh -o IdentitiesOnly=yes -i ' + get_env
-                    elif 'GIT_SSH_COMMAND' in config:
-                        env_var['GIT_SSH_COMMAND'] = 'ssh -o IdentitiesOnly=yes -i ' + config['GIT_SSH_COMMAND']
-                    result = exec_local_cmd(cmd, env_var=env_var)
-                    if result[0] != 0:
-                        raise TefloError("Remote remote_workspaces download failed!!")
+                dest = config["REMOTE_WORKSPACE_DOWNLOAD_LOCATION"] + short_name_of_workspace
+                if not os.path.isdir(dest):
+                    # the remote workspaces are checked out at the same time from the cached mirrors
+                    checkouts.append(executor.submit(workspace_cache.checkout, url, dest, workspace.get("ref", None)))
                 # all remote remote_workspaces should be stored in the same place
                 # (root_workspace/.teflo_remote_workspace_cache/)
                 # so we should use root_config instead of parent_scenario.config,
                 # which always contains the root sdf workspace path
-                remote_workspace_path = os.path.join(
-                        config["WORKSPACE"], config["REMOTE_WORKSPACE_DOWNLOAD_LOCATION"] + short_name_of_workspace)
+                remote_workspace_path = os.path.join(config["WORKSPACE"], dest)
                 ret[short_name_of_workspace] = remote_workspace_path
+            for checkout in checkouts:
+                checkout.result()
+            workspace_cache.evict()
             return ret
 
         workspace_info = None
@@ -1702,74 +2201,72 @@ def build_scenario_graph(root_scenario_path: str, config, root_scenario_temp_dat
             # return processed full path and the remote workspace dir name
             return ret, real_path[0]
 
-        if 'include' in data.keys() and data['include'] is not None:
-            include_item = data['include']
-            for item in include_item:
-                if checked_list.get(item) is not None:
-                    raise TefloError(
-                        "Your scenario has an import cycle. \
-                            %s is already a node in the scenario graph, It cannot be added again. "
-                        % item)
-                # this config is from the root teflo project which means the current workspace's teflo.cfg
-                sc_fullpath = os.path.join(parent_scenario.config['WORKSPACE'], item)
-                sc_abspath = item
-                # return processed path and the remote short name
-                remote_path = process_path(item, workspace_info)
-                sc_fullpath_is_valid = os.path.isfile(sc_fullpath)
-                sc_abspath_is_valid = os.path.isfile(sc_abspath)
-                remote_path_is_valid = os.path.isfile(remote_path[0]) if \
-                    remote_path[0] else False
-
-                if sc_fullpath_is_valid or sc_abspath_is_valid or remote_path_is_valid:
-                    path = os.path.basename(item)
-                    if os.path.isfile(sc_fullpath):
-                        item = sc_fullpath
-                    elif os.path.isfile(sc_abspath):
-                        item = sc_abspath
-                    elif remote_path[0] and os.path.isfile(remote_path[0]):
-                        item = remote_path[0]
-                    # check to verify the data in included scenario is valid
-                    try:
-                        yaml.safe_load(template_render(item, root_scenario_temp_data))
-                        from .utils.config import Config
-                        root_config = Config()
-                        root_config.load()
-                        for xxx in parent_scenario.config.items():
-                            root_config[xxx[0]] = xxx[1]
-                        child_sc = Scenario(config=root_config, path=path)
-                        # change workspace if this is a remote sc
-                        if workspace_info is not None and remote_path[1]:
-                            child_sc.config["WORKSPACE"] = remote_path[1]
-                        else:
-                            child_sc.config["WORKSPACE"] = parent_scenario.config.get("WORKSPACE")
-                        child_sc.fullpath = sc_fullpath if os.path.isfile(sc_fullpath) else sc_abspath
-                        child_sc.yaml_data = template_render(item, root_scenario_temp_data)
-
-                        parent_scenario.add_child_scenario(child_sc)
-                        child_sc.my_parent = parent_scenario
-
-                        child_sc_loop = child_sc
-                        while child_sc_loop.my_parent is not None:
-                            child_sc_loop.my_parent.children_size += 1
-                            child_sc_loop = child_sc_loop.my_parent
-
-                        # use filename because the scenario name could
-                        # contain some special characters, which is not good for
-                        # file generation
-                        if preproc_path(config['RESULTS_FOLDER']) in child_sc.fullpath or \
-                                preproc_path(config["DATA_FOLDER"]) in child_sc.fullpath:
-                            parent_scenario.included_scenario_path = os.path.join(
-                                config['RESULTS_FOLDER'], child_sc.path)
-                        else:
-                            parent_scenario.included_scenario_path = os.path.join(
-                                config['RESULTS_FOLDER'], child_sc.path.split(".")[0] + "_results.yml")
-                    except yaml.YAMLError as err:
-                        # raising Teflo error to differentiate the yaml issue is with included scenario
-                        raise TefloError('Error loading included '
-                                         'scenario data! ' + item + str(err.problem_mark))
-                else:
-                    raise TefloError('Included File is invalid or Include section is empty.'
-                                     ' You have to provide valid scenario files to be included.')
+        if 'include' not in data.keys() or data['include'] is None:
+            return []
+
+        # resolve every included sdf first and hand it over to the executor,
+        # so the siblings are rendered and parsed at the same time
+        includes = []
+        for item in data['include']:
+            if checked_list.get(item) is not None:
+                raise TefloError(
+                    "Your scenario has an import cycle. \
+                        %s is already a node in the scenario graph, It cannot be added again. "
+                    % item)
+            # this config is from the root teflo project which means the current workspace's teflo.cfg
+            sc_fullpath = os.path.join(parent_scenario.config['WORKSPACE'], item)
+            sc_abspath = item
+            # return processed path and the remote short name
+            remote_path = process_path(item, workspace_info)
+            if os.path.isfile(sc_fullpath):
+                item = sc_fullpath
+            elif os.path.isfile(sc_abspath):
+                item = sc_abspath
+            elif remote_path[0] and os.path.isfile(remote_path[0]):
+                item = remote_path[0]
+            else:
+                raise TefloError('Included File is invalid or Include section is empty.'
+                                 ' You have to provide valid scenario files to be included.')
+            includes.append((item, sc_fullpath, sc_abspath, remote_path, executor.submit(render_and_parse, item)))
+
+        children = []
+        for item, sc_fullpath, sc_abspath, remote_path, future in includes:
+            # check to verify the data in included scenario is valid
+            try:
+                child_sc_yaml_data, child_sc_data = future.result()
+            except yaml.YAMLError as err:
+                # raising Teflo error to differentiate the yaml issue is with included scenario
+                raise TefloError('Error loading included '
+                                 'scenario data! ' + item + str(err.problem_mark))
+            child_sc = Scenario(config=child_config(parent_scenario.config), path=os.path.basename(item))
+            # change workspace if this is a remote sc
+            if workspace_info is not None and remote_path[1]:
+                child_sc.config["WORKSPACE"] = remote_path[1]
+            else:
+                child_sc.config["WORKSPACE"] = parent_scenario.config.get("WORKSPACE")
+            child_sc.fullpath = sc_fullpath if os.path.isfile(sc_fullpath) else sc_abspath
+            child_sc.yaml_data = child_sc_yaml_data
+
+            parent_scenario.add_child_scenario(child_sc)
+            child_sc.my_parent = parent_scenario
+
+            child_sc_loop = child_sc
+            while child_sc_loop.my_parent is not None:
+                child_sc_loop.my_parent.children_size += 1
+                child_sc_loop = child_sc_loop.my_parent
+
+            # use filename because the scenario name could
+            # contain some special characters, which is not good for
+            # file generation
+            if preproc_path(config['RESULTS_FOLDER']) in child_sc.fullpath or \
+                    preproc_path(config["DATA_FOLDER"]) in child_sc.fullpath:
+                parent_scenario.included_scenario_path = os.path.join(
+                    config['RESULTS_FOLDER'], child_sc.path)
+            else:
+                parent_scenario.included_scenario_path = os.path.join(
+                    config['RESULTS_FOLDER'], child_sc.path.split(".")[0] + "_results.yml")
+            children.append((child_sc, child_sc_data))
+        return children
 
     def include(unchecked_list: list, checked_list: dict):
         """
@@ -1778,7 +2275,7 @@ def build_scenario_graph(root_scenario_path: str, config, root_scenario_temp_dat
         and add all its child to it, then add all it's children
         to the unchecked list for next iteration
 
-        :param unchecked_list: the unchecked list of scenarios
+        :param unchecked_list: the unchecked list of scenarios with their parsed data
         :type unchecked_list: list
         :param checked_list: the checked list for all visited Scenarios
         :type checked_list: dict
@@ -1786,17 +2283,15 @@ def build_scenario_graph(root_scenario_path: str, config, root_scenario_temp_dat
 
         # unchecked_list is a queue-liked list, we keep this as channel
         # to maintain all unchecked scenarios
-        while len(unchecked_list) != 0:
-            sc: Scenario = unchecked_list.pop(0)
-            checked_list[sc.path] = sc.path
-            addAllIncludes(sc, checked_list)
-            # We need to remove the checked scenario from the unchecked_list
-            # after we addAllIncludes for it
-            if sc.child_scenarios != []:
-                for sc in sc.child_scenarios:
-                    unchecked_list.append(sc)
-
-    include([root_scenario], {})
+        with ThreadPoolExecutor(max_workers=int(config.get('INCLUDED_SDF_MAX_WORKERS', 4))) as executor:
+            while len(unchecked_list) != 0:
+                sc, data = unchecked_list.pop(0)
+                checked_list[sc.path] = sc.path
+                # We need to remove the checked scenario from the unchecked_list
+                # after we addAllIncludes for it
+                unchecked_list.extend(addAllIncludes(sc, data, checked_list, executor))
+
+    include([(root_scenario, root_scenario_data)], {})
     scenario_graph = ScenarioGraph(root_scenario, iterate_method=config.get("INCLUDED_SDF_ITERATE_METHOD", "by_level"),
                                    scenario_vars=root_scenario_temp_data)
     return scenario_graph
@@ -1821,6 +2316,8 @@ def ssh_key_file_generator(workspace, ssh_key_param):
     :type ssh_key_param: value of the ssh_key param either a path or an actual key
     :return: a path to a public key
     """
+    from paramiko import RSAKey
+    from paramiko.ssh_exception import SSHException
 
     # setup absolute path for key
     key = os.path.join(workspace, ssh_key_param)
@@ -1925,6 +2422,7 @@ def sort_tasklist(user_tasks):
 
 
 def validate_cli_scenario_option(ctx, scenario, config, vars_data=None):
+    import jinja2
     # Make sure the file exists and gets its absolute path
     if scenario is not None and os.path.isfile(scenario):
         scenario = os.path.abspath(scenario)
@@ -2102,6 +2600,7 @@ class StatusPageHelper(object):
         self.proxyserver_url = proxyserver_url
 
     def get_info(self):
+        import requests
         ret = {}
         try:
             info = requests.get(self.proxyserver_url + "/components").json()['components']
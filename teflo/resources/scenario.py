@@ -28,7 +28,6 @@ import errno
 import os
 import yaml
 from collections import OrderedDict
-from pykwalify.errors import CoreError, SchemaError
 
 from .actions import Action
 from .executes import Execute
@@ -43,6 +42,7 @@ from ..exceptions import ScenarioError
 from ..helpers import gen_random_str, schema_validator
 from ..tasks import ValidateTask
 from ..utils.resource_checker import ResourceChecker
+from ..utils.resource_store import ResourceStore
 
 
 class Scenario(TefloResource):
@@ -105,11 +105,11 @@ class Scenario(TefloResource):
         self.resource_check = parameters.pop('resource_check', {})
 
         # set resource attributes
-        self._assets = list()
-        self._actions = list()
-        self._executes = list()
-        self._reports = list()
-        self._notifications = list()
+        self._assets = ResourceStore()
+        self._actions = ResourceStore()
+        self._executes = ResourceStore()
+        self._reports = ResourceStore()
+        self._notifications = ResourceStore()
         self._yaml_data = dict()
         # Properties to take care of included scenarios
         self._child_scenarios = list()
@@ -183,30 +183,15 @@ class Scenario(TefloResource):
         :return:
         """
         if isinstance(item, Asset):
-            if self._assets.__contains__(item):
-                return self._assets.index(item)
-            else:
-                return None
+            return self._assets.position(item)
         elif isinstance(item, Action):
-            if self._actions.__contains__(item):
-                return self._actions.index(item)
-            else:
-                return None
+            return self._actions.position(item)
         elif isinstance(item, Execute):
-            if self._executes.__contains__(item):
-                return self._executes.index(item)
-            else:
-                return None
+            return self._executes.position(item)
         elif isinstance(item, Report):
-            if self._reports.__contains__(item):
-                return self._reports.index(item)
-            else:
-                return None
+            return self._reports.position(item)
         elif isinstance(item, Notification):
-            if self._notifications.__contains__(item):
-                return self._notifications.index(item)
-            else:
-                return None
+            return self._notifications.position(item)
         else:
             raise ValueError('Resource must be of a valid Resource type.'
                              'Check the type of the given item: %s' % item)
@@ -315,15 +300,15 @@ class Scenario(TefloResource):
         :type item: object
         """
         if isinstance(item, Asset):
-            self._assets = list()
+            self._assets = ResourceStore()
         elif isinstance(item, Action):
-            self._actions = list()
+            self._actions = ResourceStore()
         elif isinstance(item, Execute):
-            self._executes = list()
+            self._executes = ResourceStore()
         elif isinstance(item, Report):
-            self._reports = list()
+            self._reports = ResourceStore()
         elif isinstance(item, Notification):
-            self._notifications = list()
+            self._notifications = ResourceStore()
         else:
             raise ValueError('Resource must be of a valid Resource type.'
                              'Check the type of the given item: %s' % item)
@@ -369,28 +354,26 @@ class Scenario(TefloResource):
         # 4. if not rvalue, the updated resource will check to see if the original resource is at the previous index
         #    or at a new index (becaue it's been pushed down the stack) and replace the original resource accordingly.
 
-        # TODO: Simplify the filtering of resources when resources implement __eq__/__hash__
+        # the resource stores are indexed by name and resource id, so the filtering does not scan the lists
         filtered_task_list.extend(
             [(task, self.get_resource_idx(task.get('asset')))
-             for task in tasks if task.get('asset') and getattr(task.get('asset'), 'name')
-             in [h.name for h in self.assets]]
+             for task in tasks if task.get('asset') and self.assets.has_name(getattr(task.get('asset'), 'name'))]
         )
         filtered_task_list.extend(
             [(task, self.get_resource_idx(task.get('package')))
-             for task in tasks if isinstance(task.get('package'), Report) and (getattr(task.get('package'), 'name')
-                                                                               in [r.name for r in self.reports])]
+             for task in tasks if all([isinstance(task.get('package'), Report),
+                                       self.reports.has_name(getattr(task.get('package'), 'name', None))])]
         )
 
         filtered_task_list.extend(
             [(task, self.get_resource_idx(task.get('package'))) for task in tasks if
-             isinstance(task.get('package'), Execute) and (getattr(task.get('package'), 'name')
-                                                           in [r.name for r in self.executes])]
+             isinstance(task.get('package'), Execute) and self.executes.has_name(getattr(task.get('package'), 'name'))]
         )
 
         filtered_task_list.extend(
             [(task, self.get_resource_idx(task.get('package')))
-             for task in tasks if isinstance(task.get('package'), Action) and (getattr(task.get('package'), 'name')
-                                                                               in [r.name for r in self.actions])]
+             for task in tasks if all([isinstance(task.get('package'), Action),
+                                       self.actions.has_name(getattr(task.get('package'), 'name', None))])]
         )
 
         for res, rvalue, idx in [(res, item['rvalue'], idx) for task, idx in filtered_task_list
@@ -685,6 +668,8 @@ class Scenario(TefloResource):
 
     def validate(self):
         """Validate the scenario based on the default schema."""
+        from pykwalify.errors import CoreError, SchemaError
+
         self.logger.debug('Validating scenario YAML file')
 
         if self.resource_check:
@@ -82,7 +82,7 @@ SYNCHRONIZE_PLAYBOOK = '''
         - name: copy skipped local artifacts results to file
           shell:
             echo -e "('{{ ansible_hostname }}', '{{ item.item }}', '', True, 0, )" \
-            | sed -E ':a;N;$!ba;s/\\r{0,1}\\n/\\\\n/g' >> {{ 'sync-results-' + uuid }}.txt
+            | sed -E ':a;N;$!ba;s/\\r{0,1}\\n/\\\\n/g' >> {{ xresults_dir | quote }}/{{ 'sync-results-' + uuid }}.txt
           delegate_to: localhost
           loop: "{{ found_artifacts.results }}"
           when: artifacts_found | length == 0  or item.matched == 0
@@ -92,7 +92,8 @@ SYNCHRONIZE_PLAYBOOK = '''
             echo -e "('{{ ansible_hostname }}', \'\'\'{{ item.stdout_lines | to_yaml \
             | regex_replace('[\\t|\\n|\\r|\\s]', '') | regex_replace("\\'", '') }}\'\'\', \
             '{{ item.cmd[-1] }}', False, 0, )" \
-            | sed -E ':a;N;$!ba;s/\\r{0,1}\\n/\\\\n/g' | tr -d '\\r' >> {{ 'sync-results-' + uuid }}.txt
+            | sed -E ':a;N;$!ba;s/\\r{0,1}\\n/\\\\n/g' | tr -d '\\r'
+            >> {{ xresults_dir | quote }}/{{ 'sync-results-' + uuid }}.txt
           delegate_to: localhost
           when: item is success and item is not skipped
           with_items:
@@ -102,7 +103,8 @@ SYNCHRONIZE_PLAYBOOK = '''
           shell:
             echo -e "('{{ ansible_hostname }}', '{{ item.item.path | to_yaml  \
             | regex_replace('[\\t|\\n|\\r|\\s]', '') }}', '', False, 1, )" \
-            | sed -E ':a;N;$!ba;s/\\r{0,1}\\n/\\\\n/g' | tr -d '\\r' >> {{ 'sync-results-' + uuid }}.txt
+            | sed -E ':a;N;$!ba;s/\\r{0,1}\\n/\\\\n/g' | tr -d '\\r'
+            >> {{ xresults_dir | quote }}/{{ 'sync-results-' + uuid }}.txt
           loop: "{{ local_sync_output.results }}"
           delegate_to: localhost
       when: localhost
@@ -155,7 +157,7 @@ SYNCHRONIZE_PLAYBOOK = '''
         - name: copy skipped artifacts results to file
           shell:
             echo -e "('{{ ansible_hostname }}', '{{ item.item[1].item }}', '', True, 0, )" \
-            | sed -E ':a;N;$!ba;s/\\r{0,1}\\n/\\\\n/g' >> {{ 'sync-results-' + uuid }}.txt
+            | sed -E ':a;N;$!ba;s/\\r{0,1}\\n/\\\\n/g' >> {{ xresults_dir | quote }}/{{ 'sync-results-' + uuid }}.txt
           delegate_to: localhost
           when: item is skipped
           with_items:
@@ -165,7 +167,8 @@ SYNCHRONIZE_PLAYBOOK = '''
           shell:
             echo -e "('{{ ansible_hostname }}', \'\'\'{{ item.stdout_lines | to_yaml \
             | regex_replace('[\\t|\\n|\\r|\\s]', '') }}\'\'\', '{{ item.cmd.split(' ')[-1] }}', False, 0, )" \
-            | sed -E ':a;N;$!ba;s/\\r{0,1}\\n/\\\\n/g' | tr -d '\\r' >> {{ 'sync-results-' + uuid }}.txt
+            | sed -E ':a;N;$!ba;s/\\r{0,1}\\n/\\\\n/g' | tr -d '\\r'
+            >> {{ xresults_dir | quote }}/{{ 'sync-results-' + uuid }}.txt
           delegate_to: localhost
           when: item is success and item is not skipped
           with_items:
@@ -175,7 +178,8 @@ SYNCHRONIZE_PLAYBOOK = '''
         - name: copy failed artifacts results to file
           shell:
             echo -e "('{{ ansible_hostname }}', '{{ item.item[1].item }}', '', False, 1, )" \
-            | sed -E ':a;N;$!ba;s/\\r{0,1}\\n/\\\\n/g' | tr -d '\\r'>> {{ 'sync-results-' + uuid }}.txt
+            | sed -E ':a;N;$!ba;s/\\r{0,1}\\n/\\\\n/g' | tr -d '\\r'
+            >> {{ xresults_dir | quote }}/{{ 'sync-results-' + uuid }}.txt
           delegate_to: localhost
           with_items:
             - "{{ sync_output.results }}"
@@ -233,9 +237,10 @@ ADHOC_SHELL_PLAYBOOK = '''
     - name: copy to shell results to a json file
       copy:
         content: "{{ ansible_play_hosts | map('extract', hostvars, 'json_str') | list | to_nice_json }}"
-        dest: ./{{ 'shell-results-' + uuid }}.json
+        dest: "{{ xresults_dir }}/{{ 'shell-results-' + uuid }}.json"
       run_once: true
       delegate_to: localhost
+      when: xresults_dir is defined
 '''
 
 ADHOC_SCRIPT_PLAYBOOK = '''
@@ -262,7 +267,47 @@ ADHOC_SCRIPT_PLAYBOOK = '''
     - name: copy to shell results to a json file
       copy:
         content: "{{ ansible_play_hosts | map('extract', hostvars, 'json_str') | list | to_nice_json }}"
-        dest: ./{{ 'script-results-' + uuid }}.json
+        dest: "{{ xresults_dir }}/{{ 'script-results-' + uuid }}.json"
       run_once: true
       delegate_to: localhost
+      when: xresults_dir is defined
+'''
+
+ADHOC_BATCH_PLAYBOOK = '''
+- name: run batched commands and fetch results
+  hosts: "{{ hosts }}"
+
+  tasks:
+    - name: initialize batch results
+      set_fact:
+        batch_results: []
+        batch_failed: false
+{{ tasks }}
+    - name: copy batch results to a json file
+      copy:
+        content: "{{ ansible_play_hosts | map('extract', hostvars, 'batch_results') | list | to_nice_json }}"
+        dest: "{{ xresults_dir }}/{{ 'batch-results-' + uuid }}.json"
+      run_once: true
+      delegate_to: localhost
+      when: xresults_dir is defined
+'''
+
+ADHOC_BATCH_TASK = '''
+    - name: batched {{ module }} {{ index }}
+      {{ module }}: "{{ xbatch[{{ index }}] }}"
+      register: batch_{{ index }}
+      ignore_errors: true
+      when: not (ansible_play_hosts | map('extract', hostvars, 'batch_failed') | select | list)
+      {{ args }}
+      {{ options }}
+
+    - name: record batched {{ module }} {{ index }} results
+      set_fact:
+        batch_results: "{{ batch_results + [{'index': {{ index }}, 'host_name': ansible_facts.hostname,
+                          'rc': batch_{{ index }}.rc | default(1) | int,
+                          'err': batch_{{ index }}.stderr | default(batch_{{ index }}.stdout)
+                          | default(batch_{{ index }}.msg)
+                          | default('stderr,stdout.msg NOT present in the output')}] }}"
+        batch_failed: "{{ {{ failed_when }} }}"
+      when: batch_{{ index }} is not skipped
 '''
@@ -29,24 +29,27 @@ from logging import root
 import os
 from re import L
 import sys
+import threading
 from teflo.exceptions import TefloScenarioFailure
 import blaster
 import termcolor
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from contextlib import ExitStack
 from functools import partial
 import yaml
 import click
 import shutil
-from distutils.dir_util import copy_tree
 from teflo.helpers import exec_local_cmd
 from . import __name__ as __teflo_name__
-from .constants import NOTIFYSTATES, TASKLIST, RESULTS_FILE, DATA_FOLDER, DEFAULT_INVENTORY
+from .constants import NOTIFYSTATES, TASKLIST, RESULTS_FILE, DATA_FOLDER, DEFAULT_INVENTORY, STREAMED_TASKLIST, \
+    STREAMED_TASKS_MAX_WORKERS
 from .core import TefloError, LoggerMixin, TimeMixin, Inventory
-from .helpers import file_mgmt, gen_random_str, sort_tasklist, preproc_path
+from .helpers import file_mgmt, gen_random_str, sort_tasklist, preproc_path, compile_resource_schemas, \
+    validate_resource_schemas
 from .resources import Scenario, Asset, Action, Report, Execute, Notification
 from .utils.config import Config
 from .utils.scenario_graph import ScenarioGraph
-from .utils.pipeline import PipelineFactory
+from .utils.pipeline import PipelineFactory, PipelineBuilder, PipelineExecutorFactory, BlasterPipelineExecutor
 
 
 class Teflo(LoggerMixin, TimeMixin):
@@ -216,6 +219,10 @@ class Teflo(LoggerMixin, TimeMixin):
                            'TEFLO_WORKSPACE': os.path.abspath(self.config.get('WORKSPACE'))
                            })
 
+        # the current task and the scenario graph updates are guarded so included
+        # scenarios can be run concurrently with the parallel iterate method
+        self._local = threading.local()
+        self._graph_lock = threading.RLock()
         self.current_task = None
 
     @property
@@ -249,6 +256,14 @@ class Teflo(LoggerMixin, TimeMixin):
     def teflo_options(self):
         return self._teflo_options
 
+    @property
+    def current_task(self):
+        return getattr(self._local, 'current_task', None)
+
+    @current_task.setter
+    def current_task(self, value):
+        self._local.current_task = value
+
     def _populate_scenario_resources(self, scenario_obj: Scenario, scenario_stream):
 
         scenario_data = yaml.safe_load(scenario_stream)
@@ -389,16 +404,57 @@ class Teflo(LoggerMixin, TimeMixin):
                 tasklist_run.remove("cleanup")
                 stack.callback(partial(self.cleanup_helper, final_passed_tasks, final_failed_tasks, status))
 
-            sc: Scenario
-            for sc in self.scenario_graph:
-                try:
-                    self.run_helper(sc=sc, tasklist=tasklist_run)
-                except TefloScenarioFailure as ex:
-                    self.scenario_graph.reinit()
-                    self.logger.error(ex)
-                    break
+            if self.scenario_graph.iterate_method == "parallel":
+                self.run_parallel_helper(tasklist_run)
+            else:
+                sc: Scenario
+                for sc in self.scenario_graph:
+                    try:
+                        self.run_helper(sc=sc, tasklist=tasklist_run)
+                    except TefloScenarioFailure as ex:
+                        self.scenario_graph.reinit()
+                        self.logger.error(ex)
+                        break
             self.collect_final_passed_failed_tasks_status(final_passed_tasks, final_failed_tasks, status)
 
+    def run_parallel_helper(self, tasklist: list):
+        """
+        This is a helper method for running the tasks for the whole scenario graph
+        using the parallel iterate method. The scenario graph is treated as a DAG
+        where a scenario is ready to run once all of its child scenarios are done,
+        so sibling scenarios are run concurrently up to included_sdf_max_workers.
+        Once a scenario fails no new scenarios are scheduled.
+        """
+
+        max_workers = int(self.config.get('INCLUDED_SDF_MAX_WORKERS', 4))
+        dependencies = self.scenario_graph.dependency_graph()
+        pending = {sc: len(children) for sc, children in dependencies.items()}
+        ready = [sc for sc, count in pending.items() if count == 0]
+        running = dict()
+        failed = False
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while ready or running:
+                while ready and not failed:
+                    sc = ready.pop(0)
+                    running[executor.submit(self.run_helper, sc=sc, tasklist=tasklist)] = sc
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    sc = running.pop(future)
+                    try:
+                        future.result()
+                    except TefloScenarioFailure as ex:
+                        self.logger.error(ex)
+                        failed = True
+                        continue
+                    parent = sc.my_parent
+                    if parent in pending:
+                        pending[parent] -= 1
+                        if pending[parent] == 0:
+                            ready.append(parent)
+
     def run(self, tasklist: list = TASKLIST):
         """
         This function assumes there are zero or more tasks to be
@@ -515,8 +571,26 @@ class Teflo(LoggerMixin, TimeMixin):
             self.logger.info("." * 50)
         # initialize overall status
         status = 0
+        # tasks run together as a single stream when the streaming pipeline mode is set
+        streamed_tasks = self._get_streamed_tasks(tasklist)
         try:
             for task in sort_tasklist(tasklist):
+                if task in streamed_tasks[1:]:
+                    # already run within the stream started by the provision task
+                    continue
+
+                if task in streamed_tasks:
+                    def start_task(item):
+                        self.current_task = item
+                        if not self.teflo_options.get('no_notify', False):
+                            self.notify('on_start', status, passed_tasks, failed_tasks, scenario=sc)
+                        self.logger.info(' * Task    : %s' % item)
+
+                    # each task type is started and marked as passed by the stream itself
+                    self._run_streamed_pipeline(sc, streamed_tasks, start_task, passed_tasks.append)
+                    self.logger.info("." * 50)
+                    continue
+
                 self.current_task = task
                 if not self.teflo_options.get('no_notify', False):
                     self.notify('on_start', status, passed_tasks, failed_tasks, scenario=sc)
@@ -528,27 +602,15 @@ class Teflo(LoggerMixin, TimeMixin):
                 # TODO: MAKE THIS ONE TIME RUN
 
                 data = self._run_pipeline(task, sc)
-                self.scenario_graph.remove_resources_from_scenario(sc)
 
                 # reload resource objects
-                sc: Scenario
-                # for sc in self.scenario_graph:
-                sc.reload_resources(data)
-                self.scenario_graph.reload_resources_from_scenario(sc)
+                self._reload_scenario_resources(sc, data)
                 # Creating inventory only when task is provision
                 if task == 'provision':
                     all_hosts = sc.get_assets()
 
                     if all_hosts:
-                        for host in all_hosts:
-                            if hasattr(host, 'ip_address'):
-                                self.logger.info('Populating inventory file with host(s) %s'
-                                                    % getattr(host, 'name'))
-                        try:
-                            self.cbn_inventory.create_inventory(all_hosts=all_hosts)
-
-                        except Exception as ex:
-                            raise TefloError("Error while creating the inventory for scenario %s: %s" % (sc.path, ex))
+                        self._populate_inventory(sc, all_hosts)
                     else:
                         self.logger.info("No hosts provisioned to be added to the inventory")
 
@@ -557,18 +619,21 @@ class Teflo(LoggerMixin, TimeMixin):
             # set overall status
             status = 1
 
-            # pop task from passed list since it failed
-            passed_tasks.pop(-1)
+            if task in streamed_tasks:
+                # the stream only marks a task as passed once all its tasks completed
+                task = getattr(ex, 'streamed_task', None) or \
+                    [item for item in streamed_tasks if item not in passed_tasks][0]
+            else:
+                # pop task from passed list since it failed
+                passed_tasks.pop(-1)
 
             # update list of failed tasks
             failed_tasks.append(task)
 
             self.logger.error(ex)
 
-            self.scenario_graph.remove_resources_from_scenario(sc)
             # reload resource objects
-            sc.reload_resources(ex.results)
-            self.scenario_graph.reload_resources_from_scenario(sc)
+            self._reload_scenario_resources(sc, ex.results)
             # roll back by cleaning up any resources that might have been provisioned
             if "cleanup" in tasklist and [item for item in failed_tasks if item != 'cleanup']:
                 if [item for item in passed_tasks if item == 'provision'] \
@@ -579,10 +644,9 @@ class Teflo(LoggerMixin, TimeMixin):
 
                     try:
                         data = self._run_pipeline("cleanup", sc)
-                        self.scenario_graph.remove_resources_from_scenario(sc)
 
                         # reload resource objects
-                        sc.reload_resources(data)
+                        self._reload_scenario_resources(sc, data)
                         passed_tasks.append(task)
                     except Exception as ex:
                         self.logger.error(ex)
@@ -594,7 +658,8 @@ class Teflo(LoggerMixin, TimeMixin):
             setattr(sc, 'overall_status', status)
             setattr(sc, 'passed_tasks', passed_tasks)
             setattr(sc, 'failed_tasks', failed_tasks)
-            self.scenario_graph.reload_resources_from_scenario(sc)
+            with self._graph_lock:
+                self.scenario_graph.reload_resources_from_scenario(sc)
             if not self.teflo_options.get('no_notify', False):
                 self.notify('on_complete', status, passed_tasks, failed_tasks, sc)
 
@@ -631,17 +696,13 @@ class Teflo(LoggerMixin, TimeMixin):
             for sc in self.scenario_graph:
                 try:
                     data = self._run_pipeline(task, sc)
-                    self.scenario_graph.remove_resources_from_scenario(sc)
-                    sc.reload_resources(data)
-                    self.scenario_graph.reload_resources_from_scenario(sc)
+                    self._reload_scenario_resources(sc, data)
                 except Exception as ex:
                     status = 1
                     self.logger.error(ex)
                     self.logger.error(termcolor.colored(
                         'One or more notifications failed. Refer to the scenario.log', "red"))
-                    self.scenario_graph.remove_resources_from_scenario(sc)
-                    sc.reload_resources(ex.results)
-                    self.scenario_graph.reload_resources_from_scenario(sc)
+                    self._reload_scenario_resources(sc, ex.results)
                     # save end time
             self.end()
             # determine state
@@ -668,16 +729,37 @@ class Teflo(LoggerMixin, TimeMixin):
             # blast off the pipeline list of tasks
             try:
                 data = self._run_pipeline(task, scenario)
-                self.scenario_graph.remove_resources_from_scenario(scenario)
-                scenario.reload_resources(data)
-                self.scenario_graph.reload_resources_from_scenario(scenario)
+                self._reload_scenario_resources(scenario, data)
             except Exception as ex:
                 status = 1
                 self.logger.error(ex)
                 self.logger.error('One or more notifications failed. Refer to the scenario.log')
-                self.scenario_graph.remove_resources_from_scenario(scenario)
-                scenario.reload_resources(ex.results)
-                self.scenario_graph.reload_resources_from_scenario(scenario)
+                self._reload_scenario_resources(scenario, ex.results)
+
+    def _populate_inventory(self, scenario: Scenario, hosts):
+        """
+        Add the given hosts to the master inventory
+        """
+        for host in hosts:
+            if hasattr(host, 'ip_address'):
+                self.logger.info('Populating inventory file with host(s) %s'
+                                 % getattr(host, 'name'))
+        try:
+            with self._graph_lock:
+                self.cbn_inventory.create_inventory(all_hosts=hosts)
+
+        except Exception as ex:
+            raise TefloError("Error while creating the inventory for scenario %s: %s" % (scenario.path, ex))
+
+    def _reload_scenario_resources(self, scenario: Scenario, data):
+        """
+        Reload the scenario resources with the pipeline results and update
+        the scenario graph with them
+        """
+        with self._graph_lock:
+            self.scenario_graph.remove_resources_from_scenario(scenario)
+            scenario.reload_resources(data)
+            self.scenario_graph.reload_resources_from_scenario(scenario)
 
     @property
     def root_scenario_filename(self):
@@ -698,7 +780,8 @@ class Teflo(LoggerMixin, TimeMixin):
             self.logger.warning('Task %s is not valid by teflo.', task)
             return data
 
-        pipeline = pipe_builder.build(scenario, self.teflo_options, scenario_graph=self.scenario_graph)
+        with self._graph_lock:
+            pipeline = pipe_builder.build(scenario, self.teflo_options, scenario_graph=self.scenario_graph)
         if pipeline.name == 'notify' and not scenario.notifications:
             self.logger.debug('.' * 50)
             self.logger.debug('Starting tasks on pipeline: %s',
@@ -714,16 +797,164 @@ class Teflo(LoggerMixin, TimeMixin):
                 self.logger.warning('... no tasks to be executed ...')
                 return data
 
-        # create blaster object with pipeline to run
-        blast = blaster.Blaster(pipeline.tasks)
-        # blast off the pipeline list of tasks reload_resources
-        data = blast.blastoff(
-            serial=not pipeline.type.__concurrent__,
-            raise_on_failure=True
-        )
+        if pipeline.name == 'validate':
+            # the schemas are compiled once here instead of in every validate task
+            compile_resource_schemas([task['resource'] for task in pipeline.tasks])
+            # the resources of each plugin type are validated against its schema in a single pass
+            validate_resource_schemas([task['resource'] for task in pipeline.tasks])
+
+        # blast off the pipeline list of tasks with the executor set for the task
+        executor = PipelineExecutorFactory.get_executor(pipeline.name, self.config)
+        data = executor.run(pipeline.tasks, serial=not pipeline.type.__concurrent__)
 
         return data
 
+    def _get_streamed_tasks(self, tasklist):
+        """Return the tasks to run as a single stream for the given tasklist.
+
+        The stream is only used when the pipeline_mode setting is streaming and
+        provision is run together with orchestrate and/or execute.
+        """
+        if str(self.config.get('PIPELINE_MODE', 'by_task')).lower() != 'streaming' or 'provision' not in tasklist:
+            return []
+        streamed_tasks = [task for task in sort_tasklist(tasklist) if task in STREAMED_TASKLIST]
+        return streamed_tasks if len(streamed_tasks) > 1 else []
+
+    def _run_streamed_pipeline(self, scenario: Scenario, tasklist, start_task=None, pass_task=None):
+        """Run the provision, orchestrate and execute pipelines as one stream.
+
+        Instead of waiting for the whole provision pipeline to finish, each action
+        and execute is started as soon as the assets it runs against have been
+        provisioned and added to the inventory. Ordering is kept per host: an
+        action/execute waits for the earlier actions sharing a host with it, and
+        pipelines configured to run sequentially in task_concurrency keep running
+        their own tasks in the order they are defined in.
+
+        A task type is started, calling start_task with its name, when its first
+        task is submitted and passed, calling pass_task with its name, once all its
+        tasks and those of the task types before it have completed.
+
+        Once a task fails no new task is started. The error raised carries the
+        name of the earliest task type that failed in its streamed_task attribute.
+        """
+        start_task = start_task or (lambda name: None)
+        pass_task = pass_task or (lambda name: None)
+        nodes = list()
+        with self._graph_lock:
+            for task in tasklist:
+                pipeline = PipelineFactory.get_pipeline(task).build(
+                    scenario, self.teflo_options, scenario_graph=self.scenario_graph)
+                self.logger.info('.' * 50)
+                self.logger.info('Starting tasks on pipeline: %s', pipeline.name)
+                if not pipeline.tasks:
+                    self.logger.warning('... no tasks to be executed ...')
+                nodes.extend([(pipeline.name, pipeline.type.__concurrent__, item) for item in pipeline.tasks])
+
+        def host_names(item):
+            if 'asset' in item:
+                return {item['asset'].name}
+            return {getattr(host, 'name', host) for host in getattr(item.get('package'), 'hosts', None) or []}
+
+        hosts = [host_names(item) for _, _, item in nodes]
+        depends = list()
+        for idx, (name, concurrent, _) in enumerate(nodes):
+            depends.append(set())
+            for prev in range(idx):
+                prev_name = nodes[prev][0]
+                if prev_name == name:
+                    if not concurrent:
+                        depends[idx].add(prev)
+                elif hosts[prev] & hosts[idx]:
+                    depends[idx].add(prev)
+
+        done = set()
+        started = set()
+        failures = list()
+        running = dict()
+        started_tasks = list()
+        passed_tasks = list()
+
+        def start_tasks(name):
+            # the task types before it without tasks of their own are started first
+            for task in tasklist[:tasklist.index(name) + 1]:
+                if task not in started_tasks:
+                    started_tasks.append(task)
+                    start_task(task)
+
+        def pass_tasks():
+            for task in started_tasks:
+                if task in passed_tasks:
+                    continue
+                if [idx for idx, node in enumerate(nodes) if node[0] == task and idx not in done]:
+                    break
+                passed_tasks.append(task)
+                pass_task(task)
+
+        # the assets not provisioned by the stream are added to the inventory up front
+        provisioned = [item['asset'].name for name, _, item in nodes if name == 'provision' and 'asset' in item]
+        all_hosts = [host for host in scenario.get_assets() if host.name not in provisioned]
+        try:
+            if all_hosts:
+                self._populate_inventory(scenario, all_hosts)
+            elif not provisioned:
+                self.logger.info("No hosts provisioned to be added to the inventory")
+        except TefloError as ex:
+            failures.append(('provision', ex.message))
+
+        with ThreadPoolExecutor(max_workers=max(1, min(len(nodes), STREAMED_TASKS_MAX_WORKERS))) as executor:
+            while True:
+                for idx, (name, _, item) in enumerate(nodes):
+                    if failures or idx in started or not depends[idx] <= done:
+                        continue
+                    if name != 'provision':
+                        # the hosts have been provisioned since the pipeline was built
+                        with self._graph_lock:
+                            item = PipelineBuilder.fetch_task_assets(item, self.teflo_options, self.scenario_graph)
+                    start_tasks(name)
+                    started.add(idx)
+                    running[executor.submit(self._blastoff, [item], False)] = idx
+                if not running:
+                    break
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    idx = running.pop(future)
+                    name, _, item = nodes[idx]
+                    try:
+                        data = future.result()
+                    except blaster.BlasterError as ex:
+                        failures.append((name, ex.message))
+                        self._reload_scenario_resources(scenario, ex.results)
+                        continue
+                    self._reload_scenario_resources(scenario, data)
+                    if name == 'provision' and 'asset' in item:
+                        # add the assets created by the task, count may have created several of them
+                        created = [asset.get('name') for result in data for method in result.get('methods')
+                                   if isinstance(method.get('rvalue'), list) for asset in method.get('rvalue')]
+                        created = created or [item['asset'].name]
+                        new_hosts = [host for host in scenario.get_assets() if host.name in created]
+                        try:
+                            if new_hosts:
+                                self._populate_inventory(scenario, new_hosts)
+                        except TefloError as ex:
+                            failures.append((name, ex.message))
+                            continue
+                    done.add(idx)
+                pass_tasks()
+
+        if not failures:
+            start_tasks(tasklist[-1])
+            pass_tasks()
+
+        if failures:
+            error = blaster.BlasterError('\n'.join([message for _, message in failures]))
+            error.streamed_task = sorted([name for name, _ in failures], key=TASKLIST.index)[0]
+            raise error
+
+    @staticmethod
+    def _blastoff(tasks, serial):
+        """Run the tasks with blaster."""
+        return BlasterPipelineExecutor().run(tasks, serial)
+
     @property
     def data_folder_results_yml_path(self):
         return os.path.join(self.data_folder, RESULTS_FILE)
@@ -847,7 +1078,7 @@ class Teflo(LoggerMixin, TimeMixin):
             ctx.exit()
 
         # Copy the files to the new directory and clean cache
-        copy_tree('./.teflo_cache/teflo_init/', dirname)
+        shutil.copytree('./.teflo_cache/teflo_init/', dirname, dirs_exist_ok=True)
         shutil.rmtree('.teflo_cache')
 
     def showgraph(self, ctx, scenario_graph: ScenarioGraph, iterate_method):
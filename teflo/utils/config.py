@@ -27,8 +27,8 @@
 import os
 
 from .._compat import RawConfigParser
-from ..constants import DEFAULT_CONFIG, DEFAULT_CONFIG_SECTIONS, DEFAULT_TASK_CONCURRENCY, DEFAULT_TIMEOUT
-from ..ansible_helpers import AnsibleCredentialManager
+from ..constants import DEFAULT_CONFIG, DEFAULT_CONFIG_SECTIONS, DEFAULT_TASK_CONCURRENCY, DEFAULT_TIMEOUT, \
+    DEFAULT_ANSIBLE
 from ..helpers import template_render
 
 
@@ -247,6 +247,25 @@ class Config(dict):
                 _timeout.update({option.upper(): int(self.parser.get(section, option))})
         self.__setitem__('TIMEOUT', _timeout)
 
+    def __set_ansible__(self):
+        """
+        Set the ansible settings teflo manages for the ansible calls of a run
+        from teflo.cfg [ansible] section
+        e.x.:
+        [ansible]
+        fact_caching=jsonfile
+        gathering=smart
+        control_persist=30m
+        pipelining=False
+        """
+        _ansible = dict(DEFAULT_ANSIBLE)
+        for section in getattr(self.parser, "_sections"):
+            if not section.startswith("ansible"):
+                continue
+            for option in self.parser.options(section):
+                _ansible.update({option.upper(): self.parser.get(section, option)})
+        self.__setitem__('ANSIBLE', _ansible)
+
     def load(self):
         """Load configuration settings.
 
@@ -275,5 +294,26 @@ class Config(dict):
             for config in DEFAULT_CONFIG_SECTIONS:
                 getattr(self, '__set_%s__' % config)()
 
-        cred_man = AnsibleCredentialManager(self)
-        cred_man.populate_teflo_cfg_credentials()
+        if not self.get("CREDENTIALS") and self.get("CREDENTIAL_PATH"):
+            # the credentials are kept in an ansible vault file, only import ansible when needed
+            from ..ansible_helpers import AnsibleCredentialManager
+            cred_man = AnsibleCredentialManager(self)
+            cred_man.populate_teflo_cfg_credentials()
+
+    def overlay(self, *overrides):
+        """Return a new config built from these settings and the overrides.
+
+        The config files are not read again, this config is left untouched so
+        a loaded config can be shared as the base of many configs.
+
+        :param overrides: settings applied in order over these settings
+        :type overrides: dict
+        :return: the new config
+        :rtype: Config
+        """
+        config = Config()
+        config.clear()
+        config.update(self)
+        for settings in overrides:
+            config.update(settings)
+        return config
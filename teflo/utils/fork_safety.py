@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2022 Red Hat, Inc.
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+    teflo.utils.fork_safety
+
+    Module containing the locks teflo holds while the process forks.
+
+    Blaster forks its worker processes from the threads running the parallel
+    scenarios and the streamed tasks. A lock held by another thread at that
+    time would stay locked forever in the worker. The locks created by
+    ~fork_safe_lock are acquired before the process forks and released in
+    both the parent and the worker once it has forked, so the worker always
+    starts with them unlocked and with the data they guard in a consistent
+    state.
+
+    :copyright: (c) 2022 Red Hat, Inc.
+    :license: GPLv3, see LICENSE for more details.
+"""
+
+import os
+import threading
+import weakref
+
+# the locks are acquired in the order they were created in
+_locks = list()
+_locks_lock = threading.Lock()
+_held = list()
+
+
+def fork_safe_lock():
+    """Return a new re-entrant lock which is held while the process forks.
+
+    The lock is re-entrant so the thread forking can hold it already.
+
+    :return: the lock
+    :rtype: threading.RLock
+    """
+    lock = threading.RLock()
+    with _locks_lock:
+        _locks[:] = [ref for ref in _locks if ref() is not None]
+        _locks.append(weakref.ref(lock))
+    return lock
+
+
+def _before_fork():
+    _locks_lock.acquire()
+    for ref in _locks:
+        lock = ref()
+        if lock is not None:
+            lock.acquire()
+            _held.append(lock)
+
+
+def _after_fork():
+    while _held:
+        _held.pop().release()
+    _locks_lock.release()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(before=_before_fork, after_in_parent=_after_fork, after_in_child=_after_fork)
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2022 Red Hat, Inc.
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+    teflo.utils.galaxy_cache
+
+    Module containing the cache of the roles and collections installed with
+    ansible-galaxy.
+
+    :copyright: (c) 2022 Red Hat, Inc.
+    :license: GPLv3, see LICENSE for more details.
+"""
+
+import fcntl
+import hashlib
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+from logging import getLogger
+
+LOG = getLogger(__name__)
+
+# bump it when the content of the install records changes
+GALAXY_CACHE_VERSION = 1
+
+
+class GalaxyInstallCache(object):
+    """Cache of the ansible-galaxy installs.
+
+    Each install is keyed by the hash of what is installed, the content of the
+    requirements file or the name of the role or collection, and of the
+    folders it is installed into. Once an install succeeded a record of the
+    entries of these folders is kept, the same install is then skipped as
+    long as all these entries are still there. A lock file per install keeps
+    concurrent actions, threads or processes, from installing the same content
+    at the same time.
+    """
+
+    def __init__(self, cache_dir):
+        """Constructor.
+
+        :param cache_dir: directory holding the install records
+        :type cache_dir: str
+        """
+        self.cache_dir = os.path.abspath(os.path.expanduser(cache_dir))
+
+    def key(self, kind, content, install_paths):
+        """Return the key of an install.
+
+        :param kind: role or collection
+        :type kind: str
+        :param content: requirements file content or role/collection name
+        :type content: str or bytes
+        :param install_paths: folders the content is installed into
+        :type install_paths: list
+        :return: the key
+        :rtype: str
+        """
+        if isinstance(content, str):
+            content = content.encode('utf-8')
+        digest = hashlib.sha256(content).hexdigest()
+        return hashlib.sha256(json.dumps(
+            [GALAXY_CACHE_VERSION, kind, digest, [os.path.abspath(path) for path in install_paths]]
+        ).encode('utf-8')).hexdigest()[:32]
+
+    @staticmethod
+    def _entries(kind, install_paths):
+        # the roles are folders of the install path, the collections are namespace/name folders
+        entries = dict()
+        for path in install_paths:
+            path = os.path.abspath(path)
+            if kind == 'collection':
+                root = path if os.path.basename(path) == 'ansible_collections' else \
+                    os.path.join(path, 'ansible_collections')
+                if not os.path.isdir(root):
+                    continue
+                entries[path] = sorted([os.path.join(namespace, name) for namespace in os.listdir(root)
+                                        if os.path.isdir(os.path.join(root, namespace))
+                                        for name in os.listdir(os.path.join(root, namespace))])
+            elif os.path.isdir(path):
+                entries[path] = sorted(os.listdir(path))
+        return entries
+
+    @contextmanager
+    def _locked(self, key):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with open(os.path.join(self.cache_dir, key + '.lock'), 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def is_installed(self, key, kind, install_paths):
+        """Check if an install succeeded and its entries are all still there.
+
+        :param key: key of the install
+        :type key: str
+        :param kind: role or collection
+        :type kind: str
+        :param install_paths: folders the content is installed into
+        :type install_paths: list
+        :return: whether the install can be skipped
+        :rtype: bool
+        """
+        try:
+            with open(os.path.join(self.cache_dir, key + '.json')) as f:
+                recorded = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if not recorded:
+            return False
+        current = self._entries(kind, install_paths)
+        return all([path in current and set(names) <= set(current[path]) for path, names in recorded.items()])
+
+    def install(self, kind, content, install_paths, install):
+        """Run the install unless the same content is already installed.
+
+        :param kind: role or collection
+        :type kind: str
+        :param content: requirements file content or role/collection name
+        :type content: str or bytes
+        :param install_paths: folders the content is installed into
+        :type install_paths: list
+        :param install: function running the install, returning the results of the command
+        :type install: function
+        :return: the results of the install command, (0, '') when it was skipped
+        :rtype: tuple
+        """
+        key = self.key(kind, content, install_paths)
+        with self._locked(key):
+            if self.is_installed(key, kind, install_paths):
+                LOG.info('The %ss are already installed, skipping the install' % kind)
+                return 0, ''
+            results = install()
+            if results[0] == 0:
+                tmp_path = None
+                try:
+                    fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+                    with os.fdopen(fd, 'w') as f:
+                        json.dump(self._entries(kind, install_paths), f)
+                    os.replace(tmp_path, os.path.join(self.cache_dir, key + '.json'))
+                except Exception as ex:
+                    # the record is only an optimization, the install succeeded anyway
+                    LOG.debug('Unable to record the install of the %ss: %s' % (kind, ex))
+                    if tmp_path and os.path.exists(tmp_path):
+                        os.remove(tmp_path)
+            return results
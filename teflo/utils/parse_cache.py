@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2022 Red Hat, Inc.
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+    teflo.utils.parse_cache
+
+    Module containing the on disk cache of the parsed variable files.
+
+    :copyright: (c) 2022 Red Hat, Inc.
+    :license: GPLv3, see LICENSE for more details.
+"""
+
+import hashlib
+import json
+import os
+import stat
+import tempfile
+from logging import getLogger
+
+from ruamel.yaml import __version__ as ruamel_version
+from ruamel.yaml.comments import CommentedMap, CommentedSeq
+from ruamel.yaml.scalarfloat import ScalarFloat
+from ruamel.yaml.scalarint import BinaryInt, DecimalInt, HexCapsInt, HexInt, OctalInt, ScalarInt
+from ruamel.yaml.scalarstring import DoubleQuotedScalarString, FoldedScalarString, LiteralScalarString, \
+    PlainScalarString, SingleQuotedScalarString
+
+from ..helpers import file_mgmt
+
+LOG = getLogger(__name__)
+
+# bump it when the parsed data kept in the cache changes
+PARSE_CACHE_VERSION = 2
+
+# the ruamel scalar types rebuilt from the cache, their formatting attributes included
+_SCALARS = {cls.__name__: cls for cls in [
+    DoubleQuotedScalarString, FoldedScalarString, LiteralScalarString, PlainScalarString, SingleQuotedScalarString,
+    ScalarFloat, BinaryInt, DecimalInt, HexCapsInt, HexInt, OctalInt, ScalarInt]}
+
+# the containers rebuilt from the cache, keyed by their tag
+_MAPPINGS = {'map': CommentedMap, 'dict': dict}
+_SEQUENCES = {'seq': CommentedSeq, 'list': list}
+
+
+def _encode(data):
+    """Return the parsed data as json serializable data.
+
+    The containers and the ruamel scalars are stored as json objects tagged
+    with their type, so they are rebuilt with the same type.
+
+    :raises TypeError: when the data holds a type which can not be rebuilt
+    """
+    if data is None or type(data) in [str, int, float, bool]:
+        return data
+    for tag, cls in _MAPPINGS.items():
+        if type(data) is cls:
+            return {tag: [[_encode(key), _encode(value)] for key, value in data.items()]}
+    for tag, cls in _SEQUENCES.items():
+        if type(data) is cls:
+            return {tag: [_encode(value) for value in data]}
+    if _SCALARS.get(type(data).__name__) is type(data):
+        base = [base for base in [str, int, float] if isinstance(data, base)][0]
+        return {'scalar': type(data).__name__, 'value': base(data), 'attrs': dict(getattr(data, '__dict__', {}))}
+    raise TypeError('%s values can not be cached' % type(data).__name__)
+
+
+def _decode(data):
+    """Return the parsed data rebuilt from its json serializable data."""
+    if not isinstance(data, dict):
+        return data
+    for tag, cls in _MAPPINGS.items():
+        if tag in data:
+            mapping = cls()
+            for key, value in data[tag]:
+                mapping[_decode(key)] = _decode(value)
+            return mapping
+    for tag, cls in _SEQUENCES.items():
+        if tag in data:
+            return cls([_decode(value) for value in data[tag]])
+    scalar = _SCALARS[data['scalar']](data['value'])
+    if data['attrs']:
+        scalar.__dict__.update(data['attrs'])
+    return scalar
+
+
+def _is_trusted(st):
+    """Tell if the cache file or directory is owned by the user and only writable by it."""
+    return st.st_uid == os.getuid() and not st.st_mode & (stat.S_IWGRP | stat.S_IWOTH)
+
+
+class ParseCache(object):
+    """On disk cache of the parsed files.
+
+    The data of each file is kept as json in its own cache file named after
+    the hash of the file path, together with the size, modification time and
+    inode of the file it was parsed from. A cached entry is used only while
+    the file still has the same size, modification time and inode, the file
+    is parsed again otherwise.
+
+    The cache directory is created only readable by the user. The cache is
+    not used when the directory or an entry is not owned by the user or is
+    writable by others.
+    """
+
+    def __init__(self, cache_dir):
+        """Constructor.
+
+        :param cache_dir: directory holding the parsed files
+        :type cache_dir: str
+        """
+        self.cache_dir = os.path.abspath(os.path.expanduser(cache_dir))
+        self._trusted_dir = None
+
+    def _cache_path(self, file_path):
+        return os.path.join(self.cache_dir, hashlib.sha256(file_path.encode('utf-8')).hexdigest()[:32] + '.json')
+
+    @staticmethod
+    def _key(st):
+        return [PARSE_CACHE_VERSION, ruamel_version, st.st_size, st.st_mtime_ns, st.st_ino]
+
+    def _check_cache_dir(self):
+        """Create the cache directory and tell if it can be used."""
+        if self._trusted_dir is None:
+            try:
+                os.makedirs(self.cache_dir, mode=0o700, exist_ok=True)
+                st = os.lstat(self.cache_dir)
+                self._trusted_dir = stat.S_ISDIR(st.st_mode) and _is_trusted(st)
+            except OSError as ex:
+                LOG.debug('Unable to create the parsed files cache %s: %s' % (self.cache_dir, ex))
+                self._trusted_dir = False
+            else:
+                if not self._trusted_dir:
+                    LOG.warning('Not using the parsed files cache %s, it is not a directory owned by the user '
+                                'and only writable by it.' % self.cache_dir)
+        return self._trusted_dir
+
+    def _read(self, cache_path):
+        """Return the cache entry, None when there is none or it can not be trusted."""
+        try:
+            fd = os.open(cache_path, os.O_RDONLY | getattr(os, 'O_NOFOLLOW', 0))
+        except OSError:
+            return None
+        with os.fdopen(fd, 'r') as f:
+            st = os.fstat(f.fileno())
+            if not stat.S_ISREG(st.st_mode) or not _is_trusted(st):
+                LOG.warning('Not using the parsed files cache entry %s, it is not owned by the user '
+                            'and only writable by it.' % cache_path)
+                return None
+            return json.load(f)
+
+    def load(self, file_path):
+        """Return the parsed data of the file, parse it only when it changed.
+
+        :param file_path: path of the file
+        :type file_path: str
+        :return: data of the file as returned by ~teflo.helpers.file_mgmt
+        """
+        file_path = os.path.abspath(file_path)
+        if not self._check_cache_dir():
+            return file_mgmt('r', file_path)
+
+        key = self._key(os.stat(file_path))
+        cache_path = self._cache_path(file_path)
+        try:
+            entry = self._read(cache_path)
+            if entry and entry['path'] == file_path and entry['key'] == key:
+                return _decode(entry['data'])
+        except Exception:
+            # an entry which can not be read any more
+            pass
+
+        data = file_mgmt('r', file_path)
+        tmp_path = None
+        try:
+            entry = json.dumps(dict(path=file_path, key=key, data=_encode(data)))
+            # write next to the cache entry then move it, a reader never sees a partial entry
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+            with os.fdopen(fd, 'w') as f:
+                f.write(entry)
+            os.replace(tmp_path, cache_path)
+        except Exception as ex:
+            # the cache is only an optimization, the parsed data is returned anyway
+            LOG.debug('Unable to cache the parsed file %s: %s' % (file_path, ex))
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return data
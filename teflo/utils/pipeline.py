@@ -20,22 +20,40 @@
     teflo.utils.pipeline
 
     Module containing classes and functions for building pipelines of resources
-    and tasks for teflo to run.
+    and tasks for teflo to run, and the executors running them.
 
     :copyright: (c) 2022 Red Hat, Inc.
     :license: GPLv3, see LICENSE for more details.
 """
 
+import multiprocessing
+import pickle
+import threading
+import traceback
 from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from logging import getLogger
+from uuid import uuid4
+
+import blaster
+from blaster.core import TaskDefinition
 from teflo.resources.scenario import Scenario
 from teflo.utils.scenario_graph import ScenarioGraph
 
-from ..constants import TASKLIST, NOTIFYSTATES
+from ..core import TefloResource
+from ..constants import TASKLIST, NOTIFYSTATES, PIPELINE_EXECUTORS, PIPELINE_THREAD_MAX_WORKERS
 from ..exceptions import TefloError
-from ..helpers import fetch_assets, get_core_tasks_classes, fetch_executes, filter_actions_on_failed_status, \
+from ..helpers import fetch_assets, get_core_tasks_registry, fetch_executes, filter_actions_on_failed_status, \
     set_task_class_concurrency, filter_resources_labels, filter_notifications_to_skip, filter_notifications_on_trigger
 
 from ..tasks import CleanupTask
+from .fork_safety import fork_safe_lock
+
+LOG = getLogger(__name__)
+
+# tasks run by blaster's forked worker processes, keyed by the id of their envelope
+_shared_tasks = dict()
+_shared_tasks_lock = fork_safe_lock()
 
 
 class PipelineFactory(object):
@@ -101,10 +119,35 @@ class PipelineBuilder(object):
         :return: the class associated for the pipeline task.
         :rtype: class
         """
-        for cls in get_core_tasks_classes():
-            if cls.__task_name__ == self.name:
-                return cls
-        raise TefloError('Unable to lookup task %s class.' % self.name)
+        try:
+            return get_core_tasks_registry()[self.name]
+        except KeyError:
+            raise TefloError('Unable to lookup task %s class.' % self.name)
+
+    @staticmethod
+    def fetch_task_assets(task, teflo_options, scenario_graph: ScenarioGraph):
+        """Set the hosts of an orchestrate/execute task from the scenario graph assets.
+
+        :param task: orchestrate or execute task
+        :type task: dict
+        :param teflo_options: extra options provided during teflo run
+        :type teflo_options: dict
+        :param scenario_graph: scenario graph holding all the assets
+        :type scenario_graph: ScenarioGraph
+        :return: updated task object including host objects
+        :rtype: dict
+        """
+        # filtering assets to find if there are any matching the provided label
+        assets = filter_resources_labels(scenario_graph.get_assets(), teflo_options)
+        # here we check that if filtered assets are empty then we pass all the assets from the
+        # scenario_graph. This is done because if there are no labels on assets in the SDF it will
+        # always return empty, and we will not get the correct assets for the orc/exe tasks
+        # whether the assests from scenario_graphs asset belong to the orch/exe task will be
+        # checked in the fetch_assets method based on host name or group name provided in the orch/exe
+        # block of the SDF
+        if not assets:
+            assets = scenario_graph.get_assets()
+        return fetch_assets(assets, task)
 
     def build(self, scenario: Scenario, teflo_options, scenario_graph: ScenarioGraph = None):
         """Build teflo pipeline.
@@ -161,17 +204,7 @@ class PipelineBuilder(object):
                 for task in action.get_tasks():
                     if task['task'].__task_name__ == self.name:
                         # fetch & set hosts for the given action task
-                        # filtering assets to find if there are any matching the provided label
-                        assets = filter_resources_labels(scenario_graph.get_assets(), teflo_options)
-                        # here we check that if filtered assets are empty then we pass all the assets from the
-                        # scenario_graph. This is done because if there are no labels on assets in the SDF it will
-                        # always return empty, and we will not get the correct assets for the orc/exe tasks
-                        # whether the assests from scenario_graphs asset belong to the orch/exe task will be
-                        # checked in the fetch_assets method based on host name or group name provided in the orch/exe
-                        # block of the SDF
-                        if not assets:
-                            assets = scenario_graph.get_assets()
-                        task = fetch_assets(assets, task)
+                        task = self.fetch_task_assets(task, teflo_options, scenario_graph)
                         pipeline.tasks.append(set_task_class_concurrency(task, action))
 
         if self.name.lower() in ['validate', 'execute']:
@@ -180,17 +213,7 @@ class PipelineBuilder(object):
                 for task in execute.get_tasks():
                     if task['task'].__task_name__ == self.name:
                         # fetch & set hosts for the given executes task
-                        # filtering assets to find if there are any matching the provided label
-                        assets = filter_resources_labels(scenario_graph.get_assets(), teflo_options)
-                        # here we check that if filtered assets are empty then we pass all the assets from the
-                        # scenario_graph. This is done because if there are no labels on assets in the SDF it will
-                        # always return empty, and we will not get the correct assets for the orc/exe tasks
-                        # whether the assests from scenario_graphs asset belong to the orch/exe task will be
-                        # checked in the fetch_assets method based on host name or group name provided in the orch/exe
-                        # block of the SDF
-                        if not assets:
-                            assets = scenario_graph.get_assets()
-                        task = fetch_assets(assets, task)
+                        task = self.fetch_task_assets(task, teflo_options, scenario_graph)
                         pipeline.tasks.append(set_task_class_concurrency(task, execute))
 
         if self.name.lower() in ['validate', 'report']:
@@ -319,3 +342,257 @@ class NotificationPipelineBuilder(PipelineBuilder):
                     pipeline.tasks.append(task)
 
         return pipeline
+
+
+class PipelineExecutorFactory(object):
+
+    @staticmethod
+    def get_executor(task, config):
+        """Return the executor to run the pipeline tasks with.
+
+        The executor is set per task with the <task>_executor option of the
+        task_concurrency section, blaster is used when it is not set.
+
+        :param task: task name
+        :type task: str
+        :param config: teflo config
+        :type config: dict
+        :return: pipeline executor object
+        """
+        name = str(config.get('TASK_CONCURRENCY', {}).get('%s_EXECUTOR' % task.upper(), 'blaster')).lower()
+        if name not in PIPELINE_EXECUTORS:
+            raise TefloError('Pipeline executor %s set for the %s task is not valid, it must be one of %s.'
+                             % (name, task, PIPELINE_EXECUTORS))
+        if name == 'thread':
+            return ThreadPipelineExecutor()
+        return BlasterPipelineExecutor()
+
+
+def _task_resource(task):
+    """Return the resource a task works on."""
+    for key in ['asset', 'package', 'resource']:
+        if key in task:
+            return task[key]
+    return None
+
+
+def _is_reference(name, value):
+    """Check if a resource attribute refers to data shared with other tasks.
+
+    The config and the other resources (the hosts, executes or scenario of a
+    resource) are shared, they are neither sent to nor back from the workers.
+    """
+    if name == '_config' or isinstance(value, TefloResource):
+        return True
+    if isinstance(value, (list, tuple, set)):
+        return any([isinstance(item, TefloResource) for item in value])
+    return False
+
+
+def _resource_state(resource):
+    """Return the pickled attributes of the resource, without its references."""
+    state = dict()
+    for name, value in getattr(resource, '__dict__', {}).items():
+        if _is_reference(name, value):
+            continue
+        try:
+            state[name] = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            # not something a worker could send back either
+            continue
+    return state
+
+
+class TaskEnvelope(object):
+    """Stand-in for a pipeline task in blaster's worker processes.
+
+    Blaster pickles every task it hands to a worker process and every task a
+    worker hands back. Instead of the task, blaster is given a small envelope
+    holding the id of the task, its name and its methods. The worker processes
+    are forked from teflo, the envelope finds the task in the tasks they
+    inherited and runs it there. The attributes of its resource that changed
+    are sent back in the delta of the envelope, to be applied on the resource
+    of the teflo process.
+    """
+
+    def __init__(self, envelope_id, delta, **kwargs):
+        """Constructor.
+
+        :param envelope_id: id of the task in the shared tasks
+        :type envelope_id: str
+        :param delta: the changed resource attributes, filled while the task runs
+        :type delta: dict
+        :param kwargs: additional keyword arguments
+        :type kwargs: dict
+        """
+        try:
+            task = _shared_tasks[envelope_id]
+        except KeyError:
+            raise TefloError('Task %s is not shared with the worker process.' % kwargs.get('name'))
+        self._delta = delta
+        self._resource = _task_resource(task)
+        self._state = _resource_state(self._resource)
+        self._task = task['task'](**task)
+
+    def __getattr__(self, method):
+        func = getattr(self._task, method)
+
+        def run():
+            try:
+                return func()
+            finally:
+                for name, value in _resource_state(self._resource).items():
+                    if self._state.get(name) != value:
+                        self._delta[name] = getattr(self._resource, name)
+        return run
+
+
+class BlasterPipelineExecutor(object):
+    """Run the pipeline tasks with blaster.
+
+    The concurrent tasks are run in worker processes. When the workers are
+    forked they are only sent envelopes of the tasks, see ~TaskEnvelope.
+    """
+
+    @staticmethod
+    def _blastoff(tasks, serial):
+        # the sequential tasks are run by blaster in the teflo process, nothing is pickled
+        if serial or multiprocessing.get_start_method() != 'fork':
+            return blaster.Blaster(tasks).blastoff(serial=serial, raise_on_failure=True)
+
+        envelopes = list()
+        with _shared_tasks_lock:
+            for task in tasks:
+                envelope_id = str(uuid4())
+                _shared_tasks[envelope_id] = task
+                envelopes.append(dict(name=task['name'], task=TaskEnvelope, methods=task['methods'],
+                                      timeout=task.get('timeout'), envelope_id=envelope_id, delta=dict()))
+        try:
+            try:
+                results = blaster.Blaster(envelopes).blastoff(serial=False, raise_on_failure=True)
+            except blaster.BlasterError as ex:
+                raise blaster.BlasterError(ex.message, results=[_open_envelope(item) for item in ex.results])
+            return [_open_envelope(item) for item in results]
+        finally:
+            with _shared_tasks_lock:
+                for envelope in envelopes:
+                    _shared_tasks.pop(envelope['envelope_id'], None)
+
+    def run(self, tasks, serial):
+        """Run the tasks.
+
+        Blaster can only arm the task timeout alarm from the main thread. When
+        scenarios are run by the parallel iterate method, sequential tasks with
+        a timeout are handed to blaster one at a time so each of them runs in a
+        worker process, stopping at the first failure like blaster does.
+
+        :param tasks: pipeline tasks
+        :type tasks: list
+        :param serial: whether to run the tasks sequentially
+        :type serial: bool
+        :return: the task results
+        :rtype: list
+        """
+        if not serial or threading.current_thread() is threading.main_thread() or \
+                not [task for task in tasks if task.get('timeout')]:
+            return self._blastoff(tasks, serial)
+
+        data = list()
+        for task in tasks:
+            try:
+                data.extend(self._blastoff([task], False))
+            except blaster.BlasterError as ex:
+                data.extend(ex.results)
+                raise blaster.BlasterError(ex.message, results=data)
+        return data
+
+
+def _open_envelope(envelope):
+    """Return the result of the task from the result of its envelope.
+
+    The changed attributes are set on the resource of the task, the result
+    refers to the task resources like the results of blaster do.
+    """
+    task = dict(_shared_tasks[envelope['envelope_id']])
+    task.pop('timeout', None)
+    resource = _task_resource(task)
+    if resource is not None and envelope.get('delta'):
+        resource.__dict__.update(envelope['delta'])
+    for key in ['bid', 'status', 'methods']:
+        if key in envelope:
+            task[key] = envelope[key]
+    return task
+
+
+class ThreadPipelineExecutor(object):
+    """Run the pipeline tasks in threads of the teflo process.
+
+    The tasks work on the resources themselves instead of copies of them, so
+    nothing is pickled to or from worker processes. It suits the tasks spending
+    their time waiting on I/O. The results are the same as blaster's, in the
+    order of the tasks.
+
+    Task timeouts need the alarm signal blaster arms in its worker processes,
+    tasks with a timeout are therefore still run by blaster.
+    """
+
+    @staticmethod
+    def _run_task(task):
+        task_obj = task['task'](**task)
+        task.pop('timeout', None)
+        methods = list()
+        task['status'] = 0
+        for index, method in enumerate(task['methods']):
+            LOG.debug('Running method %s of task %s' % (method, task['name']))
+            try:
+                methods.append({'name': method, 'status': 0, 'rvalue': getattr(task_obj, method)()})
+            except Exception as ex:
+                LOG.error('A exception was raised while processing task: %s method: %s' % (task['name'], method))
+                LOG.debug(ex)
+                task['status'] = 1
+                methods.append({'name': method, 'status': 1, 'rvalue': None,
+                                'traceback': traceback.format_tb(ex.__traceback__)})
+                methods.extend([{'name': item, 'status': 'n/a', 'rvalue': None}
+                                for item in task['methods'][index + 1:]])
+                break
+        task['methods'] = methods
+        return task
+
+    @staticmethod
+    def _skip_task(task):
+        task.pop('timeout', None)
+        task['status'] = 'n/a'
+        task['methods'] = [{'name': method, 'status': 'n/a', 'rvalue': None} for method in task['methods']]
+        return task
+
+    def run(self, tasks, serial):
+        """Run the tasks.
+
+        :param tasks: pipeline tasks
+        :type tasks: list
+        :param serial: whether to run the tasks sequentially
+        :type serial: bool
+        :return: the task results
+        :rtype: list
+        """
+        if [task for task in tasks if task.get('timeout')]:
+            LOG.debug('Tasks with a timeout are run by blaster.')
+            return BlasterPipelineExecutor().run(tasks, serial)
+
+        tasks = [TaskDefinition(task) for task in tasks]
+        LOG.debug('Running %s task(s) %s in threads' % (len(tasks), 'sequentially' if serial else 'concurrently'))
+        if serial:
+            data = list()
+            for task in tasks:
+                if data and data[-1]['status'] != 0:
+                    # stop at the first failure like blaster does
+                    data.append(self._skip_task(task))
+                else:
+                    data.append(self._run_task(task))
+        else:
+            with ThreadPoolExecutor(max_workers=max(1, min(len(tasks), PIPELINE_THREAD_MAX_WORKERS))) as executor:
+                data = list(executor.map(self._run_task, tasks))
+
+        if [task for task in data if task['status'] != 0]:
+            raise blaster.BlasterError('One or more tasks got a status of non zero.', results=data)
+        return data
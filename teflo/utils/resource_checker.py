@@ -26,14 +26,11 @@
     :license: GPLv3, see LICENSE for more details.
 """
 
-import urllib3
 import json
 import time
 import warnings
-import cachetclient.cachet as cachet
 from logging import getLogger
 from teflo.exceptions import TefloError, AnsibleServiceError
-from teflo.ansible_helpers import AnsibleService
 from ..helpers import StatusPageHelper
 
 LOG = getLogger(__name__)
@@ -69,6 +66,7 @@ class ResourceChecker(object):
     def __check_custom_resource(self):
         # method to run playbook or scripts as a part of resource validation on local hosts before the scenario
         # provisioning is started
+        from teflo.ansible_helpers import AnsibleService
 
         # creating ansible service class object
         self.ans_service = AnsibleService(self.config, hosts=['localhost'], all_hosts=[], ansible_options=None)
@@ -153,6 +151,8 @@ class ResourceChecker(object):
         :param scenario: teflo scenario object
         :param config: teflo config object
         """
+        import urllib3
+        import cachetclient.cachet as cachet
 
         # External Dependency Check
         # Available components to check ci-rhos, zabbix-sysops, brew, covscan
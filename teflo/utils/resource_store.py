@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2022 Red Hat, Inc.
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+    teflo.utils.resource_store
+
+    Module containing the ordered store holding the resources of a scenario
+    and of the scenario graph.
+
+    :copyright: (c) 2022 Red Hat, Inc.
+    :license: GPLv3, see LICENSE for more details.
+"""
+
+from collections import Counter
+
+
+class ResourceStore(list):
+    """Ordered list of resources indexed by resource id and name.
+
+    Resources are equal when their resource ids are equal, the store keeps
+    a count of the resource ids and names it holds so membership checks
+    do not scan the list. The position of each resource is kept in an index
+    which is built when first needed after the order of the list changed.
+    """
+
+    def __init__(self, iterable=()):
+        super(ResourceStore, self).__init__(iterable)
+        self._reindex()
+
+    def __reduce__(self):
+        return self.__class__, (list(self),)
+
+    @staticmethod
+    def _key(item):
+        return getattr(item, 'resource_id', None) or id(item)
+
+    @staticmethod
+    def _name(name):
+        # names are not validated yet when the resources are loaded, they can be of any type
+        try:
+            hash(name)
+        except TypeError:
+            return repr(name)
+        return name
+
+    def _reindex(self):
+        self._ids = Counter(self._key(item) for item in self)
+        self._names = Counter(self._name(getattr(item, 'name', None)) for item in self)
+        self._positions = None
+
+    def _track(self, item):
+        self._ids[self._key(item)] += 1
+        self._names[self._name(getattr(item, 'name', None))] += 1
+
+    def _untrack(self, item):
+        for counter, key in [(self._ids, self._key(item)), (self._names, self._name(getattr(item, 'name', None)))]:
+            counter[key] -= 1
+            if counter[key] <= 0:
+                del counter[key]
+
+    def has_name(self, name):
+        """Check if a resource with the name is in the store.
+
+        :param name: resource name
+        :type name: str
+        :return: whether the name is in the store
+        :rtype: bool
+        """
+        return self._name(name) in self._names
+
+    def position(self, item):
+        """Return the position of the resource, None when it is not in the store.
+
+        :param item: resource
+        :type item: object
+        :return: index of the resource
+        :rtype: int
+        """
+        key = self._key(item)
+        if key not in self._ids:
+            return None
+        if self._positions is None:
+            self._positions = dict()
+            for idx, resource in enumerate(self):
+                self._positions.setdefault(self._key(resource), idx)
+        return self._positions[key]
+
+    def discard_all(self, items):
+        """Remove the resources from the store in a single pass.
+
+        :param items: resources to remove
+        :type items: list
+        """
+        keys = set(self._key(item) for item in items)
+        if keys.isdisjoint(self._ids):
+            return
+        super(ResourceStore, self).__setitem__(slice(None), [item for item in self if self._key(item) not in keys])
+        self._reindex()
+
+    def __contains__(self, item):
+        return self._key(item) in self._ids
+
+    def index(self, item, *args):
+        if args:
+            return super(ResourceStore, self).index(item, *args)
+        idx = self.position(item)
+        if idx is None:
+            raise ValueError('%s is not in the resource store' % item)
+        return idx
+
+    def append(self, item):
+        super(ResourceStore, self).append(item)
+        self._track(item)
+        if self._positions is not None:
+            self._positions.setdefault(self._key(item), len(self) - 1)
+
+    def extend(self, iterable):
+        for item in iterable:
+            self.append(item)
+
+    def __iadd__(self, iterable):
+        self.extend(iterable)
+        return self
+
+    def insert(self, idx, item):
+        super(ResourceStore, self).insert(idx, item)
+        self._track(item)
+        self._positions = None
+
+    def __setitem__(self, idx, item):
+        if isinstance(idx, slice):
+            super(ResourceStore, self).__setitem__(idx, item)
+            self._reindex()
+            return
+        old = self[idx]
+        super(ResourceStore, self).__setitem__(idx, item)
+        self._untrack(old)
+        self._track(item)
+        if self._key(old) != self._key(item):
+            self._positions = None
+
+    def __delitem__(self, idx):
+        super(ResourceStore, self).__delitem__(idx)
+        self._reindex()
+
+    def remove(self, item):
+        idx = self.index(item)
+        old = self[idx]
+        super(ResourceStore, self).__delitem__(idx)
+        self._untrack(old)
+        self._positions = None
+
+    def pop(self, *args):
+        item = super(ResourceStore, self).pop(*args)
+        self._untrack(item)
+        self._positions = None
+        return item
+
+    def clear(self):
+        super(ResourceStore, self).clear()
+        self._reindex()
+
+    def sort(self, *args, **kwargs):
+        super(ResourceStore, self).sort(*args, **kwargs)
+        self._positions = None
+
+    def reverse(self):
+        super(ResourceStore, self).reverse()
+        self._positions = None
@@ -4,6 +4,7 @@ from teflo.resources.reports import Report
 from teflo.resources.executes import Execute
 from teflo.resources.assets import Asset
 from teflo.resources.scenario import Scenario
+from teflo.utils.resource_store import ResourceStore
 
 
 class ScenarioGraph():
@@ -20,29 +21,25 @@ class ScenarioGraph():
         :param iterate_method: iterate method for the graph traversal
         :type iterate_method: str
         '''
-        self._root = root_scenario
-        self._stack = []
-        if iterate_method == "by_depth":
-            self._stack = [root_scenario]
-        elif iterate_method == "by_level":
-            self._stack.append([self.root])
-        else:
+        if iterate_method not in ["by_depth", "by_level", "parallel"]:
             raise ValueError("the iterate method value set in teflo.cfg is incorrect %s" % iterate_method)
-        self._prev = None
-        self._current = None
-        self._visited = {}
-        # There are two ways of loading resource
+        self._root = root_scenario
+        # There are three ways of loading resource
         # 1. by_depth
         # 2. by_level
+        # 3. parallel (walked in by_level order, run concurrently by teflo)
         self._iterate_method = iterate_method
-        self._assets = assets
-        self._executes = executes
-        self._reports = reports
-        self._notifications = notifications
-        self._actions = actions
+        self._assets = assets if isinstance(assets, ResourceStore) else ResourceStore(assets)
+        self._executes = executes if isinstance(executes, ResourceStore) else ResourceStore(executes)
+        self._reports = reports if isinstance(reports, ResourceStore) else ResourceStore(reports)
+        self._notifications = notifications if isinstance(notifications, ResourceStore) \
+            else ResourceStore(notifications)
+        self._actions = actions if isinstance(actions, ResourceStore) else ResourceStore(actions)
         self._passed_tasks = passed_tasks
         self._failed_tasks = failed_tasks
         self._scenario_vars = scenario_vars
+        # traversal order, computed on first use, see ~ScenarioGraph.order
+        self._order = None
 
 # root
     @property
@@ -53,42 +50,6 @@ class ScenarioGraph():
     def root(self, root):
         self.__init__(root, self.iterate_method)
 
-# stack
-    @property
-    def stack(self):
-        return self._stack
-
-    @stack.setter
-    def stack(self, stack):
-        self._stack = stack
-
-# prev
-    @property
-    def prev(self):
-        return self._prev
-
-    @prev.setter
-    def prev(self, prev):
-        self._prev = prev
-
-# current
-    @property
-    def current(self):
-        return self._current
-
-    @current.setter
-    def current(self, current):
-        self._current = current
-
-# visited
-    @property
-    def visited(self):
-        return self._visited
-
-    @visited.setter
-    def visited(self, visited):
-        self._visited = visited
-
 # iterate_method
     @property
     def iterate_method(self):
@@ -103,19 +64,6 @@ class ScenarioGraph():
     def scenario_vars(self):
         return self._scenario_vars
 
-# iteration implemetation
-    def is_visited(self, sc):
-        '''
-        Check if a scenario object has been visited or not
-        '''
-        return self.visited.get(sc, False)
-
-    def next_unvisited_sc(self, sc_list):
-        for sc in sc_list:
-            if not self.is_visited(sc):
-                return sc
-        return None
-
 # size
     @property
     def size(self):
@@ -128,21 +76,22 @@ class ScenarioGraph():
     def __len__(self):
         return self.size
 
-    def hasChild(self, sc_list):
-        '''
-        Check if any scenario obejct in a list of scenarios
-        contains a child
-        '''
-        return True in [len(sc.child_scenarios) != 0 for sc in sc_list]
+    @property
+    def order(self):
+        """
+        The scenarios of the graph in traversal order -> tuple
 
-    def __iter__(self):
-        return self
+        The order is computed once and reused by every iteration of the
+        graph, it is recomputed by ~ScenarioGraph.reinit after scenarios
+        are included into the graph.
+        """
+        if self._order is None:
+            self._order = self._traversal_order()
+        return self._order
 
-    def __next__(self):
+    def _traversal_order(self):
         '''
-        The iterator method of Scenario Graph
-        It is also the most important place of the ScenarioGraph Class
-        It has two `iterate_method` way of traversal order
+        Compute the traversal order of the graph based on the `iterate_method`
 
         Example:
 
@@ -166,80 +115,38 @@ class ScenarioGraph():
             3,12,13,8,5,1,10,11,7,4,9,6,2,0
         if iterate_method is by_level: the traversal order will be:
             12,13,3,8,5,10,11,4,9,6,1,7,2,0
+        if iterate_method is parallel: the graph is walked in the by_level order,
+            the concurrent scheduling of sibling scenarios is done by the teflo object
         '''
-
+        order = list()
         if self.root is None:
-            raise StopIteration
+            return tuple(order)
 
         if self.iterate_method == "by_depth":
+            # every scenario comes right after its children
+            stack = [(self.root, False)]
+            while stack:
+                sc, expanded = stack.pop()
+                if expanded:
+                    order.append(sc)
+                    continue
+                stack.append((sc, True))
+                stack.extend((child, False) for child in reversed(sc.child_scenarios))
+        else:
+            # a list of sibling scenarios comes right after the children lists of its scenarios
+            stack = [([self.root], False)]
+            while stack:
+                siblings, expanded = stack.pop()
+                if expanded:
+                    order.extend(siblings)
+                    continue
+                stack.append((siblings, True))
+                stack.extend((sc.child_scenarios, False) for sc in reversed(siblings) if sc.child_scenarios)
+
+        return tuple(order)
 
-            while len(self.stack) != 0:
-                self.current = self.stack[-1]
-                if self.prev is None or self.current in self.prev.child_scenarios:
-
-                    if self.next_unvisited_sc(self.current.child_scenarios) is not None:
-                        next_sc = self.next_unvisited_sc(self.current.child_scenarios)
-                        self.stack.append(next_sc)
-                        self.visited[next_sc] = True
-                    else:
-                        self.visited[self.stack.pop()] = True
-                        self.prev = self.current
-                        return self.current
-                elif self.prev in self.current.child_scenarios and self.prev is not self.current.child_scenarios[-1]:
-                    if self.next_unvisited_sc(self.current.child_scenarios) is not None:
-                        next_sc = self.next_unvisited_sc(self.current.child_scenarios)
-                        self.stack.append(next_sc)
-                        self.visited[next_sc] = True
-                    else:
-                        self.visited[self.stack.pop()] = True
-                        self.prev = self.current
-                        return self.current
-                else:
-                    self.visited[self.stack.pop()] = True
-                    self.prev = self.current
-                    return self.current
-                self.prev = self.current
-
-            self.reinit()
-            raise StopIteration
-
-        elif self.iterate_method == "by_level":
-
-            def addChildren(sc_list):
-                size = len(sc_list)
-                for i in range(size - 1, -1, -1):
-                    sc: Scenario = sc_list[i]
-                    child = sc.child_scenarios
-                    if len(child) != 0:
-                        self.stack.append(child)
-
-            while len(self.stack) != 0:
-                # current scenario list
-                self.current = self.stack[-1]
-
-                # From top to down
-                top_down = self.prev is not None and True in [(self.current == sc.child_scenarios) for sc in self.prev]
-                if self.prev is None or top_down:
-                    # current is a list of scenario
-                    if self.hasChild(self.current):
-                        addChildren(self.current)
-                    else:
-                        for sc in self.current:
-                            if not self.is_visited(sc):
-                                self.visited[sc] = True
-                                return sc
-                        self.stack.pop()
-                else:
-                    for sc in self.current:
-                        if not self.is_visited(sc):
-                            self.visited[sc] = True
-                            return sc
-                    self.stack.pop()
-
-                self.prev = self.current
-
-            self.reinit()
-            raise StopIteration
+    def __iter__(self):
+        return iter(self.order)
 
     def __str__(self):
         '''
@@ -370,16 +277,11 @@ class ScenarioGraph():
         with `reload_resources_from_scenario`
         """
 
-        for asset in sc.get_assets():
-            self._assets.remove(asset)
-        for execute in sc.get_executes():
-            self._executes.remove(execute)
-        for action in sc.get_actions():
-            self._actions.remove(action)
-        for notification in sc.get_notifications():
-            self._notifications.remove(notification)
-        for report in sc.get_reports():
-            self._reports.remove(report)
+        self._assets.discard_all(sc.get_assets())
+        self._executes.discard_all(sc.get_executes())
+        self._actions.discard_all(sc.get_actions())
+        self._notifications.discard_all(sc.get_notifications())
+        self._reports.discard_all(sc.get_reports())
 
     def reload_resources_from_scenario(self, scenario: Scenario):
         """
@@ -418,11 +320,20 @@ class ScenarioGraph():
         all_resources.extend([item for item in self.get_notifications()])
         return all_resources
 
+    def dependency_graph(self):
+        """
+        This method returns the scenario graph as a DAG, the keys are
+        the scenarios in traversal order and the values are the scenarios
+        they depend on (their child scenarios) -> dict
+        """
+
+        return {sc: list(sc.child_scenarios) for sc in self}
+
     def reinit(self):
         """
         Thie method re init the whole scenario graph
         with all information the current scenario graph
-        holds
+        holds, the traversal order is computed again
         """
 
         self.__init__(self.root, self.iterate_method, scenario_vars=self.scenario_vars, assets=self.get_assets(),
@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2022 Red Hat, Inc.
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+    teflo.utils.schema_cache
+
+    Module containing the process wide cache of the loaded and compiled
+    pykwalify schemas.
+
+    :copyright: (c) 2022 Red Hat, Inc.
+    :license: GPLv3, see LICENSE for more details.
+"""
+
+import hashlib
+import json
+import os
+
+from pykwalify.compat import yml
+from pykwalify.core import Core
+from pykwalify.errors import CoreError, SchemaError
+from pykwalify.rule import Rule
+
+from .fork_safety import fork_safe_lock
+
+_lock = fork_safe_lock()
+_schemas = dict()
+_compiled_schemas = dict()
+
+
+def _file_key(file_path):
+    file_path = os.path.abspath(file_path)
+    if not os.path.exists(file_path):
+        raise CoreError(u"Provided source_file do not exists on disk : {0}".format(file_path))
+    return file_path, os.stat(file_path).st_mtime_ns
+
+
+def load_schema(schema_file):
+    """Load a schema file once per process.
+
+    The schema is loaded again once the modification time of the file
+    changed. The returned schema is shared, it must not be modified.
+
+    :param schema_file: path of the yaml or json schema file
+    :type schema_file: str
+    :return: the schema
+    :rtype: dict
+    """
+    key = _file_key(schema_file)
+    with _lock:
+        if key not in _schemas:
+            with open(key[0], 'r') as stream:
+                if key[0].endswith('.json'):
+                    data = json.load(stream)
+                elif key[0].endswith('.yaml') or key[0].endswith('.yml'):
+                    data = yml.load(stream)
+                    if not data:
+                        raise CoreError(u"No data loaded from file : {0}".format(schema_file))
+                else:
+                    raise CoreError(u"Unable to load file : {0} : Unknown file format. "
+                                    u"Supported file endings is [.json, .yaml, .yml]".format(schema_file))
+            _schemas[key] = data
+        return _schemas[key]
+
+
+def _included_rule(rule, partial_rules):
+    """Return the partial rule the rule includes, the rule itself when it includes none."""
+    included = [rule]
+    while included[-1].include_name in partial_rules and partial_rules[included[-1].include_name] not in included:
+        included.append(partial_rules[included[-1].include_name])
+    return included[-1]
+
+
+def _resolve_includes(rule, partial_rules, seen):
+    """Replace the included rules of the rule tree by the partial rules they include.
+
+    pykwalify validates the sequence items with its own Core, which looks the
+    included rules up in its global partial schemas. Once resolved, the rules
+    of the mappings and sequences only refer to partial rules directly.
+    """
+    if id(rule) in seen:
+        return
+    seen.add(id(rule))
+    for rules in [rule.mapping, rule.sequence]:
+        for key in (list(rules.keys()) if isinstance(rules, dict) else range(len(rules or []))):
+            rules[key] = _included_rule(rules[key], partial_rules)
+            _resolve_includes(rules[key], partial_rules, seen)
+    for regex_rule in rule.regex_mappings or []:
+        _resolve_includes(regex_rule, partial_rules, seen)
+
+
+class CompiledSchema(object):
+    """A pykwalify schema with its rules built and its extensions imported.
+
+    The compiled schemas are kept per process, keyed by the paths and the
+    modification times of their schema and extension files.
+    """
+
+    def __init__(self, schema, root_rule, partial_rules, extensions):
+        self.schema = schema
+        self.root_rule = root_rule
+        self.partial_rules = partial_rules
+        self.extensions = extensions
+        self._validated = set()
+
+    @staticmethod
+    def _digest(source_data):
+        try:
+            return hashlib.sha256(json.dumps(source_data, sort_keys=True).encode('utf-8')).hexdigest()
+        except (TypeError, ValueError):
+            # data which is not plain json is always validated
+            return None
+
+    def is_validated(self, source_data):
+        """Tell if the same data was already found valid against the schema.
+
+        :param source_data: the data to validate
+        :type source_data: dict
+        :rtype: bool
+        """
+        digest = self._digest(source_data)
+        return digest is not None and digest in self._validated
+
+    def set_validated(self, source_data):
+        """Remember the data was found valid against the schema.
+
+        :param source_data: the validated data
+        :type source_data: dict
+        """
+        digest = self._digest(source_data)
+        if digest is not None:
+            with _lock:
+                self._validated.add(digest)
+
+    @classmethod
+    def get(cls, schema_files, schema_ext_files=None):
+        """Return the compiled schema of the schema and extension files.
+
+        :param schema_files: the yaml schema files
+        :type schema_files: list
+        :param schema_ext_files: the extension files
+        :type schema_ext_files: list
+        :return: the compiled schema
+        :rtype: CompiledSchema
+        """
+        schema_ext_files = schema_ext_files or []
+        key = (tuple(_file_key(f) for f in schema_files), tuple(_file_key(f) for f in schema_ext_files))
+        with _lock:
+            if key not in _compiled_schemas:
+                _compiled_schemas[key] = cls._compile(schema_files, schema_ext_files)
+            return _compiled_schemas[key]
+
+    @classmethod
+    def _compile(cls, schema_files, schema_ext_files):
+        # merge all schema files into one schema the way pykwalify does
+        schema = {}
+        for schema_file in schema_files:
+            data = load_schema(schema_file)
+            for key in data.keys():
+                if key in schema.keys():
+                    raise CoreError(u"Parsed key : {0} : two times in schema files...".format(key))
+            schema = dict(schema, **data)
+
+        # let pykwalify import the extensions, including the ones listed in the schema
+        core = Core(source_data={}, schema_data=schema, extensions=list(schema_ext_files))
+
+        partial_rules = dict()
+        root_schema = dict()
+        for key, value in schema.items():
+            if key.startswith('schema;'):
+                partial_rules[key.split(';', 1)[1]] = Rule(schema=value)
+            else:
+                root_schema[key] = value
+        root_rule = Rule(schema=root_schema)
+        seen = set()
+        for rule in [root_rule] + list(partial_rules.values()):
+            _resolve_includes(rule, partial_rules, seen)
+        return cls(root_schema, root_rule, partial_rules, core.loaded_extensions)
+
+
+class CompiledSchemaCore(Core):
+    """pykwalify core validating data against a compiled schema."""
+
+    def __init__(self, source_data, compiled_schema):
+        """Constructor.
+
+        :param source_data: the data to validate
+        :type source_data: dict
+        :param compiled_schema: the compiled schema
+        :type compiled_schema: CompiledSchema
+        """
+        super(CompiledSchemaCore, self).__init__(source_data=source_data, schema_data={})
+        self.schema = compiled_schema.schema
+        self.root_rule = compiled_schema.root_rule
+        self.loaded_extensions = compiled_schema.extensions
+        self.compiled_schema = compiled_schema
+
+    def _start_validate(self, value=None):
+        self.errors = []
+        self._validate(value, self.root_rule, "", [])
+
+    def _missing_partial_schema(self, value, include_name, path):
+        self.errors.append(SchemaError.SchemaErrorEntry(
+            msg=u"Cannot find partial schema with name '{include_name}'. Existing partial schemas: "
+                u"'{existing_schemas}'. Path: '{path}'",
+            path=path,
+            value=value,
+            include_name=include_name,
+            existing_schemas=", ".join(sorted(self.compiled_schema.partial_rules.keys()))))
+
+    def _validate_include(self, value, rule, path, done=None):
+        # the partial schemas are the ones of the compiled schema, not the pykwalify global ones
+        if rule.include_name is None:
+            return super(CompiledSchemaCore, self)._validate_include(value, rule, path, done)
+        partial_rule = self.compiled_schema.partial_rules.get(rule.include_name)
+        if not partial_rule:
+            self._missing_partial_schema(value, rule.include_name, path)
+            return
+        self._validate(value, partial_rule, path, done)
+
+    def _validate_mapping(self, value, rule, path, done=None):
+        # only the included rules not found in the partial schemas are left, see ~_resolve_includes
+        if isinstance(value, dict) and rule.mapping:
+            for key_rule in rule.mapping.values():
+                if key_rule.include_name is not None and \
+                        not self.compiled_schema.partial_rules.get(key_rule.include_name):
+                    self._missing_partial_schema(value, key_rule.include_name, path)
+                    return
+        super(CompiledSchemaCore, self)._validate_mapping(value, rule, path, done)
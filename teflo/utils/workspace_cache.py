@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2022 Red Hat, Inc.
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+    teflo.utils.workspace_cache
+
+    Module containing the persistent cache of the git repositories used
+    as remote workspaces.
+
+    :copyright: (c) 2022 Red Hat, Inc.
+    :license: GPLv3, see LICENSE for more details.
+"""
+
+import fcntl
+import hashlib
+import os
+import shutil
+from contextlib import contextmanager
+from logging import getLogger
+from shlex import quote
+
+from ..exceptions import TefloError
+from ..helpers import exec_local_cmd
+from .fork_safety import fork_safe_lock
+
+LOG = getLogger(__name__)
+
+
+class RemoteWorkspaceCache(object):
+    """Persistent cache of the remote workspace git repositories.
+
+    Every repository is kept as a bare mirror named after the hash of its url.
+    A mirror is cloned once, then only updated with git fetch, and the remote
+    workspaces are checked out from the local mirror. The mirrors are shared
+    by all teflo runs on the host, a lock file per mirror keeps the runs from
+    updating the same mirror at the same time. When the cache grows over its
+    max size the least recently used mirrors are removed.
+    """
+
+    def __init__(self, cache_dir, max_size=0, env_var=None):
+        """Constructor.
+
+        :param cache_dir: directory holding the mirrors
+        :type cache_dir: str
+        :param max_size: max size of the cache in MB, 0 for no limit
+        :type max_size: int
+        :param env_var: environment variables for the git commands
+        :type env_var: dict
+        """
+        self.cache_dir = os.path.abspath(os.path.expanduser(cache_dir))
+        self.max_size = int(max_size) * 1024 * 1024
+        self.env_var = env_var or {}
+        self._used = set()
+        self._used_lock = fork_safe_lock()
+
+    def mirror_path(self, url):
+        """Return the path of the mirror of the repository.
+
+        :param url: url of the git repository
+        :type url: str
+        :return: path of the mirror
+        :rtype: str
+        """
+        return os.path.join(self.cache_dir, hashlib.sha256(url.encode('utf-8')).hexdigest()[:20] + '.git')
+
+    @contextmanager
+    def _locked(self, mirror, exclusive=True, blocking=True):
+        with open(mirror + '.lock', 'a') as lock_file:
+            flags = fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH
+            fcntl.flock(lock_file, flags if blocking else flags | fcntl.LOCK_NB)
+            try:
+                yield lock_file
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _git(self, cmd):
+        # exec_local_cmd adds the os environment to the env var dictionary, give it a copy
+        results = exec_local_cmd(cmd, env_var=dict(self.env_var) if self.env_var else None)
+        if results[0] != 0:
+            raise TefloError('Remote remote_workspaces download failed!! %s' % results[2])
+        return results[1]
+
+    def update(self, url):
+        """Clone or fetch the mirror of the repository.
+
+        :param url: url of the git repository
+        :type url: str
+        :return: path of the mirror
+        :rtype: str
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        mirror = self.mirror_path(url)
+        with self._locked(mirror) as lock_file:
+            if os.path.isdir(mirror):
+                LOG.debug('Fetching remote workspace %s into the cached mirror %s' % (url, mirror))
+                self._git('git --git-dir %s fetch --prune --quiet' % quote(mirror))
+            else:
+                LOG.debug('Cloning remote workspace %s into the cache %s' % (url, mirror))
+                # clone next to the mirror first so an interrupted clone never looks like a mirror
+                partial = mirror[:-len('.git')] + '.partial'
+                shutil.rmtree(partial, ignore_errors=True)
+                self._git('git clone --mirror --quiet %s %s' % (quote(url), quote(partial)))
+                os.rename(partial, mirror)
+            # the lock file modification time is the last time the mirror was used
+            os.utime(lock_file.name)
+        with self._used_lock:
+            self._used.add(mirror)
+        return mirror
+
+    def checkout(self, url, dest, ref=None):
+        """Check out the repository into the destination from its mirror.
+
+        The checkout is a local clone of the mirror so it does not need the
+        network, it does not depend on the mirror once created either.
+
+        :param url: url of the git repository
+        :type url: str
+        :param dest: directory to check out the repository into
+        :type dest: str
+        :param ref: branch, tag or commit to check out, the default branch when not set
+        :type ref: str
+        """
+        mirror = self.update(url)
+        with self._locked(mirror, exclusive=False):
+            self._git('git clone --quiet %s%s %s' % ('--no-checkout ' if ref else '', quote(mirror), quote(dest)))
+        if ref:
+            self._git('git -C %s checkout --quiet %s' % (quote(dest), quote(str(ref))))
+        # point the checkout back to the repository, not to the mirror
+        self._git('git -C %s remote set-url origin %s' % (quote(dest), quote(url)))
+
+    @staticmethod
+    def _size(path):
+        size = 0
+        for root, _, files in os.walk(path):
+            for name in files:
+                try:
+                    size += os.lstat(os.path.join(root, name)).st_size
+                except OSError:
+                    continue
+        return size
+
+    def evict(self):
+        """Remove the least recently used mirrors until the cache fits its max size.
+
+        The mirrors used by this cache object and the mirrors locked by other
+        teflo runs are never removed.
+        """
+        if not self.max_size or not os.path.isdir(self.cache_dir):
+            return
+        mirrors = []
+        for name in os.listdir(self.cache_dir):
+            mirror = os.path.join(self.cache_dir, name)
+            if not name.endswith('.git') or not os.path.isdir(mirror):
+                continue
+            lock_path = mirror + '.lock'
+            last_used = os.path.getmtime(lock_path if os.path.exists(lock_path) else mirror)
+            mirrors.append((last_used, mirror, self._size(mirror)))
+
+        total = sum([mirror[2] for mirror in mirrors])
+        for _, mirror, size in sorted(mirrors):
+            if total <= self.max_size:
+                break
+            if mirror in self._used:
+                continue
+            try:
+                with self._locked(mirror, blocking=False):
+                    LOG.debug('Removing the cached remote workspace mirror %s' % mirror)
+                    shutil.rmtree(mirror)
+            except BlockingIOError:
+                continue
+            total -= size
@@ -28,9 +28,12 @@
 import pytest
 import mock
 import os
+import json
+import shlex
 
 import teflo.helpers
-from teflo.ansible_helpers import AnsibleService, AnsibleController
+from teflo.ansible_helpers import AnsibleService, AnsibleController, scoped_inventory, ansible_run_env, \
+    cached_playbook
 from teflo.exceptions import AnsibleServiceError
 
 
@@ -50,6 +53,147 @@ def ansible_service(config, asset1):
     return AnsibleService(config, hosts, all_hosts, ansible_options)
 
 
+MASTER_INVENTORY = """[client:children]
+host_0
+host_1
+host_2
+
+[teflo_hosts:children]
+host_0
+host_1
+host_2
+
+[host_0]
+10.0.0.1
+
+[host_0:vars]
+ansible_user = fedora
+
+[host_1]
+10.0.0.2
+
+[host_1:vars]
+ansible_user = fedora
+
+[host_2]
+10.0.0.3
+
+[teflo_hosts:vars]
+remote_user = cloud-user
+"""
+
+
+def test_scoped_inventory(tmpdir, asset1, asset2):
+    config = dict(INVENTORY_FOLDER=str(tmpdir.mkdir('inventory')), DATA_FOLDER=str(tmpdir),
+                  ANSIBLE_SCOPED_INVENTORY='True')
+    master = tmpdir.join('inventory', 'inventory-xyz')
+    master.write(MASTER_INVENTORY)
+
+    scoped = scoped_inventory(config, [asset1, asset2])
+    assert os.path.dirname(scoped) == os.path.join(str(tmpdir), '.scoped_inventory')
+    with open(scoped) as f:
+        data = f.read()
+    assert '[host_0:vars]' in data and '[host_1]' in data and '[teflo_hosts:vars]' in data
+    assert 'host_2' not in data and '10.0.0.3' not in data
+
+    # the actions against the same hosts share the scoped inventory
+    mtime = os.stat(scoped).st_mtime_ns
+    assert scoped_inventory(config, [asset2, asset1]) == scoped
+    assert os.stat(scoped).st_mtime_ns == mtime
+    assert scoped_inventory(config, [asset1]) != scoped
+
+    # it is written again once the master inventory changed
+    master.write(MASTER_INVENTORY.replace('10.0.0.2', '10.0.0.20'))
+    assert scoped_inventory(config, [asset1, asset2]) == scoped
+    with open(scoped) as f:
+        assert '10.0.0.20' in f.read()
+
+
+def test_scoped_inventory_falls_back_to_inventory_folder(tmpdir, asset1):
+    config = dict(INVENTORY_FOLDER=str(tmpdir.mkdir('inventory')), DATA_FOLDER=str(tmpdir),
+                  ANSIBLE_SCOPED_INVENTORY='True')
+    tmpdir.join('inventory', 'inventory-xyz').write(MASTER_INVENTORY)
+    assert scoped_inventory(config, ['localhost']) == config['INVENTORY_FOLDER']
+    assert scoped_inventory(dict(config, ANSIBLE_SCOPED_INVENTORY='False'), [asset1]) == config['INVENTORY_FOLDER']
+    # scoping is opt-in
+    assert scoped_inventory(dict(INVENTORY_FOLDER=config['INVENTORY_FOLDER'], DATA_FOLDER=str(tmpdir)),
+                            [asset1]) == config['INVENTORY_FOLDER']
+    # a static inventory next to the master inventory
+    tmpdir.join('inventory', 'static').write('[static]\n10.0.0.9\n')
+    assert scoped_inventory(config, [asset1]) == config['INVENTORY_FOLDER']
+
+
+def test_ansible_run_env(tmpdir):
+    config = dict(DATA_FOLDER=str(tmpdir.join('data')))
+    with mock.patch('teflo.ansible_helpers.find_ini_config_file', return_value=None):
+        env = ansible_run_env(config)
+    assert env['ANSIBLE_CACHE_PLUGIN'] == 'jsonfile'
+    assert env['ANSIBLE_CACHE_PLUGIN_CONNECTION'] == os.path.join(config['DATA_FOLDER'], '.ansible_facts')
+    assert env['ANSIBLE_GATHERING'] == 'smart'
+    assert 'ControlPersist=30m' in env['ANSIBLE_SSH_ARGS']
+    assert env['ANSIBLE_PIPELINING'] == 'True'
+
+    # the settings of the ansible.cfg and of the ansible section are kept
+    ans_cfg = tmpdir.join('ansible.cfg')
+    ans_cfg.write('[defaults]\ngathering = explicit\n[ssh_connection]\nssh_args = -o ForwardAgent=yes\n')
+    config['ANSIBLE'] = dict(FACT_CACHING='none', PIPELINING='False')
+    with mock.patch('teflo.ansible_helpers.find_ini_config_file', return_value=str(ans_cfg)):
+        env = ansible_run_env(config)
+    assert set(env.keys()) == {'ANSIBLE_SSH_CONTROL_PATH_DIR'}
+
+
+def test_cached_playbook(tmpdir):
+    config = dict(DATA_FOLDER=str(tmpdir))
+    playbook_str = '- hosts: "{{ hosts }}"\n  tasks:\n    - shell: "{{ xcmd }}"\n      %s\n'
+
+    playbook = cached_playbook(config, 'shell_', playbook_str % 'become: true')
+    assert os.path.dirname(playbook) == os.path.join(str(tmpdir), '.playbooks')
+    assert os.path.basename(playbook).startswith('cbn_execute_shell_')
+    with open(playbook) as f:
+        assert 'become: true' in f.read()
+
+    # the same playbook is rendered once and shared
+    mtime = os.stat(playbook).st_mtime_ns
+    assert cached_playbook(config, 'shell_', playbook_str % 'become: true') == playbook
+    assert os.stat(playbook).st_mtime_ns == mtime
+    assert cached_playbook(config, 'shell_', playbook_str % 'become: false') != playbook
+
+
+def test_cached_playbook_links_vars_folders(tmpdir):
+    config = dict(DATA_FOLDER=str(tmpdir.join('data')))
+    with tmpdir.as_cwd():
+        tmpdir.mkdir('group_vars').join('all.yml').write('var1: 1\n')
+        playbook = cached_playbook(config, 'shell_', '- hosts: "{{ hosts }}"\n  tasks: []\n')
+    group_vars = os.path.join(os.path.dirname(playbook), 'group_vars')
+    assert os.path.realpath(group_vars) == str(tmpdir.join('group_vars'))
+    assert not os.path.lexists(os.path.join(os.path.dirname(playbook), 'host_vars'))
+
+
+def test_run_artifact_playbook_absolute_dest(ansible_service, tmpdir):
+    def run_playbook(self, playbook, logger, extra_vars=None, **kwargs):
+        assert extra_vars['dest'] == str(tmpdir.join('artifacts'))
+        return 0, ''
+
+    with tmpdir.as_cwd(), mock.patch.object(AnsibleController, 'run_playbook', run_playbook):
+        assert ansible_service.run_artifact_playbook('artifacts', ['/tmp/a.log']) == (0, '')
+
+
+def test_resolve_script(tmpdir):
+    with tmpdir.as_cwd():
+        tmpdir.mkdir('scripts').join('hello.sh').write('echo hello')
+        assert AnsibleService.resolve_script('scripts/hello.sh X=1') == '%s X=1' % tmpdir.join('scripts', 'hello.sh')
+        assert AnsibleService.resolve_script('/opt/hello.sh') == '/opt/hello.sh'
+        assert AnsibleService.resolve_script('missing.sh') == 'missing.sh'
+
+        # the path is split from its arguments like a shell does, the arguments are kept as they are
+        tmpdir.mkdir('my scripts').join('hello.sh').write('echo hello')
+        resolved = AnsibleService.resolve_script('"my scripts/hello.sh"  --name "a b" $HOME')
+        assert resolved == "'%s' --name \"a b\" $HOME" % tmpdir.join('my scripts', 'hello.sh')
+        assert shlex.split(resolved) == [str(tmpdir.join('my scripts', 'hello.sh')), '--name', 'a b', '$HOME']
+        tmpdir.mkdir('files').join('run.sh').write('echo run')
+        assert AnsibleService.resolve_script('run.sh -v') == '%s -v' % tmpdir.join('files', 'run.sh')
+
+
 class TestAnsibleService(object):
     @staticmethod
     def run_playbook(*args, **kwargs):
@@ -112,6 +256,94 @@ class TestAnsibleService(object):
         script_results = ansible_service.run_script_playbook(script)
         assert isinstance(script_results, dict)
 
+    @staticmethod
+    def test_run_batch_playbook(ansible_service):
+        setattr(ansible_service, 'uid', 'xyz')
+        shells = [{'command': 'echo hello'}, {'command': 'exit 3', 'chdir': '/tmp'}, {'command': 'echo skipped'}]
+
+        def run_playbook(self, playbook, logger, extra_vars=None, **kwargs):
+            with open(playbook) as f:
+                playbook_str = f.read()
+            assert 'batch_2' in playbook_str
+            assert 'chdir: /tmp' in playbook_str
+            assert "not in xbatch_rcs[1]" in playbook_str
+            assert extra_vars['xbatch'] == ['echo hello', 'exit 3', 'echo skipped']
+            assert extra_vars['xbatch_rcs'] == [[0], [0, 3], []]
+            with open('batch-results-xyz.json', 'w') as f:
+                json.dump([[{'index': 0, 'host_name': 'host1', 'rc': 0, 'err': ''},
+                            {'index': 1, 'host_name': 'host1', 'rc': 3, 'err': 'failed'}]], f)
+            return 0, ''
+
+        with mock.patch.object(AnsibleController, 'run_playbook', run_playbook):
+            results = ansible_service.run_batch_playbook('shell', shells, [[0], [0, 3], None])
+        assert results == [{'host': 'host1', 'rc': 0, 'err': ''}, {'host': 'host1', 'rc': 3, 'err': 'failed'}, {}]
+        assert not os.path.exists('batch-results-xyz.json')
+
+    @staticmethod
+    def test_run_shell_playbook_with_runner_events(ansible_service):
+        setattr(ansible_service, 'uid', 'runner')
+        ansible_service.ans_controller.backend = 'runner'
+
+        def run_playbook(self, playbook, logger, extra_vars=None, event_handler=None, **kwargs):
+            assert 'xresults_dir' not in extra_vars
+            event_handler({'event': 'runner_on_ok', 'event_data': {'task': 'gather facts', 'host': 'host1'}})
+            event_handler({'event': 'runner_on_failed', 'event_data': {
+                'task': 'shell command', 'host': 'host1', 'res': {'rc': 2, 'stderr': 'failed'}}})
+            return 2, ''
+
+        with mock.patch.object(AnsibleController, 'run_playbook', run_playbook):
+            results = ansible_service.run_shell_playbook({'command': 'exit 2'})
+        assert results == {'host': 'host1', 'rc': 2, 'err': 'failed'}
+        assert not os.path.exists('shell-results-runner.json')
+
+    @staticmethod
+    @pytest.mark.parametrize('backend', ['subprocess', 'runner'])
+    def test_run_results_playbook_host_names(ansible_service, backend):
+        """verifies both backends name the hosts of the results after their hostname fact"""
+        setattr(ansible_service, 'uid', backend)
+        ansible_service.ans_controller.backend = backend
+
+        def run_playbook(self, playbook, logger, extra_vars=None, event_handler=None, **kwargs):
+            if event_handler is None:
+                with open(os.path.join(extra_vars['xresults_dir'], 'batch-results-subprocess.json'), 'w') as f:
+                    json.dump([[{'index': 0, 'host_name': 'node1', 'rc': 0, 'err': ''}],
+                               [{'index': 0, 'host_name': 'node2', 'rc': 1, 'err': 'failed'}]], f)
+                return 0, ''
+            for host, name in [('host1', 'node1'), ('host2', 'node2')]:
+                event_handler({'event': 'runner_on_ok', 'event_data': {
+                    'task': 'Gathering Facts', 'host': host, 'res': {'ansible_facts': {'ansible_hostname': name}}}})
+            event_handler({'event': 'runner_on_ok', 'event_data': {
+                'task': 'batched shell 0', 'host': 'host1', 'res': {'rc': 0, 'stderr': ''}}})
+            event_handler({'event': 'runner_on_failed', 'event_data': {
+                'task': 'batched shell 0', 'host': 'host2', 'res': {'rc': 1, 'stderr': 'failed'}}})
+            return 0, ''
+
+        with mock.patch.object(AnsibleController, 'run_playbook', run_playbook):
+            host_results = ansible_service.run_results_playbook('playbook.yml', dict(), 'batch',
+                                                                {'batched shell 0': 0})
+        assert host_results == [[{'index': 0, 'host_name': 'node1', 'rc': 0, 'err': ''}],
+                                [{'index': 0, 'host_name': 'node2', 'rc': 1, 'err': 'failed'}]]
+
+    @staticmethod
+    def test_aggregate_batch_results_across_hosts():
+        host_results = [
+            [{'index': 0, 'host_name': 'host1', 'rc': 1, 'err': 'failed'}],
+            [{'index': 0, 'host_name': 'host2', 'rc': 0, 'err': ''}]
+        ]
+        # the failure of the first host is not hidden by the second one
+        results = AnsibleService.aggregate_batch_results(2, [[0], [0]], host_results)
+        assert results == [{'host': 'host1', 'rc': 1, 'err': 'failed'}, {}]
+
+        # a host which stopped fails the entries it did not run
+        host_results = [
+            [{'index': 0, 'host_name': 'host1', 'rc': 0, 'err': ''}],
+            [{'index': 0, 'host_name': 'host2', 'rc': 0, 'err': ''},
+             {'index': 1, 'host_name': 'host2', 'rc': 0, 'err': ''}]
+        ]
+        results = AnsibleService.aggregate_batch_results(2, [[0], [0]], host_results)
+        assert results[0] == {'host': 'host1', 'rc': 0, 'err': ''}
+        assert results[1]['host'] == 'host1' and results[1]['rc'] == -1
+
     @staticmethod
     def test_build_ans_extra_args_with_script(ansible_service, script):
         res = ansible_service.build_ans_extra_args(script)
@@ -176,7 +408,8 @@ class TestAnsibleService(object):
     @staticmethod
     @mock.patch("teflo.ansible_helpers.file_mgmt")
     @mock.patch("teflo.ansible_helpers.exec_local_cmd_pipe")
-    def test_download_roles_valid(exec_local_cmd_pipe, file_mgmt, ansible_service):
+    def test_download_roles_valid(exec_local_cmd_pipe, file_mgmt, ansible_service, tmpdir):
+        ansible_service.config['ANSIBLE_GALAXY_CACHE_DIR'] = str(tmpdir)
         exec_local_cmd_pipe.return_value = mock.Mock()
         exec_local_cmd_pipe.return_value = 0, "pass"
         file_mgmt.return_value = mock.Mock()
@@ -192,9 +425,80 @@ class TestAnsibleService(object):
         }
         assert ansible_service.download_roles() is None
 
+    @staticmethod
+    def test_download_roles_cached(ansible_service, tmpdir):
+        roles_path = tmpdir.mkdir('roles')
+        ansible_service.config['ANSIBLE_GALAXY_CACHE_DIR'] = str(tmpdir.join('cache'))
+        ansible_service.galaxy_options = {"roles": ["role-123"]}
+
+        def install(cmd, logger, timeout=None):
+            roles_path.mkdir('role-123')
+            return 0, 'pass'
+
+        with mock.patch('teflo.ansible_helpers.ans_constants.DEFAULT_ROLES_PATH', [str(roles_path)]), \
+                mock.patch('teflo.ansible_helpers.exec_local_cmd_pipe', side_effect=install) as exec_local_cmd_pipe:
+            ansible_service.download_roles()
+            ansible_service.download_roles()
+            assert exec_local_cmd_pipe.call_count == 1
+
+            # the role is installed again once removed
+            roles_path.join('role-123').remove()
+            ansible_service.download_roles()
+            assert exec_local_cmd_pipe.call_count == 2
+
     @staticmethod
     def test_download_roles_invalid(ansible_service):
         with pytest.raises(AnsibleServiceError):
             ansible_service.download_roles = mock.Mock()
             ansible_service.download_roles.side_effect = AnsibleServiceError("Error")
             ansible_service.download_roles()
+
+
+class TestAnsibleController(object):
+
+    @staticmethod
+    def test_set_inventory_parsed_once(tmpdir):
+        inventory = tmpdir.join('inventory-test')
+        inventory.write('[host01]\n10.0.0.1\n')
+        first = AnsibleController(str(tmpdir))
+        first.set_inventory()
+        second = AnsibleController(str(tmpdir))
+        second.set_inventory()
+        assert second.inventory is first.inventory
+        assert 'host01' in second.inventory.groups
+
+        inventory.write('[host01]\n10.0.0.1\n[host02]\n10.0.0.2\n')
+        os.utime(str(inventory), ns=(0, os.stat(str(inventory)).st_mtime_ns + 1000))
+        second.set_inventory()
+        assert second.inventory is not first.inventory
+        assert 'host02' in second.inventory.groups
+
+
+    @staticmethod
+    def test_invalid_backend(tmpdir):
+        with pytest.raises(AnsibleServiceError) as ex:
+            AnsibleController(str(tmpdir), backend='bogus')
+        assert 'Ansible backend bogus is not supported' in ex.value.args[0]
+
+    @staticmethod
+    def test_run_playbook_with_runner(tmpdir):
+        ansible_runner = pytest.importorskip('ansible_runner')
+        controller = AnsibleController(str(tmpdir), backend='runner')
+        logger = mock.MagicMock()
+
+        def run(**kwargs):
+            kwargs['event_handler']({'event': 'runner_on_failed', 'stdout': 'fatal: [host01]: FAILED!\r'})
+            return mock.MagicMock(rc=2)
+
+        with mock.patch.object(ansible_runner, 'run', side_effect=run) as mock_run:
+            results = controller.run_playbook_with_runner('site.yml', logger, extra_vars={'hosts': 'host01',
+                                                                                           'file': ['vars.yml']},
+                                                          run_options={'become': True}, ans_verbosity='vv')
+        assert results == (2, 'fatal: [host01]: FAILED!')
+        kwargs = mock_run.call_args[1]
+        assert kwargs['extravars'] == {'hosts': 'host01'}
+        assert kwargs['cmdline'] == '-e @vars.yml --become'
+        assert kwargs['verbosity'] == 2
+        assert kwargs['inventory'] == str(tmpdir)
+        assert not os.path.exists(kwargs['private_data_dir'])
+        logger.info.assert_called_with('fatal: [host01]: FAILED!')
@@ -30,11 +30,21 @@ import pytest
 import yaml
 import json
 import shutil
+import subprocess
+import sys
 from teflo import Teflo
 from teflo.cli import print_header, teflo
 from click.testing import CliRunner
 from teflo.exceptions import TefloError
 
+# documented in CONTRIBUTE.rst, cumulative time in microseconds to import teflo.cli
+CLI_IMPORT_TIME_BUDGET = 500000
+
+# dependencies that must only be imported by the functions using them
+CLI_LAZY_IMPORTS = ['ansible', 'paramiko', 'ssh', 'pykwalify', 'jinja2', 'requests', 'pkg_resources',
+                    'cachetclient', 'libcloud', 'distutils']
+
+
 @pytest.fixture(scope='class')
 def runner():
     return CliRunner()
@@ -465,3 +475,18 @@ class TestCli(object):
         )
         assert results.exit_code == 0
         shutil.rmtree('init_project')
+
+    @staticmethod
+    def test_cli_import_time_budget():
+        """verifies importing the cli stays within its import time budget and defers the heavy dependencies"""
+        proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import teflo.cli'],
+                              capture_output=True, text=True, check=True)
+        imports = dict()
+        for line in proc.stderr.splitlines():
+            if not line.startswith('import time:') or 'cumulative' in line:
+                continue
+            _, cumulative, name = line.split('|')
+            imports[name.strip()] = int(cumulative)
+
+        assert [name for name in imports if name.split('.')[0] in CLI_LAZY_IMPORTS] == []
+        assert imports['teflo.cli'] < CLI_IMPORT_TIME_BUDGET
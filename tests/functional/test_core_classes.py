@@ -772,6 +772,35 @@ class TestInventory(object):
         cleanup_master
 
 
+    @staticmethod
+    def test_create_inventory_incremental_shared_vars(inventory2: Inventory, inv_host_2, cleanup_master):
+        os.makedirs('/tmp/ws', exist_ok=True)
+        with open('/tmp/ws/ansible.cfg', 'w') as f:
+            f.write('[defaults]\nremote_user = cloud-user\nhost_key_checking = False\n')
+        try:
+            inventory2.create_inventory(all_hosts=[inv_host_2])
+            inv_host_3 = Asset(name='host03', config=inv_host_2.config,
+                               parameters=dict(ip_address='2.4.5.6', groups='client',
+                                               ansible_params=dict(remote_user='fedora')))
+            with mock.patch.object(inventory2, '_read_ansible_cfg_defaults',
+                                   wraps=inventory2._read_ansible_cfg_defaults) as mock_read:
+                inventory2.create_inventory(all_hosts=[inv_host_3])
+            # the ansible.cfg was parsed by the first call only
+            mock_read.assert_not_called()
+        finally:
+            os.remove('/tmp/ws/ansible.cfg')
+        config = configparser.ConfigParser(allow_no_value=True)
+        config.read('/tmp/.results/inventory/inventory-xyz')
+        # the hosts of both calls are in the inventory
+        assert config.has_section('ans_gv') and config.has_section('host03')
+        # the shared vars are set once on the group of all the hosts
+        assert set(config['teflo_hosts:children'].keys()) == {'ans_gv', 'host03'}
+        assert config['teflo_hosts:vars']['remote_user'] == 'cloud-user'
+        assert 'host_key_checking' not in config['ans_gv:vars']
+        # unless a host sets a var of the same name
+        assert config['host03:vars']['remote_user'] == 'cloud-user'
+        assert [f for f in os.listdir('/tmp/.results/inventory') if f.endswith('.tmp')] == []
+
     @staticmethod
     def test_create_inventory_inv_err(inventory: Inventory, inv_host, cleanup_master):
         inventory.create_inventory(all_hosts=[inv_host])
@@ -29,7 +29,10 @@ from teflo.resources import scenario
 import yaml
 import pytest
 import os
+import json
+import time
 import mock
+from concurrent.futures import ThreadPoolExecutor
 from teflo import Teflo
 from teflo.core import ImporterPlugin
 from teflo.constants import TASKLIST
@@ -40,11 +43,17 @@ from teflo._compat import ConfigParser
 from teflo.utils.config import Config
 from teflo.exceptions import TefloError, HelpersError
 from teflo.provisioners.ext import BeakerClientProvisionerPlugin
+from teflo.utils.parse_cache import ParseCache
+from teflo.utils.schema_cache import CompiledSchema
+from teflo.utils.workspace_cache import RemoteWorkspaceCache
+from pykwalify.errors import SchemaError
 from teflo.helpers import DataInjector, template_render, validate_render_scenario, set_task_class_concurrency, \
     mask_credentials_password, sort_tasklist, find_artifacts_on_disk, \
     get_default_provisioner_plugin, get_ans_verbosity, schema_validator, filter_resources_labels,\
     create_individual_testrun_results, create_aggregate_testrun_results, filter_notifications_to_skip, \
-    check_for_var_file
+    check_for_var_file, PluginRegistry, get_core_tasks_classes, get_core_tasks_registry, ssh_retry, \
+    _import_ssh_private_key, ssh_readiness_cache, SshReadinessCache, exec_local_cmd_pipe, preprocyaml_jinja, \
+    schema_validator_batch, validate_resource_schemas
 
 
 @pytest.fixture(scope='class')
@@ -296,6 +305,120 @@ def test_validate_render_scenario_empty_include(task_concurrency_config):
         0]
 
 
+def test_validate_render_scenario_renders_each_sdf_once(config):
+    config['WORKSPACE'] = '../assets/scenario_graph_basic_test/'
+    with mock.patch('teflo.helpers.template_render', wraps=template_render) as mock_render, \
+            mock.patch.object(Config, 'load') as mock_load:
+        scenario_graph = validate_render_scenario('../assets/scenario_graph_basic_test/sdf0.yml', config)
+    rendered = [os.path.basename(call[0][0]) for call in mock_render.call_args_list]
+    assert len(rendered) == len(scenario_graph)
+    assert sorted(rendered) == sorted(set(rendered))
+    assert mock_load.call_count == 1
+    assert [sc.path for sc in scenario_graph.root.child_scenarios] == ['sdf1.yml', 'sdf7.yml', 'sdf2.yml']
+    for sc in scenario_graph:
+        assert sc.config['WORKSPACE'] == config['WORKSPACE']
+        if sc is not scenario_graph.root:
+            assert sc.config is not sc.my_parent.config
+
+
+def test_preprocyaml_jinja_renders_in_dependency_order():
+    temp_data = {'path': '{{ base }}/{{ name | upper }}', 'name': '{{ prefix }}-host', 'prefix': 'web',
+                 'base': '/opt', 'hosts': ['{{ name }}', {'dir': '{{ path }}'}], 'count': 2, 'port': '{{ count }}0',
+                 'literal': '{{ undefined.attr }}x', 'same': '{{ same }}'}
+    assert preprocyaml_jinja(temp_data) == {'path': '/opt/WEB-HOST', 'name': 'web-host', 'prefix': 'web', 'base': '/opt',
+                                            'hosts': ['web-host', {'dir': '/opt/WEB-HOST'}], 'count': 2,
+                                            'port': '20', 'literal': 'x', 'same': '{{ same }}'}
+
+
+def test_preprocyaml_jinja_circular_reference():
+    with pytest.raises(TefloError) as ex:
+        preprocyaml_jinja({'a': '{{ c }}', 'b': 'x{{ a }}', 'c': '{{ b }}', 'd': 'd'})
+    assert 'The variables have a circular reference' in ex.value.args[0]
+
+
+def test_parse_cache_parses_changed_files_only(tmpdir):
+    var_file = tmpdir.join('vars.yml')
+    var_file.write('name: one\nnested:\n  key: "{{ name }}"\n')
+    cache = ParseCache(str(tmpdir.join('cache')))
+    data = cache.load(str(var_file))
+    assert data == {'name': 'one', 'nested': {'key': '{{ name }}'}}
+
+    with mock.patch('teflo.utils.parse_cache.file_mgmt') as mock_file_mgmt:
+        cached = ParseCache(str(tmpdir.join('cache'))).load(str(var_file))
+    mock_file_mgmt.assert_not_called()
+    assert cached == data
+    assert type(cached['nested']) is type(data['nested'])
+
+    var_file.write('name: two\n')
+    assert cache.load(str(var_file)) == {'name': 'two'}
+
+
+def test_parse_cache_rebuilds_the_parsed_types(tmpdir):
+    var_file = tmpdir.join('vars.yml')
+    var_file.write('version: 1.50\nmask: 0x1f\nscript: |\n  echo one\nitems:\n- a\n- 2\nflag: true\nnone:\n')
+    data = ParseCache(str(tmpdir.join('cache'))).load(str(var_file))
+    cached = ParseCache(str(tmpdir.join('cache'))).load(str(var_file))
+    assert cached == data
+    assert [type(value) for value in cached.values()] == [type(value) for value in data.values()]
+    assert type(cached['items']) is type(data['items']) and vars(cached['version']) == vars(data['version'])
+    # the cache only holds data, nothing is unpickled
+    with open(ParseCache(str(tmpdir.join('cache')))._cache_path(str(var_file))) as f:
+        assert json.load(f)['data']['map'][0] == ['version', {'scalar': 'ScalarFloat', 'value': 1.5,
+                                                              'attrs': vars(data['version'])}]
+
+
+def test_parse_cache_untrusted_cache(tmpdir):
+    var_file = tmpdir.join('vars.yml')
+    var_file.write('name: one\n')
+    cache_dir = tmpdir.join('cache')
+    cache = ParseCache(str(cache_dir))
+    cache.load(str(var_file))
+    assert oct(cache_dir.stat().mode & 0o777) == oct(0o700)
+
+    # an entry writable by others is parsed again
+    os.chmod(cache._cache_path(str(var_file)), 0o666)
+    with mock.patch('teflo.utils.parse_cache.file_mgmt', return_value={'name': 'parsed'}):
+        assert ParseCache(str(cache_dir)).load(str(var_file)) == {'name': 'parsed'}
+
+    # a directory writable by others is not used
+    os.chmod(str(cache_dir), 0o777)
+    with mock.patch('teflo.utils.parse_cache.file_mgmt', return_value={'name': 'parsed'}) as mock_file_mgmt, \
+            mock.patch('teflo.utils.parse_cache.tempfile.mkstemp') as mock_mkstemp:
+        assert ParseCache(str(cache_dir)).load(str(var_file)) == {'name': 'parsed'}
+    mock_file_mgmt.assert_called_once()
+    mock_mkstemp.assert_not_called()
+
+
+def test_remote_workspace_cache_checkout(tmpdir):
+    repo = tmpdir.mkdir('repo')
+    git = 'git -C %s -c user.name=teflo -c user.email=teflo@localhost ' % repo
+    os.system('git init -q %s && echo v1 > %s/sdf.yml && %s add . && %s commit -q -m v1 && %s tag v1'
+              % (repo, repo, git, git, git))
+    cache = RemoteWorkspaceCache(str(tmpdir.join('cache')), max_size=1)
+    cache.checkout(str(repo), str(tmpdir.join('ws1')))
+    assert tmpdir.join('ws1', 'sdf.yml').read() == 'v1\n'
+    assert os.path.isdir(cache.mirror_path(str(repo)))
+
+    os.system('echo v2 > %s/sdf.yml && %s commit -q -am v2' % (repo, git))
+    cache.checkout(str(repo), str(tmpdir.join('ws2')))
+    cache.checkout(str(repo), str(tmpdir.join('ws3')), ref='v1')
+    assert tmpdir.join('ws2', 'sdf.yml').read() == 'v2\n'
+    assert tmpdir.join('ws3', 'sdf.yml').read() == 'v1\n'
+    assert os.popen('git -C %s remote get-url origin' % tmpdir.join('ws3')).read().strip() == str(repo)
+
+    # mirrors in use are kept, the others are evicted once the cache is over its max size
+    with mock.patch.object(RemoteWorkspaceCache, '_size', return_value=2 * 1024 * 1024):
+        cache.evict()
+        assert os.path.isdir(cache.mirror_path(str(repo)))
+        RemoteWorkspaceCache(str(tmpdir.join('cache')), max_size=1).evict()
+    assert not os.path.isdir(cache.mirror_path(str(repo)))
+    assert tmpdir.join('ws3', 'sdf.yml').read() == 'v1\n'
+
+    with pytest.raises(TefloError) as ex:
+        cache.checkout(str(tmpdir.join('missing')), str(tmpdir.join('ws4')))
+    assert 'Remote remote_workspaces download failed!!' in ex.value.args[0]
+
+
 def test_set_task_concurrency_provision_is_false(host):
     for task in host.get_tasks():
         if task['task'].__task_name__ == 'provision':
@@ -446,6 +569,35 @@ def test_get_default_provisioner_plugin_method(mock_method):
     assert get_default_provisioner_plugin() == BeakerClientProvisionerPlugin
 
 
+def test_get_core_tasks_classes_is_cached():
+    assert get_core_tasks_classes() is get_core_tasks_classes()
+    assert isinstance(get_core_tasks_classes(), frozenset)
+    registry = get_core_tasks_registry()
+    assert sorted(registry) == sorted(TASKLIST + ['notify'])
+    assert set(registry.values()) == get_core_tasks_classes()
+    with pytest.raises(TypeError):
+        registry['provision'] = None
+
+
+def test_plugin_registry_loads_only_requested_plugin():
+    registry = PluginRegistry()
+    provider = registry.find_plugin('provider_plugins', lambda item: item.__provider_name__ == 'beaker', 'beaker')
+    assert provider.__provider_name__ == 'beaker'
+    assert list(registry._plugins['provider_plugins']) == ['beaker_provider']
+    assert registry.find_plugin('provider_plugins', lambda item: item.__provider_name__ == 'dummy', 'dummy') is None
+    assert len(registry._plugins['provider_plugins']) == len(registry.entry_points('provider_plugins'))
+
+
+def test_plugin_registry_refresh():
+    registry = PluginRegistry()
+    assert 'ansible' in registry.get_plugins('orchestrator_plugins')
+    registry.refresh('orchestrator_plugins')
+    assert 'orchestrator_plugins' not in registry._plugins
+    registry.get_plugins('orchestrator_plugins')
+    registry.refresh()
+    assert registry._entry_points == {} and registry._plugins == {}
+
+
 def test_ansible_verbosity_1(config):
     """This test verifies the ansible verbosity set using teflo.cfg is valid. For this test
     teflo.cfg under ../assets/teflo.cfg is used and has ansible_verbosity set as 'v'"""
@@ -515,6 +667,91 @@ def test_schema_validator_failure():
         schema_validator(schema_data=params, schema_files=[os.path.abspath('../assets/schemas/schema_test.yml')])
 
 
+def test_schema_validator_compiles_schema_once():
+    schema_file = os.path.abspath('../assets/schemas/schema_test.yml')
+    compiled = CompiledSchema.get([schema_file])
+    with mock.patch('teflo.utils.schema_cache.Rule') as mock_rule:
+        schema_validator(schema_data=dict(key1='val1', key2=['val2']), schema_files=[schema_file])
+    mock_rule.assert_not_called()
+    assert CompiledSchema.get([schema_file]) is compiled
+
+
+def test_schema_validator_batch():
+    schema_file = os.path.abspath('../assets/schemas/schema_test.yml')
+    schema_validator_batch([dict(key1='val1', key2=['val2']), dict(key1='val3', key2=[])], schema_files=[schema_file])
+    with pytest.raises(SchemaError) as ex:
+        schema_validator_batch([dict(name='res1', key1=1), dict(key1='val1'), dict(name='res3', key1=2)],
+                               schema_files=[schema_file])
+    assert 'Schema validation failed for 2 of 3 resources' in ex.value.msg
+    assert 'res1:' in ex.value.msg and 'res3:' in ex.value.msg
+
+
+def test_validate_resource_schemas():
+    from teflo.core import TefloPlugin
+
+    class SchemaPlugin(TefloPlugin):
+        __schema_file_path__ = os.path.abspath('../assets/schemas/schema_test.yml')
+
+    class Resource(object):
+        orchestrator = SchemaPlugin
+
+        def __init__(self, name, key1):
+            self.name = name
+            self.key1 = key1
+
+    resources = [Resource('valid', 'val1'), Resource('invalid', 1)]
+    with mock.patch('teflo.helpers.schema_validator_batch', wraps=schema_validator_batch) as mock_batch:
+        validate_resource_schemas(resources)
+    # a single batch for the resources of the plugin
+    assert mock_batch.call_count == 1 and len(mock_batch.call_args[0][0]) == 2
+
+    # the valid resource is not validated again, the invalid one still fails
+    with mock.patch('teflo.utils.schema_cache.CompiledSchemaCore.validate') as mock_validate:
+        schema_validator(SchemaPlugin.build_profile(resources[0]), schema_files=[SchemaPlugin.__schema_file_path__])
+    mock_validate.assert_not_called()
+    with pytest.raises(SchemaError):
+        schema_validator(SchemaPlugin.build_profile(resources[1]), schema_files=[SchemaPlugin.__schema_file_path__])
+
+
+def test_schema_validator_partial_schemas_per_thread(tmpdir):
+    import pykwalify
+    schema_int = tmpdir.join('schema_int.yml')
+    schema_int.write('schema;item:\n  type: int\ntype: map\nmapping:\n  key1:\n    include: item\n')
+    schema_str = tmpdir.join('schema_str.yml')
+    schema_str.write('schema;item:\n  type: str\ntype: map\nmapping:\n  key1:\n    include: item\n')
+
+    def validate(index):
+        if index % 2:
+            schema_validator(schema_data=dict(key1=1), schema_files=[str(schema_int)])
+        else:
+            schema_validator(schema_data=dict(key1='val1'), schema_files=[str(schema_str)])
+
+    # the validations against schemas sharing a partial schema name do not see each other's
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        list(executor.map(validate, range(40)))
+    # the pykwalify global partial schemas are neither replaced nor written to
+    assert type(pykwalify.partial_schemas) is dict and 'item' not in pykwalify.partial_schemas
+    with pytest.raises(SchemaError):
+        schema_validator(schema_data=dict(key1='val1'), schema_files=[str(schema_int)])
+
+
+def test_schema_validator_partial_schemas_includes(tmpdir):
+    schema_file = tmpdir.join('schema_include.yml')
+    schema_file.write('schema;item:\n  type: str\n  required: True\ntype: map\nmapping:\n  key1:\n    include: item\n'
+                      '  key2:\n    type: seq\n    sequence:\n      - include: item\n')
+    schema_validator(schema_data=dict(key1='val1', key2=['val2']), schema_files=[str(schema_file)])
+    # the included rules apply to the mapping keys and the sequence items
+    with pytest.raises(SchemaError) as ex:
+        schema_validator(schema_data=dict(key2=[1]), schema_files=[str(schema_file)])
+    assert "Cannot find required key 'key1'" in ex.value.msg and '/key2/0' in ex.value.msg
+
+    missing_file = tmpdir.join('schema_missing.yml')
+    missing_file.write('schema;item:\n  type: str\ntype: map\nmapping:\n  key1:\n    include: other\n')
+    with pytest.raises(SchemaError) as ex:
+        schema_validator(schema_data=dict(key1='val1'), schema_files=[str(missing_file)])
+    assert "Cannot find partial schema with name 'other'. Existing partial schemas: 'item'" in ex.value.msg
+
+
 def test_filter_resources_01(teflo1, asset2, asset3):
     """ this test verifies only resources which match the labels provided are picked"""
     res_list = [asset2, asset3]
@@ -652,3 +889,109 @@ def test_template_render(template_render_config):
     rendered_text = template_render('../assets/test_template_render.yml', {})
     result = yaml.safe_load(rendered_text)
     assert len(result["include"]) == 4
+
+
+def test_template_render_reuses_compiled_template(tmpdir):
+    template = tmpdir.join('template.jinja')
+    template.write('hello {{ name }}')
+    assert template_render(str(template), {'name': 'world'}) == 'hello world'
+    with mock.patch('jinja2.Environment.compile') as mock_compile:
+        assert template_render(str(template), {'name': 'teflo'}) == 'hello teflo'
+    mock_compile.assert_not_called()
+
+    template.write('bye {{ name }}')
+    os.utime(str(template), ns=(0, os.stat(str(template)).st_mtime_ns + 1000000000))
+    assert template_render(str(template), {'name': 'teflo'}) == 'bye teflo'
+
+
+@pytest.fixture
+def ssh_controller(tmpdir):
+    """controller with a two host groups inventory sharing the same ssh key"""
+    key_file = tmpdir.join('key.pem')
+    key_file.write('key')
+    groups = dict()
+    for name, address in [('host01', '10.0.0.1'), ('host02', '10.0.0.2')]:
+        groups[name] = mock.MagicMock(child_groups=[], hosts=[mock.MagicMock(address=address)],
+                                      vars=dict(ansible_user='root', ansible_ssh_private_key_file=str(key_file)))
+    controller = mock.MagicMock()
+    controller.inventory.groups = groups
+    _import_ssh_private_key.cache_clear()
+    ssh_readiness_cache.invalidate()
+    return controller
+
+
+@mock.patch('teflo.helpers.socket.socket')
+@mock.patch('ssh.key.import_privkey_file')
+@mock.patch('ssh.session.Session')
+def test_ssh_retry_checks_all_host_groups(mock_session, mock_key, mock_socket, ssh_controller):
+    run = ssh_retry(lambda *args, **kwargs: 'done')
+    assert run(ssh_controller, extra_vars=dict(hosts='host01, host02')) == 'done'
+    assert mock_session.return_value.connect.call_count == 2
+    # the key shared by the host groups is only parsed once
+    assert mock_key.call_count == 1
+
+
+@mock.patch('teflo.helpers.random.uniform', return_value=0)
+@mock.patch('teflo.helpers.socket.socket')
+@mock.patch('ssh.key.import_privkey_file')
+@mock.patch('ssh.session.Session')
+def test_ssh_retry_unreachable_host_group(mock_session, mock_key, mock_socket, mock_uniform, ssh_controller):
+    from ssh.exceptions import ConnectFailed
+
+    def connect(address):
+        if address[0] == '10.0.0.2':
+            raise ConnectFailed()
+
+    mock_socket.return_value.connect.side_effect = connect
+    run = ssh_retry(lambda *args, **kwargs: 'done')
+    with pytest.raises(HelpersError):
+        run(ssh_controller, extra_vars=dict(hosts='host01, host02'))
+    assert mock_socket.return_value.close.called
+
+
+@mock.patch('teflo.helpers.socket.socket')
+@mock.patch('ssh.key.import_privkey_file')
+@mock.patch('ssh.session.Session')
+def test_ssh_retry_skips_recently_reachable_hosts(mock_session, mock_key, mock_socket, ssh_controller):
+    results = [(0, ''), (4, ''), (0, '')]
+    run = ssh_retry(lambda *args, **kwargs: results.pop(0))
+    run(ssh_controller, extra_vars=dict(hosts='host01, host02'))
+    run(ssh_controller, extra_vars=dict(hosts='host01, host02'))
+    assert mock_session.return_value.connect.call_count == 2
+    # the hosts were unreachable for ansible, so they are checked again
+    run(ssh_controller, extra_vars=dict(hosts='host01, host02'))
+    assert mock_session.return_value.connect.call_count == 4
+
+
+def test_ssh_readiness_cache_ttl():
+    cache = SshReadinessCache(ttl=60)
+    key = ('10.0.0.1', 22, 'root', 'key.pem')
+    assert not cache.is_ready(key)
+    cache.mark_ready(key)
+    assert cache.is_ready(key)
+    with mock.patch('teflo.helpers.time.monotonic', return_value=time.monotonic() + 61):
+        assert not cache.is_ready(key)
+    cache.mark_ready(key)
+    cache.invalidate(key)
+    assert not cache.is_ready(key)
+
+
+
+def test_exec_local_cmd_pipe_reads_stdout_and_stderr():
+    logger = mock.MagicMock()
+    # more stderr than a pipe buffer holds, written before any stdout
+    cmd = 'python -c "import sys; sys.stderr.write(\'e\' * 200000); print(\'line1\'); print(\'line2\'); sys.exit(3)"'
+    rc, error = exec_local_cmd_pipe(cmd, logger)
+    assert rc == 3
+    assert error == 'e' * 200000
+    logger.info.assert_has_calls([mock.call('line1'), mock.call('line2')])
+
+
+def test_exec_local_cmd_pipe_timeout():
+    logger = mock.MagicMock()
+    start = time.monotonic()
+    rc, error = exec_local_cmd_pipe('echo started; sleep 30', logger, timeout=1)
+    assert time.monotonic() - start < 10
+    assert rc != 0
+    assert 'Command timed out after 1 seconds' in error
+    logger.info.assert_called_with('started')
@@ -31,11 +31,50 @@ import pytest
 from teflo.exceptions import TefloError
 from teflo.tasks import CleanupTask, ExecuteTask, ProvisionTask, \
     OrchestrateTask, ReportTask, ValidateTask, NotificationTask
-from teflo.utils.pipeline import PipelineBuilder, NotificationPipelineBuilder, PipelineFactory
+from teflo.utils.fork_safety import fork_safe_lock
+from teflo.utils.pipeline import PipelineBuilder, NotificationPipelineBuilder, PipelineFactory, \
+    PipelineExecutorFactory, BlasterPipelineExecutor, ThreadPipelineExecutor
+from teflo.core import TefloTask
+from teflo.constants import DEFAULT_TASK_CONCURRENCY
+import blaster
+import mock
+import threading
 from teflo._compat import string_types
 from teflo.resources import Asset
 
 
+class MarkTask(TefloTask):
+    """Task marking its resource, failing for the resources named fail."""
+    __task_name__ = 'validate'
+
+    def __init__(self, resource, **kwargs):
+        super(MarkTask, self).__init__(**kwargs)
+        self.resource = resource
+
+    def run(self):
+        if self.resource.name == 'fail':
+            raise TefloError('failed to validate')
+        self.resource.marked = True
+        return self.resource.name
+
+
+class LockTask(MarkTask):
+    """Task failing when the fork safe lock of its resource is held in the worker."""
+
+    def run(self):
+        if not self.resource.lock.acquire(timeout=5):
+            raise TefloError('the lock is held')
+        self.resource.lock.release()
+        return self.resource.name
+
+
+class MarkResource(object):
+    def __init__(self, name, hosts=None):
+        self.name = name
+        self.marked = False
+        self.hosts = hosts or []
+
+
 @pytest.fixture(scope='class')
 def pipe_builder():
     return PipelineBuilder(name='validate')
@@ -345,3 +384,93 @@ class TestNotificationPipelineBuilder(object):
         assert isinstance(getattr(pipeline, 'tasks'), list)
         assert len(getattr(pipeline, 'tasks')) == 1
         assert getattr(pipeline, 'type') is NotificationTask
+
+
+class TestPipelineExecutor(object):
+
+    @staticmethod
+    def test_get_default_executors():
+        config = dict(TASK_CONCURRENCY=DEFAULT_TASK_CONCURRENCY)
+        for task in ['validate', 'notify', 'orchestrate']:
+            assert isinstance(PipelineExecutorFactory.get_executor(task, config), BlasterPipelineExecutor)
+
+    @staticmethod
+    def test_get_configured_executor():
+        config = dict(TASK_CONCURRENCY=dict(PROVISION_EXECUTOR='Thread', VALIDATE_EXECUTOR='blaster'))
+        assert isinstance(PipelineExecutorFactory.get_executor('provision', config), ThreadPipelineExecutor)
+        assert isinstance(PipelineExecutorFactory.get_executor('validate', config), BlasterPipelineExecutor)
+
+    @staticmethod
+    def test_get_invalid_executor():
+        with pytest.raises(TefloError):
+            PipelineExecutorFactory.get_executor('validate', dict(TASK_CONCURRENCY=dict(VALIDATE_EXECUTOR='null')))
+
+    @staticmethod
+    def test_thread_executor_updates_resources_in_place():
+        resources = [MarkResource('res%s' % idx) for idx in range(3)]
+        tasks = [dict(name='validate', task=MarkTask, methods=['run'], resource=res) for res in resources]
+        data = ThreadPipelineExecutor().run(tasks, serial=False)
+        assert [task['methods'][0]['rvalue'] for task in data] == ['res0', 'res1', 'res2']
+        assert [task['resource'] for task in data] == resources
+        assert all([res.marked for res in resources])
+        # the pipeline tasks are left as they were built
+        assert tasks[0]['methods'] == ['run']
+
+    @staticmethod
+    def test_thread_executor_serial_stops_on_failure():
+        resources = [MarkResource('res0'), MarkResource('fail'), MarkResource('res2')]
+        tasks = [dict(name='validate', task=MarkTask, methods=['run'], resource=res) for res in resources]
+        with pytest.raises(blaster.BlasterError) as ex:
+            ThreadPipelineExecutor().run(tasks, serial=True)
+        assert [task['status'] for task in ex.value.results] == [0, 1, 'n/a']
+        assert ex.value.results[1]['methods'][0]['traceback']
+        assert resources[0].marked and not resources[2].marked
+
+    @staticmethod
+    def test_blaster_executor_sends_envelopes_to_workers(asset1, asset2):
+        hosts = [asset1, asset2]
+        resources = [MarkResource('res0', hosts), MarkResource('res1', hosts)]
+        tasks = [dict(name='validate', task=MarkTask, methods=['run'], resource=res, timeout=0) for res in resources]
+        with mock.patch('teflo.utils.pipeline.blaster.Blaster', wraps=blaster.Blaster) as mock_blaster:
+            data = BlasterPipelineExecutor().run(tasks, serial=False)
+        # blaster only got the envelopes, not the resources
+        assert [set(task.keys()) for task in mock_blaster.call_args[0][0]] == \
+            [{'name', 'task', 'methods', 'timeout', 'envelope_id', 'delta'}] * 2
+        # the resources changed by the workers are updated in place
+        assert sorted([task['methods'][0]['rvalue'] for task in data]) == ['res0', 'res1']
+        assert sorted([id(task['resource']) for task in data]) == sorted([id(res) for res in resources])
+        assert all([res.marked and res.hosts[0] is hosts[0] for res in resources])
+
+    @staticmethod
+    def test_blaster_executor_failure_results():
+        resources = [MarkResource('res0'), MarkResource('fail')]
+        tasks = [dict(name='validate', task=MarkTask, methods=['run'], resource=res) for res in resources]
+        with pytest.raises(blaster.BlasterError) as ex:
+            BlasterPipelineExecutor().run(tasks, serial=False)
+        results = {task['resource'].name: task for task in ex.value.results}
+        assert results['fail']['status'] == 1 and results['res0']['status'] == 0
+        assert results['res0']['resource'] is resources[0] and resources[0].marked
+
+    @staticmethod
+    def test_blaster_executor_forks_with_fork_safe_locks_released():
+        """verifies the workers are not forked while another thread holds a fork safe lock"""
+        resource = MarkResource('res0')
+        resource.lock = fork_safe_lock()
+        held, release = threading.Event(), threading.Event()
+
+        def hold():
+            with resource.lock:
+                held.set()
+                release.wait(5)
+
+        thread = threading.Thread(target=hold)
+        thread.start()
+        held.wait(5)
+        threading.Timer(0.5, release.set).start()
+        tasks = [dict(name='validate', task=LockTask, methods=['run'], resource=resource)] * 2
+        try:
+            data = BlasterPipelineExecutor().run(tasks, serial=False)
+        finally:
+            release.set()
+            thread.join()
+        assert [task['methods'][0]['rvalue'] for task in data] == ['res0', 'res0']
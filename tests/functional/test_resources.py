@@ -801,6 +801,18 @@ class TestScenarioResource(object):
             if sc.path == 'sdf2.yml':
                 assert sc.children_size == 3
 
+    @staticmethod
+    def test_scenario_graph_traversal_order(basic_scenario_graph_with_provision_only: ScenarioGraph):
+        graph = ScenarioGraph(basic_scenario_graph_with_provision_only.root, iterate_method='by_level')
+        by_level = ['sdf%s.yml' % i for i in [12, 13, 3, 8, 5, 10, 11, 4, 9, 6, 1, 7, 2, 0]]
+        assert [sc.path for sc in graph] == by_level
+        # the order is computed once and every iteration walks the whole graph
+        assert graph.order is graph.order
+        assert [sc.path for sc in graph] == [sc.path for sc in graph.order]
+        by_depth = ScenarioGraph(graph.root, iterate_method='by_depth')
+        assert [sc.path for sc in by_depth] == ['sdf%s.yml' % i for i in [3, 12, 13, 8, 5, 1, 10, 11, 7, 4, 9, 6,
+                                                                         2, 0]]
+
     @staticmethod
     def test_reload_method_assets_mixed_tasks(task_list_host, scenario_res1:Scenario):
         scenario_res1.reload_resources(task_list_host)
@@ -809,6 +821,33 @@ class TestScenarioResource(object):
         assert scenario_res1.assets[1].name == 'host_count_1'
         assert scenario_res1.assets[2].name == 'host01'
 
+    @staticmethod
+    def test_reload_method_assets_large_count(scenario_res3, host2):
+        params = list()
+        for i in range(800):
+            param = copy.deepcopy(host2.profile())
+            param.update(name='host_count_%s' % i)
+            params.append(param)
+        tasks = [{'status': 0, 'task': 'teflotaskobj1', 'methods': [{'status': 0, 'rvalue': params, 'name': 'run'}],
+                  'bid': 123, 'asset': copy.deepcopy(host2), 'msg': 'hostcreation1'}]
+        scenario_res3.reload_resources(tasks)
+        names = [asset.name for asset in scenario_res3.assets]
+        assert names == ['host_number_3'] + ['host_count_%s' % i for i in range(800)] + ['host01']
+        assert scenario_res3.assets.has_name('host_count_799')
+        assert not scenario_res3.assets.has_name(host2.name)
+        assert scenario_res3.get_resource_idx(scenario_res3.assets[-1]) == 801
+
+    @staticmethod
+    def test_scenario_graph_remove_and_reload_resources(scenario_res1, host2, host):
+        graph = ScenarioGraph(scenario_res1, assets=list(scenario_res1.assets), reports=[], notifications=[])
+        graph.remove_resources_from_scenario(scenario_res1)
+        assert graph.get_assets() == []
+        graph.reload_resources_from_scenario(scenario_res1)
+        graph.reload_resources_from_scenario(scenario_res1)
+        assert graph.get_assets() == [host2, host]
+        assert host in graph.get_assets()
+        assert graph.get_assets().index(host) == 1
+
     @staticmethod
     def test_reload_method_default(task_list_host_with_3_no_count, scenario_res3):
         scenario_res3.reload_resources(task_list_host_with_3_no_count)
@@ -29,6 +29,7 @@ import os
 import sys
 from teflo.utils.scenario_graph import ScenarioGraph
 
+import blaster
 import mock
 import pytest
 import yaml
@@ -250,3 +251,88 @@ class TestTeflo(object):
 
         assert teflo.scenario_graph and len(teflo.scenario_graph) > 0
         assert teflo.config['INCLUDED_SDF_ITERATE_METHOD'] == 'by_depth'
+
+    @staticmethod
+    @mock.patch.object(Teflo, 'run_helper')
+    def test_run_all_helper_parallel_iterate_method(mock_method, basic_scenario_graph_with_provision_only):
+        """verifies the parallel iterate method runs every scenario after all of its child scenarios"""
+        teflo = Teflo(data_folder='/tmp')
+        teflo.scenario_graph = ScenarioGraph(basic_scenario_graph_with_provision_only.root, iterate_method='parallel')
+        teflo.run_all_helper(['provision'], [], [], [0])
+
+        run_order = [call.kwargs['sc'] for call in mock_method.call_args_list]
+        assert len(run_order) == len(teflo.scenario_graph)
+        for sc in run_order:
+            for child in sc.child_scenarios:
+                assert run_order.index(child) < run_order.index(sc)
+
+    @staticmethod
+    def test_get_streamed_tasks():
+        teflo = Teflo(data_folder='/tmp')
+        assert teflo._get_streamed_tasks(['provision', 'orchestrate', 'execute']) == []
+        teflo.config['PIPELINE_MODE'] = 'streaming'
+        assert teflo._get_streamed_tasks(['execute', 'report', 'provision', 'orchestrate']) == \
+            ['provision', 'orchestrate', 'execute']
+        assert teflo._get_streamed_tasks(['orchestrate', 'execute']) == []
+        assert teflo._get_streamed_tasks(['provision', 'report']) == []
+
+    @staticmethod
+    @mock.patch.object(Teflo, '_populate_inventory')
+    @mock.patch.object(Teflo, '_blastoff')
+    def test_run_streamed_pipeline(mock_blastoff, mock_inventory, scenario_graph1):
+        """verifies actions and executes only start once the assets they run against are provisioned"""
+        run_order = list()
+
+        def blastoff(tasks, serial):
+            run_order.append(tasks[0]['name'])
+            return [dict(tasks[0], methods=[dict(name='run', status=0, rvalue=None)])]
+
+        mock_blastoff.side_effect = blastoff
+        sc = scenario_graph1.root
+        teflo = Teflo(data_folder='/tmp')
+        teflo.scenario_graph = ScenarioGraph(root_scenario=sc, assets=list(sc.assets), actions=list(sc.actions),
+                                             executes=list(sc.executes), reports=[], notifications=[])
+        events = list()
+        teflo._run_streamed_pipeline(sc, ['provision', 'orchestrate', 'execute'],
+                                     lambda name: events.append(('start', name, len(run_order))),
+                                     lambda name: events.append(('pass', name, len(run_order))))
+
+        assert [event[:2] for event in events if event[0] == 'pass'] == \
+            [('pass', 'provision'), ('pass', 'orchestrate'), ('pass', 'execute')]
+        assert [event[:2] for event in events if event[0] == 'start'] == \
+            [('start', 'provision'), ('start', 'orchestrate'), ('start', 'execute')]
+        # a task type is started when its first task is submitted, not up front
+        assert events[0] == ('start', 'provision', 0)
+        assert [event for event in events if event[:2] == ('pass', 'provision')][0][2] >= 2
+        assert sorted(run_order) == ['action', 'action', 'execute1', 'execute2', 'host_1', 'host_3']
+        assert run_order.index('host_3') < run_order.index('action')
+        assert run_order.index('host_1') < run_order.index('execute1')
+        assert len([name for name in run_order[run_order.index('execute2'):] if name == 'action']) == 0
+        inventoried = [host.name for call in mock_inventory.call_args_list for host in call.args[1]]
+        assert sorted(inventoried) == ['host_1', 'host_3']
+
+    @staticmethod
+    @mock.patch.object(Teflo, '_populate_inventory')
+    @mock.patch.object(Teflo, '_blastoff')
+    def test_run_streamed_pipeline_provision_failure(mock_blastoff, mock_inventory, scenario_graph1):
+        """verifies nothing runs against an asset that failed to provision"""
+        run_order = list()
+
+        def blastoff(tasks, serial):
+            run_order.append(tasks[0]['name'])
+            result = [dict(tasks[0], methods=[dict(name='run', status=0, rvalue=None)])]
+            if tasks[0]['name'] == 'host_3':
+                raise blaster.BlasterError('failed to provision host_3', results=result)
+            return result
+
+        mock_blastoff.side_effect = blastoff
+        sc = scenario_graph1.root
+        teflo = Teflo(data_folder='/tmp')
+        teflo.scenario_graph = ScenarioGraph(root_scenario=sc, assets=list(sc.assets), actions=list(sc.actions),
+                                             executes=list(sc.executes), reports=[], notifications=[])
+        started, passed = list(), list()
+        with pytest.raises(blaster.BlasterError) as ex:
+            teflo._run_streamed_pipeline(sc, ['provision', 'orchestrate', 'execute'], started.append, passed.append)
+        assert ex.value.streamed_task == 'provision'
+        assert 'provision' in started and passed == []
+        assert 'action' not in run_order and 'execute2' not in run_order